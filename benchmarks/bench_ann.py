@@ -0,0 +1,60 @@
+import argparse
+import time
+import numpy as np
+from src.build_index import build_faiss_index, set_search_params
+from src.eval import recall_at_k
+
+# Recall@k vs single-query latency for each index type in src.build_index, with the exact flat
+# index as ground truth, sweeping nprobe (IVF) and efSearch (HNSW). Vectors are clustered like
+# real catalogs (uniform random vectors are the worst case for every ANN index).
+#   python -m benchmarks.bench_ann --tracks 2000000 --dim 64
+
+def clustered_vectors(n: int, d: int, centers: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    c = rng.normal(size=(centers, d)).astype(np.float32)
+    v = np.empty((n, d), dtype=np.float32)
+    for i in range(0, n, 100_000):
+        m = min(100_000, n - i)
+        v[i:i+m] = c[rng.integers(0, centers, m)] + 0.5 * rng.normal(size=(m, d)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+def measure(index, queries, truth, k):
+    lat, recalls = [], []
+    for q, t in zip(queries, truth):
+        t0 = time.perf_counter()
+        _, I = index.search(q[None, :], k)
+        lat.append(time.perf_counter() - t0)
+        recalls.append(recall_at_k(t, list(I[0]), k))
+    lat = np.array(lat) * 1e3
+    return np.mean(recalls), np.percentile(lat, 50), np.percentile(lat, 99)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tracks", type=int, default=1_000_000)
+    ap.add_argument("--dim", type=int, default=64)
+    ap.add_argument("--centers", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=150, help="local_api searches k*5 = 150 neighbours for k=30")
+    ap.add_argument("--types", nargs="+", default=["flat", "ivf-flat", "ivf-pq", "hnsw"])
+    args = ap.parse_args()
+
+    vec = clustered_vectors(args.tracks, args.dim, args.centers)
+    queries = vec[np.random.default_rng(1).choice(args.tracks, args.queries, replace=False)]
+    exact = build_faiss_index(vec)
+    _, truth = exact.search(queries, args.k)
+    print(f"{args.tracks:,} x {args.dim}-d, recall@{args.k} against IndexFlatIP, {args.queries} single queries")
+    sweeps = {"flat": [{}], "ivf-flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+              "ivf-pq": [{"nprobe": p} for p in (1, 4, 16, 64)], "hnsw": [{"ef_search": e} for e in (32, 64, 128, 256)]}
+    for index_type in args.types:
+        t0 = time.perf_counter()
+        index = exact if index_type == "flat" else build_faiss_index(vec, index_type)
+        built = time.perf_counter() - t0
+        for params in sweeps[index_type]:
+            set_search_params(index, **params)
+            recall, p50, p99 = measure(index, queries, truth, args.k)
+            knob = " ".join(f"{k}={v}" for k, v in params.items()) or "exact"
+            print(f"{index_type:<9} {knob:<14} recall {recall:6.3f}  p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  "
+                  f"(built in {built:.0f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import os
+import random
+import time
+import numpy as np
+import pandas as pd
+from entendre_rank.config import DEFAULT_EMBEDDING_MODEL
+from entendre_rank.detection_model import load_embedder, embed_lines, iter_song_lines
+from entendre_rank.embed_pool import EmbedderPool
+
+# Lines/sec of entendre_rank embedding for 1..N CPU worker processes.
+#   python -m benchmarks.bench_embed_workers --max-workers 8 --lines 20000
+
+WORDS = ("keys rock base blow pipe bags lines shots dope fire ice grams plug lick roll hammer city "
+         "night money paper dream block corner ride smoke heat piece serve trap brick cake").split()
+
+def synthetic_lines(n: int, seed: int=0):
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 16))) for _ in range(n)]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", type=str, default=DEFAULT_EMBEDDING_MODEL)
+    ap.add_argument("--songs", type=str, default=None, help="songs.csv to sample real lines from")
+    ap.add_argument("--lines", type=int, default=10000)
+    ap.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--max-batch-tokens", type=int, default=8192)
+    args = ap.parse_args()
+
+    if args.songs:
+        lines = [ln for _, ls in iter_song_lines(pd.read_csv(args.songs)) for ln in ls][:args.lines]
+    else:
+        lines = synthetic_lines(args.lines)
+    tokenizer, model, device = load_embedder(args.model, device="cpu")
+
+    counts = sorted({1, *[w for w in (2, 4, 8, 16, 32) if w < args.max_workers], args.max_workers})
+    base = None
+    print(f"{len(lines)} lines, model={args.model}, cores={os.cpu_count()}")
+    print(f"{'workers':>8} {'lines/s':>10} {'speedup':>8}")
+    for w in counts:
+        pool = EmbedderPool(args.model, w) if w > 1 else None
+        if pool is not None:
+            list(pool.map_batches([["warm up"]] * w))  # exclude model load from the timing
+        t0 = time.perf_counter()
+        embs = embed_lines(tokenizer, model, device, lines, max_tokens=args.max_batch_tokens, pool=pool)
+        dt = time.perf_counter() - t0
+        if pool is not None:
+            pool.close()
+        rate = len(lines) / dt
+        base = base or rate
+        print(f"{w:>8} {rate:>10.1f} {rate / base:>7.2f}x")
+        assert embs.shape[0] == len(lines) and np.isfinite(embs).all()
+
+if __name__ == "__main__":
+    main()
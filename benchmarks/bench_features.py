@@ -0,0 +1,44 @@
+import argparse
+import random
+import time
+import pandas as pd
+from entendre_rank.lexicon import default_matcher
+from entendre_rank.utils import engineered_features, engineered_features_reference
+
+# Line-by-line vs batched engineered_features.
+#   python -m benchmarks.bench_features --lines 1000000
+
+FILLER = ("i got the to city real move in silence like money night on my block we they you ain't it's "
+          "don't yeah uh huh every day she said back then all this that what with from never gonna "
+          "running streets homie flow mic verse rhyme").split()
+
+def synthetic_lines(n: int, seed: int=0, lexicon_rate: float=0.06):
+    # roughly lyric-shaped: 2-14 words, ~6% lexicon terms, some capitals and punctuation
+    rnd = random.Random(seed)
+    lexicon = sorted(default_matcher().entries)
+    punct = ["", "", "", "?", "!", "'", '"']
+    def word():
+        w = rnd.choice(lexicon) if rnd.random() < lexicon_rate else rnd.choice(FILLER)
+        return w.capitalize() if rnd.random() < 0.1 else w
+    return [" ".join(word() for _ in range(rnd.randint(2, 14))) + rnd.choice(punct) for _ in range(n)]
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=1_000_000)
+    args = ap.parse_args()
+    lines = synthetic_lines(args.lines)
+    ref, t_ref = timed(engineered_features_reference, lines)
+    new, t_new = timed(engineered_features, lines)
+    pd.testing.assert_frame_equal(ref, new)
+    print(f"{len(lines)} lines")
+    print(f"reference  {t_ref:8.2f}s  {len(lines) / t_ref:>12,.0f} lines/s")
+    print(f"batched    {t_new:8.2f}s  {len(lines) / t_new:>12,.0f} lines/s")
+    print(f"speedup    {t_ref / t_new:8.1f}x (outputs identical)")
+
+if __name__ == "__main__":
+    main()
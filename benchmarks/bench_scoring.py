@@ -0,0 +1,54 @@
+import argparse
+import time
+import numpy as np
+from entendre_rank.detection_model import weak_labels_from_heuristics
+from entendre_rank.line_classifier import FEATURE_NAMES, LineClassifier, new_pipeline
+from entendre_rank.utils import engineered_features
+from benchmarks.bench_features import synthetic_lines
+
+# Scoring throughput of detect's per-batch step: heuristic-only vs the saved line classifier
+# (folded into one matrix-vector product) vs calling the sklearn pipeline directly.
+#   python -m benchmarks.bench_scoring --lines 200000 --batch 8192
+
+def rate(fn, batches, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for b in batches:
+            fn(*b)
+        best = min(best, time.perf_counter() - t0)
+    return sum(len(b[1]) for b in batches) / best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=200_000)
+    ap.add_argument("--batch", type=int, default=8192)
+    ap.add_argument("--dim", type=int, default=384, help="embedding size (all-MiniLM-L6-v2: 384)")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    feats = engineered_features(synthetic_lines(args.lines))
+    embs = rng.normal(size=(args.lines, args.dim)).astype(np.float32)
+    X = np.hstack([embs, feats[FEATURE_NAMES].values])
+    y = weak_labels_from_heuristics(feats)
+    fit_rows = min(len(X), 20_000)
+    clf = LineClassifier(new_pipeline().fit(X[:fit_rows], y[:fit_rows]), {"version": "bench"})
+    batches = [(X[i:i+args.batch], feats.iloc[i:i+args.batch]) for i in range(0, len(X), args.batch)]
+
+    def heuristic(_, f):
+        y_weak = weak_labels_from_heuristics(f)
+        return y_weak * 0.7 + (f["ambiguous_hits"] > 1).astype(int).values * 0.3
+
+    results = [
+        ("heuristic", rate(heuristic, batches)),
+        ("classifier", rate(lambda x, _: clf.predict_proba(x), batches)),
+        ("sklearn pipeline", rate(lambda x, _: clf.pipeline.predict_proba(x)[:, 1], batches)),
+    ]
+    print(f"{args.lines} lines, {X.shape[1]} features, batches of {args.batch}")
+    for name, r in results:
+        print(f"{name:<18} {r:>14,.0f} lines/s")
+    folded = np.concatenate([clf.predict_proba(x) for x, _ in batches])
+    assert np.allclose(folded, clf.pipeline.predict_proba(X)[:, 1], atol=1e-5)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+import pandas as pd
+from src.recommend import Catalog, MicroBatcher
+
+# Request latency (p50/p99) and throughput of serving/local_api's /recommend handler on a synthetic
+# catalog: the per-request id2row + df.iloc version vs the prebuilt Catalog. Handlers are called
+# in-process, so HTTP/JSON overhead (the same for both) is left out.
+# Then the batched paths: /recommend/batch (one search for many seed sets) and concurrent single
+# requests coalesced by the MicroBatcher.
+#   python -m benchmarks.bench_serving --tracks 1000000 --requests 200 --batch 256
+
+def synthetic_artifacts(tracks: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vec = rng.normal(size=(tracks, dim)).astype(np.float32)
+    vec /= np.linalg.norm(vec, axis=1, keepdims=True)
+    df = pd.DataFrame({"track_id": [f"{i:022d}" for i in range(tracks)],
+                       "track_name": [f"Song {i}" for i in range(tracks)],
+                       "artist_name": [f"Artist {i % 5000}" for i in range(tracks)]})
+    index = faiss.IndexFlatIP(dim)
+    index.add(vec)
+    return df, vec, index
+
+def legacy_handler(df, vec, index):
+    def recommend(seed_ids, k):
+        id2row = {tid:i for i,tid in enumerate(df["track_id"])}
+        rows = [id2row[s] for s in seed_ids if s in id2row]
+        q = vec[rows].mean(axis=0, keepdims=True)
+        q /= (np.linalg.norm(q)+1e-9)
+        D, I = index.search(q.astype('float32'), k*5)
+        out, seen = [], set(seed_ids)
+        for idx in I[0]:
+            tid = df.iloc[idx]["track_id"]
+            if tid not in seen:
+                out.append({"track_name": df.iloc[idx]["track_name"], "artist_name": df.iloc[idx]["artist_name"],
+                            "track_id": tid})
+            if len(out) >= k: break
+        return out
+    return recommend
+
+def load_test(handler, requests, k, concurrency):
+    def timed(seeds):
+        t0 = time.perf_counter()
+        handler(seeds, k)
+        return time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        lat = np.array(list(ex.map(timed, requests)))
+    wall = time.perf_counter() - t0
+    return np.percentile(lat, 50) * 1e3, np.percentile(lat, 99) * 1e3, len(requests) / wall
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tracks", type=int, default=1_000_000)
+    ap.add_argument("--dim", type=int, default=12, help="audio-feature vectors; 384+ with lyrics")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--seeds", type=int, default=5)
+    ap.add_argument("--k", type=int, default=30)
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--batch", type=int, default=256, help="seed sets per /recommend/batch call")
+    ap.add_argument("--batch-wait-ms", type=float, default=2.0)
+    args = ap.parse_args()
+
+    df, vec, index = synthetic_artifacts(args.tracks, args.dim)
+    rng = np.random.default_rng(1)
+    requests = [df["track_id"].values[rng.integers(0, args.tracks, args.seeds)].tolist() for _ in range(args.requests)]
+    t0 = time.perf_counter()
+    catalog = Catalog(df, vec, index)
+    print(f"{args.tracks:,} tracks x {args.dim}-d; Catalog built once in {time.perf_counter() - t0:.2f}s")
+
+    legacy = legacy_handler(df, vec, index)
+    # the legacy handler rebuilds id2row every call: a small sample is enough to measure it
+    sample = requests[:max(5, args.requests // 20)]
+    for name, handler, reqs in [("before (per request)", legacy, sample), ("after (Catalog)", catalog.recommend, requests)]:
+        p50, p99, rps = load_test(handler, reqs, args.k, args.concurrency)
+        print(f"{name:<22} p50 {p50:9.2f} ms  p99 {p99:9.2f} ms  {rps:10.1f} req/s")
+    assert catalog.recommend(sample[0], args.k) == legacy(sample[0], args.k)
+
+    queries = [(seeds, args.k) for seeds in requests[:args.batch]]
+    t0 = time.perf_counter()
+    for q in queries:
+        catalog.recommend(*q)
+    single = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    catalog.recommend_many(queries)
+    batched = time.perf_counter() - t0
+    print(f"{len(queries)} seed sets: one search each {len(queries) / single:10.1f} queries/s, "
+          f"one batched search {len(queries) / batched:10.1f} queries/s")
+    batcher = MicroBatcher(catalog.recommend_many, max_wait_ms=args.batch_wait_ms)
+    p50, p99, rps = load_test(lambda seeds, k: batcher.submit((seeds, k)), requests, args.k, 64)
+    print(f"{'micro-batched x64':<22} p50 {p50:9.2f} ms  p99 {p99:9.2f} ms  {rps:10.1f} req/s  "
+          f"({batcher.items / batcher.batches:.1f} requests per search)")
+    batcher.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+import faiss
+import numpy as np
+from src.build_index import build_faiss_index
+from src.recommend import load_catalog, save_serving_artifacts
+from benchmarks.bench_serving import synthetic_artifacts
+
+# Startup time and per-worker memory of serving/local_api's artifact loading with N worker processes
+# (as with uvicorn --workers N): everything read into RAM vs memory-mapped. RSS counts shared pages
+# in full; PSS splits them between the processes mapping them, so its sum is the real footprint.
+#   python -m benchmarks.bench_startup --tracks 1000000 --workers 4
+
+def memory_mb() -> dict:
+    out = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, *rest = line.split()
+            if key in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                out[key[:-1]] = int(rest[0]) / 1024
+    return out
+
+def _worker(art_dir: str, mmap: bool, queries: list, ready, go, queue):
+    t0 = time.perf_counter()
+    catalog = load_catalog(art_dir, mmap=mmap)
+    load = time.perf_counter() - t0
+    first = time.perf_counter()
+    catalog.recommend(queries[0], 30)
+    first = time.perf_counter() - first
+    for q in queries[1:]:
+        catalog.recommend(q, 30)
+    ready.wait()  # every worker has loaded and served before anyone measures memory
+    mem = memory_mb()
+    go.wait()
+    queue.put({"load_s": load, "first_query_ms": first * 1e3, **mem})
+
+def run(art_dir: str, mmap: bool, workers: int, queries: list):
+    ctx = mp.get_context("spawn")
+    ready, go, queue = ctx.Barrier(workers), ctx.Barrier(workers), ctx.Queue()
+    t0 = time.perf_counter()
+    procs = [ctx.Process(target=_worker, args=(art_dir, mmap, queries, ready, go, queue)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    stats = [queue.get() for _ in procs]
+    wall = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    return wall, stats
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tracks", type=int, default=1_000_000)
+    ap.add_argument("--dim", type=int, default=64)
+    ap.add_argument("--index", default="flat", help="index type from src.build_index")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--queries", type=int, default=20)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as art_dir:
+        df, vec, _ = synthetic_artifacts(args.tracks, args.dim)
+        df.to_parquet(os.path.join(art_dir, "track_meta.parquet"), index=False)
+        np.save(os.path.join(art_dir, "vectors.npy"), vec)
+        faiss.write_index(build_faiss_index(vec, args.index), os.path.join(art_dir, "faiss.index"))
+        save_serving_artifacts(df, art_dir)
+        rng = np.random.default_rng(0)
+        queries = [df["track_id"].values[rng.integers(0, args.tracks, 5)].tolist() for _ in range(args.queries)]
+        del df, vec
+        size = sum(os.path.getsize(os.path.join(art_dir, f)) for f in os.listdir(art_dir)) / 2**20
+        print(f"{args.tracks:,} tracks x {args.dim}-d {args.index} index, {size:,.0f} MB of artifacts, "
+              f"{args.workers} workers (page cache warm)")
+        for mmap in (False, True):
+            wall, stats = run(art_dir, mmap, args.workers, queries)
+            mean = lambda k: np.mean([s[k] for s in stats])
+            print(f"{'mmap' if mmap else 'eager':<6} load {mean('load_s'):6.2f}s  first query {mean('first_query_ms'):7.1f} ms  "
+                  f"RSS/worker {mean('Rss'):7.0f} MB  PSS/worker {mean('Pss'):7.0f} MB  "
+                  f"private/worker {mean('Private_Clean') + mean('Private_Dirty'):7.0f} MB  "
+                  f"total PSS {sum(s['Pss'] for s in stats):7.0f} MB  (all up in {wall:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import numpy as np
+from entendre_rank.train_classifier import ShardWriter, TRAINERS
+from entendre_rank.utils import FEATURE_VERSION
+
+# Wall time, lines/sec (training lines / wall time) and peak RSS of the out-of-core SGD trainer vs the
+# in-memory LogisticRegression, each in a fresh process so the high-water marks don't mix.
+#   python -m benchmarks.bench_train --lines 2000000
+
+def write_synthetic_shards(shard_root: str, lines: int, dim: int, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    w = rng.normal(size=dim)
+    writer = ShardWriter(shard_root, {"embedding_model": "synthetic", "lexicon": "", "feature_version": FEATURE_VERSION})
+    for i in range(0, lines, 10_000):
+        X = rng.normal(size=(min(10_000, lines - i), dim)).astype(np.float32)
+        writer.add(X, (X @ w + rng.normal(size=len(X)) > 1).astype(np.int8))
+    writer.close()
+    return writer.shard_dir
+
+def _run(trainer: str, shard_dir: str, queue):
+    _, stats = TRAINERS[trainer](shard_dir)
+    queue.put(stats)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=1_000_000)
+    ap.add_argument("--dim", type=int, default=392, help="384-d embedding + 8 engineered features")
+    ap.add_argument("--trainers", nargs="+", default=["sgd", "lbfgs"])
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as shard_root:
+        shard_dir = write_synthetic_shards(shard_root, args.lines, args.dim)
+        size = sum(os.path.getsize(os.path.join(shard_dir, f)) for f in os.listdir(shard_dir)) / 2**20
+        print(f"{args.lines} lines x {args.dim} features, {size:,.0f} MB of shards")
+        ctx = mp.get_context("spawn")
+        for trainer in args.trainers:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run, args=(trainer, shard_dir, queue))
+            proc.start()
+            stats = queue.get()
+            proc.join()
+            print(f"{trainer:<6} {stats['seconds']:>8.1f}s  {stats['lines_per_sec']:>10,.0f} lines/s  "
+                  f"{stats['passes']:>4} passes  peak RSS {stats['peak_rss_mb']:>8,.0f} MB")
+
+if __name__ == "__main__":
+    main()
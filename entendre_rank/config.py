@@ -13,3 +13,4 @@ SEED_SPOTIFY_PLAYLIST_ID = os.getenv("SEED_SPOTIFY_PLAYLIST_ID", "")
 
 DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 RANDOM_SEED = 42
+MODELS_DIR = os.getenv("ENTENDRE_MODELS_DIR", os.path.join(os.path.dirname(__file__), "models"))
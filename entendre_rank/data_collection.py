@@ -1,11 +1,14 @@
 import argparse
 import time
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from tqdm import tqdm
 import lyricsgenius
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from .genius_async import fetch_lyrics_many
+from .manifest import CollectionManifest, FETCHED, MISSING, FAILED
+from .lyrics_store import LEGACY_LYRICS_DIR, adopt_legacy_directory, open_lyrics
 from .config import GENIUS_TOKEN, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI, BOOTSTRAP_ARTISTS, SEED_SPOTIFY_PLAYLIST_ID
 
 def sp_client():
@@ -50,48 +53,107 @@ def bootstrap_tracks(sp, artists: List[str], seed_playlist_id: str="", limit:int
             uniq.append(t)
     return uniq
 
-def fetch_lyrics(genius, song_title: str, primary_artist: str):
+def fetch_lyrics_status(genius, song_title: str, primary_artist: str) -> Tuple[str, Optional[str]]:
     try:
         song = genius.search_song(song_title, primary_artist)
-        if song and song.lyrics:
-            return song.lyrics
     except Exception:
-        return None
-    return None
+        return FAILED, None
+    if song and song.lyrics:
+        return FETCHED, song.lyrics
+    return MISSING, None
+
+def fetch_lyrics(genius, song_title: str, primary_artist: str):
+    return fetch_lyrics_status(genius, song_title, primary_artist)[1]
+
+def collect_lyrics(tracks: List[Dict], manifest: CollectionManifest, fetch_many, lyrics,
+                   refetch: bool=False, missing_ttl: float=30 * 86400) -> List[Dict]:
+    # resume: reuse lyrics already stored or in the manifest, skip songs Genius recently had nothing for
+    todo = []
+    for t in tracks:
+        rec = manifest.latest.get(t["id"])
+        if not refetch and rec is None and t["id"] in lyrics:
+            manifest.record(t["id"], FETCHED, title=t["name"], lyrics_path=lyrics.location(t["id"]), source="existing")
+        elif (rec is not None and rec["status"] == FETCHED and rec.get("lyrics_path") == lyrics.location(t["id"])
+              and t["id"] not in lyrics):
+            # fetched after the store's last commit in a run that crashed: fetch it again
+            manifest.record(t["id"], FAILED, title=t["name"])
+        if refetch or not manifest.should_skip(t["id"], missing_ttl):
+            todo.append(t)
+    print(f"{len(tracks) - len(todo)} of {len(tracks)} tracks already in manifest, fetching {len(todo)}")
+
+    def on_result(i: int, status: str, text: Optional[str]):
+        t = todo[i]
+        if status == FETCHED:
+            manifest.record(t["id"], FETCHED, title=t["name"], lyrics_path=lyrics.put(t["id"], text))
+        else:
+            manifest.record(t["id"], status, title=t["name"])
+
+    fetch_many([(t["name"], t["artists"][0]["name"] if t["artists"] else "") for t in todo], on_result)
+
+    rows = []
+    for t in tracks:
+        rec = manifest.latest.get(t["id"])
+        if rec and rec["status"] == FETCHED:
+            rows.append({
+                "spotify_id": t["id"],
+                "title": t["name"],
+                "artists": ", ".join([a["name"] for a in t["artists"]]),
+                "lyrics_path": rec["lyrics_path"]
+            })
+    return rows
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--artists", type=str, default=",".join(BOOTSTRAP_ARTISTS))
     ap.add_argument("--seed-playlist-id", type=str, default=SEED_SPOTIFY_PLAYLIST_ID)
     ap.add_argument("--limit", type=int, default=25)
-    ap.add_argument("--sleep", type=float, default=0.7, help="seconds between lyric requests")
+    ap.add_argument("--sleep", type=float, default=0.7, help="seconds between lyric requests (--fetcher sync)")
+    ap.add_argument("--fetcher", choices=["async", "sync"], default="async")
+    ap.add_argument("--rate", type=float, default=5.0, help="Genius requests/sec (--fetcher async)")
+    ap.add_argument("--concurrency", type=int, default=8, help="in-flight Genius requests (--fetcher async)")
+    ap.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds (--fetcher async)")
     ap.add_argument("--out", type=str, default="data/processed/songs.csv")
+    ap.add_argument("--lyrics-store", type=str, default="data/processed/lyrics.sqlite",
+                    help="packed lyrics store (.sqlite) or a directory for one .txt per track")
+    ap.add_argument("--legacy-lyrics-dir", type=str, default=LEGACY_LYRICS_DIR,
+                    help="one-.txt-per-track directory packed into a new --lyrics-store on first run")
+    ap.add_argument("--manifest", type=str, default="data/processed/collection_manifest.jsonl",
+                    help="append-only log of fetched/missing/failed tracks, used to resume")
+    ap.add_argument("--refetch", action="store_true", help="ignore the manifest and fetch every track again")
+    ap.add_argument("--missing-ttl-days", type=float, default=30.0, help="days before retrying songs Genius had no lyrics for")
     args = ap.parse_args()
 
     sp = sp_client()
-    genius = genius_client()
 
     artists = [a.strip() for a in args.artists.split(",") if a.strip()] if args.artists else []
     tracks = bootstrap_tracks(sp, artists, args.seed_playlist_id, args.limit)
 
-    rows = []
-    for t in tqdm(tracks, desc="Collecting"):
-        title = t["name"]
-        artists_joined = ", ".join([a["name"] for a in t["artists"]])
-        spotify_id = t["id"]
-        lyrics = fetch_lyrics(genius, title, t["artists"][0]["name"] if t["artists"] else "")
-        if lyrics:
-            # save raw
-            fn = f"data/raw_lyrics/{spotify_id}.txt"
-            with open(fn, "w", encoding="utf-8") as f:
-                f.write(lyrics)
-            rows.append({
-                "spotify_id": spotify_id,
-                "title": title,
-                "artists": artists_joined,
-                "lyrics_path": fn
-            })
-        time.sleep(args.sleep)
+    if args.fetcher == "async":
+        def fetch_many(queries, on_result):
+            with tqdm(total=len(queries), desc="Collecting") as bar:
+                def done(i, status, lyrics):
+                    on_result(i, status, lyrics)
+                    bar.update(1)
+                fetch_lyrics_many(GENIUS_TOKEN, queries, on_result=done,
+                                  rate=args.rate, concurrency=args.concurrency, timeout=args.timeout)
+    else:
+        def fetch_many(queries, on_result):
+            genius = genius_client()
+            for i, (title, artist) in enumerate(tqdm(queries, desc="Collecting")):
+                on_result(i, *fetch_lyrics_status(genius, title, artist))
+                time.sleep(args.sleep)
+
+    migrated = adopt_legacy_directory(args.lyrics_store, args.legacy_lyrics_dir)
+    if migrated:
+        print(f"Packed {migrated} existing lyric files from {args.legacy_lyrics_dir} into {args.lyrics_store}")
+    lyrics = open_lyrics(args.lyrics_store)
+    manifest = CollectionManifest(args.manifest)
+    try:
+        rows = collect_lyrics(tracks, manifest, fetch_many, lyrics, refetch=args.refetch,
+                              missing_ttl=args.missing_ttl_days * 86400)
+    finally:
+        manifest.close()
+        lyrics.close()
 
     df = pd.DataFrame(rows)
     df.to_csv(args.out, index=False)
@@ -1,20 +1,37 @@
 import argparse
+import contextlib
+import heapq
 import os
+import itertools
+import time
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
-from typing import List
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import Pipeline
+from typing import List, Optional
 from sklearn.model_selection import train_test_split
 from transformers import AutoTokenizer, AutoModel
 import torch
-from .utils import split_lyrics_into_lines, engineered_features, window_triple_signal
-from .config import DEFAULT_EMBEDDING_MODEL, RANDOM_SEED
+from .utils import split_lyrics_into_lines, engineered_features, window_triple_signals, FEATURE_VERSION
+from .lexicon import default_matcher
+from .line_classifier import FEATURE_NAMES, load_classifier
+from .train_classifier import TRAIN_SHARD_DIR, TRAINERS, ShardWriter, train_from_shards
+from .config import DEFAULT_EMBEDDING_MODEL
+from .embed_cache import EmbeddingCache, normalize_line
+from .embed_pool import EmbedderPool
+from .onnx_backend import BACKENDS, load_onnx_encoder
+from .lyrics_store import LyricsStore, is_lyrics_store
+from .line_store import DTYPES, LineEmbeddingStore, is_line_store
+from .detections_io import (DetectionWriter, iter_detection_chunks, load_fingerprints, save_fingerprints,
+                            song_fingerprint, DETECTION_COLUMNS)
 
-def load_embedder(model_name=DEFAULT_EMBEDDING_MODEL, device=None):
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
+def load_tokenizer(model_name=DEFAULT_EMBEDDING_MODEL):
+    return AutoTokenizer.from_pretrained(model_name)
+
+def load_embedder(model_name=DEFAULT_EMBEDDING_MODEL, device=None, backend: str="torch"):
+    tokenizer = load_tokenizer(model_name)
+    if backend != "torch":
+        # ONNX Runtime sessions run on CPU only
+        return tokenizer, load_onnx_encoder(model_name, backend), "cpu"
     model = AutoModel.from_pretrained(model_name)
     if device is None:
         device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -22,20 +39,107 @@ def load_embedder(model_name=DEFAULT_EMBEDDING_MODEL, device=None):
     model.eval()
     return tokenizer, model, device
 
-def embed_lines(tokenizer, model, device, lines: List[str]) -> np.ndarray:
-    embs = []
-    for i in range(0, len(lines), 16):
-        batch = lines[i:i+16]
-        enc = tokenizer(batch, padding=True, truncation=True, max_length=128, return_tensors="pt")
-        enc = {k: v.to(device) for k,v in enc.items()}
-        with torch.no_grad():
-            out = model(**enc)
-            # mean-pool last hidden state
-            last_hidden = out.last_hidden_state  # (B, T, H)
-            mask = enc["attention_mask"].unsqueeze(-1).expand(last_hidden.size()).float()
-            pooled = (last_hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
-            embs.append(pooled.cpu().numpy())
-    return np.vstack(embs) if embs else np.zeros((0, model.config.hidden_size))
+def _embed_batch(tokenizer, model, device, batch: List[str]) -> np.ndarray:
+    enc = tokenizer(batch, padding=True, truncation=True, max_length=128, return_tensors="pt")
+    enc = {k: v.to(device) for k,v in enc.items()}
+    with torch.no_grad():
+        out = model(**enc)
+        # mean-pool last hidden state
+        last_hidden = out.last_hidden_state  # (B, T, H)
+        mask = enc["attention_mask"].unsqueeze(-1).expand(last_hidden.size()).float()
+        pooled = (last_hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+    return pooled.cpu().numpy()
+
+def token_budget_batches(lengths: List[int], max_tokens: int, max_batch: int=1024) -> List[List[int]]:
+    # sort by length so each batch pads to a near-uniform width, then fill up to the padded-token budget
+    batches, cur = [], []
+    for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+        if cur and ((len(cur) + 1) * lengths[i] > max_tokens or len(cur) >= max_batch):
+            batches.append(cur)
+            cur = []
+        cur.append(i)
+    if cur:
+        batches.append(cur)
+    return batches
+
+def embed_lines(tokenizer, model, device, lines: List[str], cache: Optional[EmbeddingCache]=None,
+                max_tokens: Optional[int]=None, pool: Optional[EmbedderPool]=None) -> np.ndarray:
+    # with a pool, model may be None: only the workers hold one
+    if not lines:
+        return np.zeros((0, model.config.hidden_size if model is not None else 0))
+    # hooks and choruses repeat: embed each distinct line once, then consult the cache
+    keys = [normalize_line(ln) for ln in lines]
+    uniq = list(dict.fromkeys(keys))
+    found = cache.get_many(uniq) if cache is not None else {}
+    todo = [k for k in uniq if k not in found]
+    if max_tokens and todo:
+        lengths = [len(ids) for ids in tokenizer(todo, truncation=True, max_length=128)["input_ids"]]
+        batches = [[todo[j] for j in b] for b in token_budget_batches(lengths, max_tokens)]
+    else:
+        batches = [todo[i:i+16] for i in range(0, len(todo), 16)]
+    if pool is not None:
+        outs = pool.map_batches(batches)
+    else:
+        outs = (_embed_batch(tokenizer, model, device, batch) for batch in batches)
+    computed = {}
+    for batch, pooled in zip(batches, outs):
+        computed.update(zip(batch, pooled))
+    if cache is not None:
+        cache.put_many(computed)
+    found.update(computed)
+    return np.vstack([found[k] for k in keys])
+
+def iter_song_texts(songs: pd.DataFrame):
+    stores = {}  # lyrics_path -> open LyricsStore, for rows packed into a single store file
+    try:
+        for _, row in songs.iterrows():
+            lyrics_path = row["lyrics_path"]
+            if not os.path.exists(lyrics_path):
+                continue
+            if is_lyrics_store(lyrics_path):
+                if lyrics_path not in stores:
+                    stores[lyrics_path] = LyricsStore(lyrics_path)
+                text = stores[lyrics_path].get(row["spotify_id"])
+                if text is None:
+                    continue
+            else:
+                with open(lyrics_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            yield row, text
+    finally:
+        for store in stores.values():
+            store.close()
+
+def iter_song_lines(songs: pd.DataFrame):
+    for row, text in iter_song_texts(songs):
+        lines = split_lyrics_into_lines(text)
+        if lines:
+            yield row, lines
+
+def iter_embedded_songs(songs: pd.DataFrame, tokenizer, model, device, cache: Optional[EmbeddingCache]=None,
+                        bucketed: bool=False, max_tokens: int=8192, bucket_songs: int=5000,
+                        pool: Optional[EmbedderPool]=None):
+    song_lines = iter_song_lines(songs)
+    if not bucketed:
+        for row, lines in song_lines:
+            yield row, lines, embed_lines(tokenizer, model, device, lines, cache=cache, pool=pool)
+        return
+    # two-phase: gather lines across many songs, embed them length-bucketed, scatter back per song
+    while True:
+        chunk = list(itertools.islice(song_lines, bucket_songs))
+        if not chunk:
+            return
+        flat = [ln for _, lines in chunk for ln in lines]
+        embs = embed_lines(tokenizer, model, device, flat, cache=cache, max_tokens=max_tokens, pool=pool)
+        off = 0
+        for row, lines in chunk:
+            yield row, lines, embs[off:off+len(lines)]
+            off += len(lines)
+
+def iter_stored_songs(songs: pd.DataFrame, store: LineEmbeddingStore):
+    # embeddings paged in from the line store instead of recomputed
+    for row, lines in iter_song_lines(songs):
+        yield row, lines, store.get(row["spotify_id"])
 
 def weak_labels_from_heuristics(df_feats: pd.DataFrame) -> np.ndarray:
     # very rough: if ambiguous + (sexual or drug) and short line → likely double entendre
@@ -46,80 +150,197 @@ def weak_labels_from_heuristics(df_feats: pd.DataFrame) -> np.ndarray:
     ).astype(int).values
     return y
 
-def detect(file_in: str, file_out: str, model_name: str = DEFAULT_EMBEDDING_MODEL, train: bool=False):
+def _song_groups(embedded, max_lines: int):
+    # consecutive songs batched until they hold at least max_lines lines
+    group, n = [], 0
+    for item in embedded:
+        group.append(item)
+        n += len(item[1])
+        if n >= max_lines:
+            yield group
+            group, n = [], 0
+    if group:
+        yield group
+
+def _finish_detections(writer: DetectionWriter, file_out: str, fingerprints: dict):
+    writer.close()
+    os.replace(writer.path, file_out)
+    save_fingerprints(file_out, fingerprints)
+    print(f"Wrote {writer.rows} detections to {file_out}")
+
+def detect(file_in: str, file_out: str, model_name: str = DEFAULT_EMBEDDING_MODEL, train: bool=False,
+           cache_path: Optional[str]=None, cache_max_entries: int=2_000_000,
+           bucketed: bool=False, max_batch_tokens: int=8192, bucket_songs: int=5000,
+           workers: int=1, threads_per_worker: Optional[int]=None, backend: str="torch", triple_window: int=2,
+           chunk_rows: int=100_000, incremental: bool=False, classifier: Optional[str]=None,
+           score_batch_lines: int=8192, train_shards: str=TRAIN_SHARD_DIR, trainer: str="sgd",
+           embedding_store: Optional[str]=None, store_dtype: str="float16"):
+    if incremental and train:
+        # only the changed songs would reach the training shards, and that model would become LATEST
+        raise ValueError("--train needs every song: run it without --incremental")
     songs = pd.read_csv(file_in)
-    det_rows = []
+    # keep backends apart in the cache: int8 vectors are close to, not equal to, fp32 ones
+    cache_model = model_name if backend == "torch" else f"{model_name}#{backend}"
+    clf = load_classifier(classifier, model_name) if classifier else None
 
-    tokenizer, model, device = load_embedder(model_name)
+    # a song's detections depend on its lyrics and on these; any change re-runs the song
+    config_key = f"{cache_model}|lexicon={default_matcher().fingerprint}|features={FEATURE_VERSION}|window={triple_window}"
+    if clf is not None:
+        config_key += f"|classifier={clf.version}"
+    previous = load_fingerprints(file_out) if incremental else {}
+    fingerprints = {}
+    embed_keys = {}  # spotify_id -> lyrics+embedding model key, for the line store
+    todo = []
+    for row, text in iter_song_texts(songs):
+        fingerprints[row["spotify_id"]] = fp = song_fingerprint(text, config_key)
+        if previous.get(row["spotify_id"]) != fp:
+            todo.append(row.name)
+            if embedding_store:
+                embed_keys[row["spotify_id"]] = song_fingerprint(text, cache_model)
+    unchanged = {sid for sid, fp in fingerprints.items() if previous.get(sid) == fp}
+    # title/artists aren't fingerprinted: carried-over rows take them from the current input
+    meta = songs.drop_duplicates("spotify_id", keep="last").set_index("spotify_id")[["title", "artists"]]
+    songs = songs.loc[todo]
+    if incremental:
+        print(f"Incremental: {len(unchanged)} songs unchanged, {len(songs)} to detect")
 
-    # Minimal classifier pipeline (weakly supervised unless --train with labels provided later)
-    clf = Pipeline([("scaler", StandardScaler(with_mean=False)), ("lr", LogisticRegression(max_iter=1000, class_weight="balanced", random_state=RANDOM_SEED))])
+    # write next to the old output and swap at the end, carrying unchanged songs over chunk by chunk
+    root, ext = os.path.splitext(file_out)
+    partial_out = f"{root}.partial{ext}"
+    writer = DetectionWriter(partial_out, chunk_rows)
+    if unchanged:
+        for chunk in iter_detection_chunks(file_out, DETECTION_COLUMNS, chunk_rows):
+            chunk = chunk[chunk["spotify_id"].isin(unchanged)]
+            writer.add_frame(chunk.assign(**{c: chunk["spotify_id"].map(meta[c]) for c in meta.columns}))
+    if songs.empty:
+        return _finish_detections(writer, file_out, fingerprints)
 
-    all_embs = []
-    all_feats = []
-    all_y = []
+    # songs whose lyrics already have embeddings in the line store skip the embedding model
+    store = LineEmbeddingStore(embedding_store, model_name=cache_model) if embedding_store and is_line_store(embedding_store) else None
+    stored_keys = store.keys() if store is not None else {}
+    in_store = songs["spotify_id"].map(lambda sid: sid in embed_keys and stored_keys.get(sid) == embed_keys[sid]).astype(bool)
+    from_store = set(songs.loc[in_store, "spotify_id"])
+    if embedding_store:
+        print(f"Line store: {len(from_store)} songs reuse stored embeddings, {len(songs) - len(from_store)} to embed")
+    embedded = iter_stored_songs(songs[in_store], store) if from_store else iter([])
+    cache = pool = None
+    if not in_store.all():
+        cache = EmbeddingCache(cache_path, cache_model, cache_max_entries) if cache_path else None
+        if workers > 1:
+            # the workers hold the model; the parent only needs the tokenizer for bucketing.
+            # Per-song batches of 16 lines are too small to pay for the IPC, so always bucket.
+            pool = EmbedderPool(model_name, workers, threads_per_worker, backend=backend)
+            tokenizer, model, device = load_tokenizer(model_name), None, "cpu"
+            bucketed = True
+        else:
+            tokenizer, model, device = load_embedder(model_name, backend=backend)
+        fresh = iter_embedded_songs(songs[~in_store], tokenizer, model, device, cache=cache, bucketed=bucketed,
+                                    max_tokens=max_batch_tokens, bucket_songs=bucket_songs, pool=pool)
+        # both streams follow the input order: merge them so the output doesn't depend on what was stored
+        position = {label: i for i, label in enumerate(songs.index)}
+        embedded = heapq.merge(embedded, fresh, key=lambda item: position[item[0].name])
 
-    for _, row in tqdm(songs.iterrows(), total=len(songs), desc="Embedding & detecting"):
-        lyrics_path = row["lyrics_path"]
-        if not os.path.exists(lyrics_path):
-            continue
-        with open(lyrics_path, "r", encoding="utf-8") as f:
-            text = f.read()
-        lines = split_lyrics_into_lines(text)
-        if not lines:
-            continue
-        feats = engineered_features(lines)
-        embs = embed_lines(tokenizer, model, device, lines)
-
-        # combine
-        # Align features length with embeddings
-        feats = feats.iloc[:embs.shape[0]].reset_index(drop=True)
-        X = np.hstack([embs, feats[["len_chars","len_words","ambiguous_hits","sexual_hits","drug_hits","punct_q","punct_bang","quotes"]].values])
-
-        # Weak labels to train a tiny classifier on-the-fly (self-training style)
-        y_weak = weak_labels_from_heuristics(feats)
-        if train and len(y_weak) > 10:
-            all_embs.append(X)
-            all_feats.append(feats)
-            all_y.append(y_weak)
-
-        # Score with heuristic probability (until trained)
-        prob_heur = (y_weak * 0.7 + (feats["ambiguous_hits"] > 1).astype(int) * 0.3).values
-        line_scores = prob_heur
-
-        triple_signal = window_triple_signal(lines, window=2)
-
-        # Build detections
-        for i, ln in enumerate(lines[:len(line_scores)]):
-            det_rows.append({
-                "spotify_id": row["spotify_id"],
-                "title": row["title"],
-                "artists": row["artists"],
-                "line_idx": i,
-                "line_text": ln,
-                "double_prob": float(line_scores[i]),
-                "triple_signal": float(triple_signal)
-            })
-
-    # If train, fit classifier and rescore (optional enhancement)
-    if train and all_y:
-        X_train = np.vstack(all_embs)
-        y_train = np.concatenate(all_y)
-        clf.fit(X_train, y_train)
-        # Rescoring skipped here for simplicity; users can run with --train and modify to persist model.
-
-    out_df = pd.DataFrame(det_rows)
-    out_df.to_csv(file_out, index=False)
-    print(f"Wrote detections to {file_out}")
+    # training rows go to disk as they are produced; fitting streams them back
+    shards = ShardWriter(train_shards, {"embedding_model": model_name, "lexicon": default_matcher().fingerprint,
+                                        "feature_version": FEATURE_VERSION}) if train else None
+    score_time, scored = 0.0, 0
+    progress = tqdm(total=len(songs), desc="Embedding & detecting")
+    # a failure midway terminates the pool instead of leaving spawned workers behind
+    with pool or contextlib.nullcontext():
+        for group in _song_groups(embedded, score_batch_lines):
+            # features and scores for a whole group of songs at once, then split back per song
+            lines = [ln for _, song_lines, _ in group for ln in song_lines]
+            feats = engineered_features(lines)
+            X = np.hstack([np.vstack([embs for _, _, embs in group]), feats[FEATURE_NAMES].values])
+
+            t0 = time.perf_counter()
+            # Weak labels to train a tiny classifier on-the-fly (self-training style)
+            y_weak = weak_labels_from_heuristics(feats)
+            if clf is not None:
+                line_scores = clf.predict_proba(X)
+            else:
+                line_scores = (y_weak * 0.7 + (feats["ambiguous_hits"] > 1).astype(int) * 0.3).values
+            score_time += time.perf_counter() - t0
+            scored += len(lines)
+
+            off = 0
+            for row, song_lines, embs in group:
+                n = len(song_lines)
+                if embedding_store and row["spotify_id"] not in from_store:
+                    if store is None:
+                        store = LineEmbeddingStore(embedding_store, dim=embs.shape[1], dtype=store_dtype, model_name=cache_model)
+                    store.append(row["spotify_id"], embs, embed_keys[row["spotify_id"]])
+                if shards is not None and n > 10:
+                    shards.add(X[off:off+n], y_weak[off:off+n])
+                triple_signal, triple_lines = window_triple_signals(song_lines, window=triple_window)
+                writer.add_song(row, song_lines, line_scores[off:off+n], triple_signal, triple_lines)
+                off += n
+            progress.update(len(group))
+    progress.close()
+    if scored:
+        scorer = f"classifier {clf.version}" if clf is not None else "heuristic"
+        print(f"Scoring ({scorer}): {scored} lines in {score_time:.3f}s ({scored / max(score_time, 1e-9):,.0f} lines/s)")
+
+    if shards is not None:
+        shards.close()
+        try:
+            path = train_from_shards(shards.shard_dir, trainer)
+            print(f"Saved line classifier to {path}; score with --classifier latest")
+        except ValueError as e:
+            print(f"Not training a classifier: {e}")
+
+    if store is not None:
+        print(f"Line store: {len(store)} songs, {store.n_rows} lines in {embedding_store}")
+        store.close()
+    if cache is not None:
+        print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses ({len(cache)} entries)")
+        cache.close()
+
+    _finish_detections(writer, file_out, fingerprints)
+
+def non_negative_int(value: str) -> int:
+    n = int(value)
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"must be >= 0, got {n}")
+    return n
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", type=str, required=True)
-    ap.add_argument("--output", type=str, default="data/processed/detections.csv")
+    ap.add_argument("--output", type=str, default="data/processed/detections.parquet", help=".parquet or .csv")
+    ap.add_argument("--chunk-rows", type=int, default=100_000, help="detection lines buffered before each flush")
+    ap.add_argument("--incremental", action="store_true", help="only re-run songs whose lyrics or detection config changed")
     ap.add_argument("--model", type=str, default=DEFAULT_EMBEDDING_MODEL)
-    ap.add_argument("--train", action="store_true", help="Enable weak supervised on-the-fly training")
+    ap.add_argument("--train", action="store_true", help="fit the line classifier on weak labels and save a new version")
+    ap.add_argument("--train-shards", type=str, default=TRAIN_SHARD_DIR, help="where --train spills training rows, one run-NNNN directory per run")
+    ap.add_argument("--trainer", choices=sorted(TRAINERS), default="sgd",
+                    help="sgd: out-of-core SGD over the shards; lbfgs: in-memory LogisticRegression")
+    ap.add_argument("--classifier", type=str, default=None, help='score with a saved line classifier: "latest", a version or a .joblib path')
+    ap.add_argument("--score-batch-lines", type=int, default=8192, help="lines featurized and scored per batch")
+    ap.add_argument("--embed-cache", type=str, default="data/cache/line_embeddings.sqlite", help="persistent line-embedding cache")
+    ap.add_argument("--embed-cache-size", type=int, default=2_000_000, help="max cached lines before LRU eviction")
+    ap.add_argument("--no-embed-cache", action="store_true")
+    ap.add_argument("--bucketed", action="store_true", help="two-phase mode: embed lines corpus-wide in length-sorted batches")
+    ap.add_argument("--max-batch-tokens", type=int, default=8192, help="padded-token budget per batch in --bucketed mode")
+    ap.add_argument("--bucket-songs", type=int, default=5000, help="songs gathered per bucketing pass in --bucketed mode")
+    ap.add_argument("--backend", choices=BACKENDS, default="torch", help="embedding runtime; onnx models are exported on first use")
+    ap.add_argument("--workers", type=int, default=1, help="CPU embedding worker processes; implies --bucketed")
+    ap.add_argument("--threads-per-worker", type=int, default=None, help="torch threads per worker (default: cores / workers)")
+    ap.add_argument("--embedding-store", type=str, default=None,
+                    help="memory-mapped line-embedding store: reuse stored embeddings and append new songs")
+    ap.add_argument("--store-dtype", choices=DTYPES, default="float16", help="dtype of a newly created --embedding-store")
+    ap.add_argument("--triple-window", type=non_negative_int, default=2, help="lines after each line checked for a triple entendre")
     args = ap.parse_args()
-    detect(args.input, args.output, args.model, train=args.train)
+    if args.incremental and args.train:
+        ap.error("--train needs every song: run it without --incremental")
+    detect(args.input, args.output, args.model, train=args.train,
+           cache_path=None if args.no_embed_cache else args.embed_cache, cache_max_entries=args.embed_cache_size,
+           bucketed=args.bucketed, max_batch_tokens=args.max_batch_tokens, bucket_songs=args.bucket_songs,
+           workers=args.workers, threads_per_worker=args.threads_per_worker, backend=args.backend,
+           triple_window=args.triple_window, chunk_rows=args.chunk_rows,
+           incremental=args.incremental, classifier=args.classifier, score_batch_lines=args.score_batch_lines,
+           train_shards=args.train_shards, trainer=args.trainer,
+           embedding_store=args.embedding_store, store_dtype=args.store_dtype)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,139 @@
+import hashlib
+import os
+from typing import Dict, Iterator, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: CSV output still streams without it
+    pa = pq = None
+
+DETECTION_COLUMNS = ["spotify_id", "title", "artists", "line_idx", "line_text", "double_prob",
+                     "triple_signal", "triple_window"]
+# repeated once per line of a song; stored as dictionary pages in Parquet
+DICTIONARY_COLUMNS = ["spotify_id", "title", "artists"]
+
+def is_parquet(path: str) -> bool:
+    return str(path).endswith(".parquet")
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet detections need pyarrow; pip install pyarrow or write a .csv")
+
+def _schema():
+    return pa.schema([
+        ("spotify_id", pa.string()), ("title", pa.string()), ("artists", pa.string()),
+        ("line_idx", pa.int32()), ("line_text", pa.string()), ("double_prob", pa.float64()),
+        ("triple_signal", pa.float64()), ("triple_window", pa.float64()),
+    ])
+
+class DetectionWriter:
+    """Buffers per-song detection columns and flushes every `chunk_rows` lines to Parquet (or CSV)."""
+
+    def __init__(self, path: str, chunk_rows: int = 100_000):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.parquet = is_parquet(path)
+        if self.parquet:
+            _require_pyarrow()
+        self.rows = 0
+        self._buffer: Dict[str, List[np.ndarray]] = {c: [] for c in DETECTION_COLUMNS}
+        self._buffered = 0
+        self._writer = None
+        self._csv_started = False
+
+    def add_song(self, row, line_texts: Sequence[str], double_prob: np.ndarray, triple_signal: float,
+                 triple_window: np.ndarray):
+        n = len(double_prob)
+        if n == 0:
+            return
+        buf = self._buffer
+        for c in DICTIONARY_COLUMNS:
+            buf[c].append(np.full(n, row[c], dtype=object))
+        buf["line_idx"].append(np.arange(n, dtype=np.int32))
+        buf["line_text"].append(np.asarray(line_texts[:n], dtype=object))
+        buf["double_prob"].append(np.asarray(double_prob, dtype=np.float64))
+        buf["triple_signal"].append(np.full(n, triple_signal, dtype=np.float64))
+        buf["triple_window"].append(np.asarray(triple_window[:n], dtype=np.float64))
+        self._buffered += n
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def add_frame(self, frame: pd.DataFrame):
+        # rows carried over from an earlier detections file
+        if not len(frame):
+            return
+        for c in DETECTION_COLUMNS:
+            self._buffer[c].append(frame[c].to_numpy())
+        self._buffered += len(frame)
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        frame = pd.DataFrame({c: np.concatenate(parts) for c, parts in self._buffer.items()})
+        if self.parquet:
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, _schema(), use_dictionary=DICTIONARY_COLUMNS)
+            self._writer.write_table(pa.Table.from_pandas(frame, schema=_schema(), preserve_index=False))
+        else:
+            frame.to_csv(self.path, mode="a" if self._csv_started else "w", header=not self._csv_started, index=False)
+            self._csv_started = True
+        self.rows += self._buffered
+        self._buffer = {c: [] for c in DETECTION_COLUMNS}
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        if self.parquet:
+            if self._writer is None:  # no detections at all: still leave a readable, empty file
+                pq.write_table(_schema().empty_table(), self.path)
+            else:
+                self._writer.close()
+        elif not self._csv_started:
+            pd.DataFrame(columns=DETECTION_COLUMNS).to_csv(self.path, index=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_detection_chunks(path: str, columns: Optional[List[str]] = None,
+                          chunk_rows: int = 100_000) -> Iterator[pd.DataFrame]:
+    if is_parquet(path):
+        _require_pyarrow()
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+def read_detections(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    chunks = list(iter_detection_chunks(path, columns))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns or DETECTION_COLUMNS)
+
+def fingerprints_path(detections_path: str) -> str:
+    return f"{detections_path}.fingerprints.csv"
+
+def song_fingerprint(text: str, config_key: str) -> str:
+    return hashlib.blake2b(f"{config_key}\x00{text}".encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+def load_fingerprints(detections_path: str) -> Dict[str, str]:
+    path = fingerprints_path(detections_path)
+    if not (os.path.exists(path) and os.path.exists(detections_path)):
+        return {}
+    df = pd.read_csv(path, dtype=str)
+    return dict(zip(df["spotify_id"], df["fingerprint"]))
+
+def save_fingerprints(detections_path: str, fingerprints: Dict[str, str]):
+    path = fingerprints_path(detections_path)
+    tmp = f"{path}.tmp"
+    pd.DataFrame({"spotify_id": list(fingerprints), "fingerprint": list(fingerprints.values())}).to_csv(tmp, index=False)
+    os.replace(tmp, path)
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import hashlib
+import numpy as np
+from typing import Dict, Iterable
+
+def normalize_line(text: str) -> str:
+    # whitespace-insensitive; the tokenizer would collapse it anyway
+    return " ".join(text.split())
+
+def line_key(model_name: str, text: str) -> bytes:
+    return hashlib.blake2b(f"{model_name}\x00{normalize_line(text)}".encode("utf-8"), digest_size=16).digest()
+
+class EmbeddingCache:
+    """Persistent (model, line) -> embedding cache in SQLite with LRU eviction."""
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 2_000_000):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS emb ("
+            "key BLOB PRIMARY KEY, dim INTEGER NOT NULL, vec BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS emb_last_used ON emb(last_used)")
+        self.conn.commit()
+        # logical clock rather than wall time so LRU order is exact within a run
+        self.tick = self.conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM emb").fetchone()[0]
+        # running row count, kept up to date by put_many and evict instead of a COUNT(*) per put
+        self.entries = len(self)
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        by_key = {line_key(self.model_name, t): t for t in texts}
+        found = {}
+        keys = list(by_key)
+        for i in range(0, len(keys), 500):  # stay under SQLite's host-parameter limit
+            chunk = keys[i:i+500]
+            marks = ",".join("?" * len(chunk))
+            for key, dim, vec in self.conn.execute(f"SELECT key, dim, vec FROM emb WHERE key IN ({marks})", chunk):
+                found[by_key[key]] = np.frombuffer(vec, dtype=np.float32, count=dim)
+        if found:
+            self.tick += 1
+            self.conn.executemany("UPDATE emb SET last_used=? WHERE key=?",
+                                  [(self.tick, line_key(self.model_name, t)) for t in found])
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(by_key) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        self.tick += 1
+        rows = [(line_key(self.model_name, t), int(v.shape[0]), np.asarray(v, dtype=np.float32).tobytes(), self.tick)
+                for t, v in items.items()]
+        # insert-or-ignore so the change count is exactly the new rows; keys already cached are rewritten after
+        before = self.conn.total_changes
+        self.conn.executemany("INSERT OR IGNORE INTO emb (key, dim, vec, last_used) VALUES (?, ?, ?, ?)", rows)
+        added = self.conn.total_changes - before
+        if added < len(rows):
+            self.conn.executemany("UPDATE emb SET dim=?, vec=?, last_used=? WHERE key=?",
+                                  [(dim, vec, tick, key) for key, dim, vec, tick in rows])
+        self.entries += added
+        self.evict()
+        self.conn.commit()
+
+    def evict(self):
+        excess = self.entries - self.max_entries
+        if excess > 0:
+            cur = self.conn.execute(
+                "DELETE FROM emb WHERE key IN (SELECT key FROM emb ORDER BY last_used ASC LIMIT ?)", (excess,)
+            )
+            self.entries -= cur.rowcount
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
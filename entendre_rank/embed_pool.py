@@ -0,0 +1,47 @@
+import os
+import multiprocessing as mp
+import numpy as np
+import torch
+from typing import Callable, Iterable, Iterator, List, Optional
+
+_worker = {}
+
+def _init_worker(loader: Callable, model_name: str, threads: int, backend: str):
+    torch.set_num_threads(threads)
+    _worker["embedder"] = loader(model_name, device="cpu", backend=backend)
+
+def _embed_shard(batch: List[str]) -> np.ndarray:
+    from .detection_model import _embed_batch
+    tokenizer, model, device = _worker["embedder"]
+    return _embed_batch(tokenizer, model, device, batch)
+
+def default_loader(model_name: str, device=None, backend: str="torch"):
+    from .detection_model import load_embedder
+    return load_embedder(model_name, device=device, backend=backend)
+
+class EmbedderPool:
+    """CPU process pool; every worker loads the model once and embeds whole batches."""
+
+    def __init__(self, model_name: str, workers: int, threads_per_worker: Optional[int]=None,
+                 loader: Callable=default_loader, backend: str="torch"):
+        self.workers = workers
+        self.threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        # spawn, not fork: forking a process that already holds torch thread pools can deadlock
+        self.pool = mp.get_context("spawn").Pool(workers, initializer=_init_worker,
+                                                 initargs=(loader, model_name, self.threads, backend))
+
+    def map_batches(self, batches: Iterable[List[str]]) -> Iterator[np.ndarray]:
+        # imap keeps input order while results stream back as workers finish
+        return self.pool.imap(_embed_shard, batches)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.pool.terminate()  # nobody will read the batches still queued
+        self.close()
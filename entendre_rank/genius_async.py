@@ -0,0 +1,139 @@
+import asyncio
+import random
+import re
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, List, Optional, Sequence, Tuple
+import aiohttp
+from bs4 import BeautifulSoup, NavigableString
+from .manifest import FETCHED, MISSING, FAILED
+from .rate_limit import RateLimiter
+
+GENIUS_API = "https://api.genius.com"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Async front for RateLimiter: waiters queue on an asyncio lock and sleep without blocking the loop."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.limiter = RateLimiter(rate, capacity)
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                wait = self.limiter.try_acquire()
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        self.limiter.pause(seconds)
+
+class RetryableError(Exception):
+    pass
+
+def parse_lyrics_html(html: str) -> Optional[str]:
+    soup = BeautifulSoup(html, "html.parser")
+    for header in soup.find_all("div", class_=re.compile("LyricsHeader")):
+        header.decompose()
+    containers = soup.find_all("div", attrs={"data-lyrics-container": "true"})
+    if not containers:
+        return None
+    for br in soup.find_all("br"):
+        br.replace_with(NavigableString("\n"))
+    text = "\n".join(c.get_text() for c in containers)
+    # same text as lyricsgenius with remove_section_headers=True: no [Verse 1] / [Chorus] lines
+    text = re.sub(r"(\[.*?\])*", "", text)
+    text = re.sub("\n{2}", "\n", text).strip()
+    return text or None
+
+def retry_after_seconds(value: str) -> Optional[float]:
+    # Retry-After is either delay-seconds or an HTTP-date; None if it is neither
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def pick_hit(hits: List[dict], artist: str) -> Optional[dict]:
+    songs = [h["result"] for h in hits if h.get("type") == "song" and h.get("result")]
+    artist = artist.lower().strip()
+    for s in songs:
+        if artist and artist in (s.get("primary_artist", {}).get("name") or "").lower():
+            return s
+    return songs[0] if songs else None
+
+class AsyncGeniusFetcher:
+    def __init__(self, token: str, rate: float = 5.0, burst: Optional[float] = None, concurrency: int = 8,
+                 timeout: float = 10.0, max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0,
+                 api_base: str = GENIUS_API):
+        if not token:
+            raise RuntimeError("GENIUS_ACCESS_TOKEN not set")
+        self.token = token
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.api_base = api_base.rstrip("/")
+        self.retries = 0
+
+    async def _get(self, session: aiohttp.ClientSession, url: str, params=None, as_json: bool = True):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with session.get(url, params=params) as resp:
+                    if resp.status in RETRY_STATUS:
+                        retry_after = retry_after_seconds(resp.headers.get("Retry-After") or "")
+                        if resp.status == 429 and retry_after is not None:
+                            self.bucket.pause(retry_after)
+                        raise RetryableError(f"HTTP {resp.status}")
+                    resp.raise_for_status()
+                    return await (resp.json() if as_json else resp.text())
+            except (RetryableError, asyncio.TimeoutError, aiohttp.ClientConnectionError):
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+    async def fetch_lyrics(self, session: aiohttp.ClientSession, title: str, artist: str) -> Optional[str]:
+        # None means Genius has no lyrics for the song; transport/HTTP errors propagate
+        data = await self._get(session, f"{self.api_base}/search", params={"q": f"{title} {artist}".strip()})
+        hit = pick_hit(data.get("response", {}).get("hits", []), artist)
+        if not hit or not hit.get("url"):
+            return None
+        return parse_lyrics_html(await self._get(session, hit["url"], as_json=False))
+
+    async def fetch_many(self, queries: Sequence[Tuple[str, str]],
+                         on_result: Optional[Callable[[int, str, Optional[str]], None]] = None) -> List[Optional[str]]:
+        self.bucket = TokenBucket(self.rate, self.burst)
+        sem = asyncio.Semaphore(self.concurrency)
+        results: List[Optional[str]] = [None] * len(queries)
+        headers = {"Authorization": f"Bearer {self.token}", "User-Agent": "EntendreRank"}
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
+            async def one(i: int, title: str, artist: str):
+                async with sem:
+                    try:
+                        results[i] = await self.fetch_lyrics(session, title, artist)
+                        status = FETCHED if results[i] else MISSING
+                    except Exception:
+                        status = FAILED
+                if on_result is not None:
+                    on_result(i, status, results[i])
+            await asyncio.gather(*(one(i, t, a) for i, (t, a) in enumerate(queries)))
+        return results
+
+def fetch_lyrics_many(token: str, queries: Sequence[Tuple[str, str]],
+                      on_result: Optional[Callable[[int, str, Optional[str]], None]] = None, **kw) -> List[Optional[str]]:
+    return asyncio.run(AsyncGeniusFetcher(token, **kw).fetch_many(queries, on_result=on_result))
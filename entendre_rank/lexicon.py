@@ -0,0 +1,241 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+LEXICON_DIR = os.getenv("ENTENDRE_LEXICON_DIR", os.path.join(os.path.dirname(__file__), "lexicons"))
+LEXICON_SUFFIX = ".tsv"
+# the engineered feature columns, in order; further categories are matched but not featurized
+FEATURE_CATEGORIES = ("ambiguous", "sexual", "drug")
+TOKEN_RE = re.compile(r"[a-zA-Z']+")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def read_lexicon_file(path: str) -> List[Tuple[str, float]]:
+    # "<entry>[\t<weight>]" per line; blank lines and "#" comments are skipped
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            phrase, _, weight = line.partition("\t")
+            try:
+                entries.append((phrase.strip(), float(weight) if weight.strip() else 1.0))
+            except ValueError:
+                raise ValueError(f"{path}:{n}: bad weight {weight.strip()!r}") from None
+    return entries
+
+def load_lexicon_dir(path: str = LEXICON_DIR) -> Dict[str, List[Tuple[str, float]]]:
+    # one file per category, named after it
+    files = sorted(glob.glob(os.path.join(path, f"*{LEXICON_SUFFIX}")))
+    if not files:
+        raise FileNotFoundError(f"no *{LEXICON_SUFFIX} lexicon files in {path}")
+    return {os.path.basename(fn)[:-len(LEXICON_SUFFIX)]: read_lexicon_file(fn) for fn in files}
+
+# tokens of up to PACKED_WIDTH characters fit in a uint64 at 5 bits per character
+PACKED_WIDTH = 12
+
+def pack_tokens(keys: np.ndarray) -> np.ndarray:
+    # (n, width) lowercased token bytes, zero-padded on the right -> one uint64 per token, in the same
+    # order as the tokens' bytes: padding is 0, "'" is 1 and a-z are 2-27
+    codes = (keys & np.uint8(31)).astype(np.uint64) + np.uint64(1)
+    codes[keys == ord("'")] = 1
+    codes[keys == 0] = 0
+    shifts = np.arange(5 * (keys.shape[1] - 1), -1, -5, dtype=np.uint64)
+    return (codes << shifts).sum(axis=1, dtype=np.uint64)
+
+class LexiconMatcher:
+    """Aho-Corasick automaton over tokens: all single- and multi-word entries in one pass per line."""
+
+    def __init__(self, lexicons: Dict[str, Iterable[Tuple[str, float]]]):
+        self.categories = list(FEATURE_CATEGORIES) + sorted(set(lexicons) - set(FEATURE_CATEGORIES))
+        self.vocab: Dict[str, int] = {}
+        entry_ids: Dict[Tuple[int, ...], int] = {}
+        weights: Dict[Tuple[int, int], float] = {}
+        for c, cat in enumerate(self.categories):
+            for phrase, weight in lexicons.get(cat, ()):
+                toks = tokenize(phrase)
+                if not toks:
+                    continue
+                key = tuple(self.vocab.setdefault(t, len(self.vocab)) for t in toks)
+                e = entry_ids.setdefault(key, len(entry_ids))
+                weights[e, c] = weight
+        tokens = self.tokens
+        self.entries = [" ".join(tokens[i] for i in key) for key in entry_ids]
+        # content hash, independent of file and line order: changes whenever matching results can
+        content = sorted(f"{self.categories[c]}\t{self.entries[e]}\t{w!r}" for (e, c), w in weights.items())
+        self.fingerprint = hashlib.blake2b("\n".join(content).encode(), digest_size=8).hexdigest()
+        self.entry_lengths = np.array([len(key) for key in entry_ids], dtype=np.int64)
+        self.max_entry_len = int(self.entry_lengths.max()) if len(entry_ids) else 0
+        self.member = np.zeros((len(entry_ids), len(self.categories)), dtype=bool)
+        self.weight = np.zeros((len(entry_ids), len(self.categories)), dtype=np.float64)
+        for (e, c), w in weights.items():
+            self.member[e, c] = True
+            self.weight[e, c] = w
+        self.entry_categories = [tuple(np.flatnonzero(row).tolist()) for row in self.member]
+        self._build(list(entry_ids))
+
+    @property
+    def tokens(self) -> List[str]:
+        # vocab ids -> tokens
+        out = [""] * len(self.vocab)
+        for t, i in self.vocab.items():
+            out[i] = t
+        return out
+
+    def _build(self, keys: List[Tuple[int, ...]]):
+        # trie over token ids, then breadth-first failure links with outputs merged along them
+        self.goto: List[Dict[int, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for e, key in enumerate(keys):
+            s = 0
+            for tok in key:
+                if tok not in self.goto[s]:
+                    self.goto.append({})
+                    out.append([])
+                    self.goto[s][tok] = len(self.goto) - 1
+                s = self.goto[s][tok]
+            out[s].append(e)
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for tok, t in self.goto[s].items():
+                queue.append(t)
+                if s == 0:
+                    continue  # depth-1 states fail to the root
+                f = self.fail[s]
+                while f and tok not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[t] = self.goto[f].get(tok, 0)
+                out[t] = out[t] + out[self.fail[t]]
+        self.out = [tuple(o) for o in out]
+        # single-token entries by vocab id, for the vectorized path
+        self.single = np.full(len(self.vocab), -1, dtype=np.int64)
+        for e, key in enumerate(keys):
+            if len(key) == 1:
+                self.single[key[0]] = e
+        # vocabulary sorted for np.searchsorted lookups of whole token arrays
+        tokens = self.tokens
+        self.vocab_order = np.argsort(np.array(tokens, dtype=str), kind="stable").astype(np.int64)
+        self.vocab_sorted = np.array(tokens, dtype=str)[self.vocab_order]
+        self.vocab_bytes = np.array(tokens, dtype=bytes)[self.vocab_order]
+        # (length, first byte, last byte) of every vocabulary token, to skip most other tokens before a lookup;
+        # lengths past the longest token share the last, all-False, row
+        width = self.vocab_bytes.dtype.itemsize
+        self.token_prefilter = np.zeros((width + 2) << 16, dtype=bool)
+        for t in tokens:
+            b = t.encode()
+            self.token_prefilter[(len(b) << 16) | (b[0] << 8) | b[-1]] = True
+        # the same order as integers when every token fits in one (see pack_tokens)
+        self.vocab_packed = None
+        if width <= PACKED_WIDTH:
+            self.vocab_packed = pack_tokens(self.vocab_bytes.view(np.uint8).reshape(len(tokens), width))
+
+    def match_ids(self, ids: Sequence[int]) -> List[Tuple[int, int]]:
+        # ids: vocab id per token, -1 for tokens outside the vocabulary; returns (end token, entry) pairs
+        found = []
+        s = 0
+        for pos, tok in enumerate(ids):
+            if tok < 0:
+                s = 0
+                continue
+            while s and tok not in self.goto[s]:
+                s = self.fail[s]
+            s = self.goto[s].get(tok, 0)
+            for e in self.out[s]:
+                found.append((pos, e))
+        return found
+
+    def match(self, line: str) -> List[Tuple[int, int]]:
+        vocab = self.vocab
+        return self.match_ids([vocab.get(t, -1) for t in tokenize(line)])
+
+    def entries_in(self, line: str) -> set:
+        return {e for _, e in self.match(line)}
+
+    def hits(self, line: str, categories: Sequence[str] = FEATURE_CATEGORIES) -> Tuple[int, ...]:
+        # distinct entries per category, like the old set-intersection counts
+        return self.category_counts(self.entries_in(line), categories)
+
+    def category_counts(self, entries: Iterable[int], categories: Sequence[str] = FEATURE_CATEGORIES) -> Tuple[int, ...]:
+        counts = [0] * len(self.categories)
+        for e in entries:
+            for c in self.entry_categories[e]:
+                counts[c] += 1
+        return tuple(counts[self.categories.index(c)] for c in categories)
+
+    def scores(self, line: str, categories: Sequence[str] = FEATURE_CATEGORIES) -> Tuple[float, ...]:
+        # summed weights of the distinct entries per category
+        cols = [self.categories.index(c) for c in categories]
+        sums = self.weight[list(self.entries_in(line))][:, cols].sum(axis=0)
+        return tuple(float(x) for x in sums)
+
+    @classmethod
+    def from_dir(cls, path: str = LEXICON_DIR) -> "LexiconMatcher":
+        return cls(load_lexicon_dir(path))
+
+class LexiconSource:
+    """A lexicon directory compiled on demand and recompiled when its files change."""
+
+    def __init__(self, path: str = LEXICON_DIR, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self._matcher: Optional[LexiconMatcher] = None
+        self._stamp = None
+        self._checked = 0.0
+
+    def _current_stamp(self):
+        files = sorted(glob.glob(os.path.join(self.path, f"*{LEXICON_SUFFIX}")))
+        return tuple((fn, os.stat(fn).st_mtime_ns, os.stat(fn).st_size) for fn in files)
+
+    def reload(self) -> LexiconMatcher:
+        stamp = self._current_stamp()
+        self._matcher = LexiconMatcher.from_dir(self.path)
+        self._stamp = stamp
+        self.version += 1
+        return self._matcher
+
+    def get(self) -> LexiconMatcher:
+        # stat the files at most every check_interval seconds; a failed rebuild keeps the old automaton
+        now = time.monotonic()
+        if self._matcher is None:
+            self._checked = now
+            return self.reload()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            if self._current_stamp() != self._stamp:
+                try:
+                    self.reload()
+                except (OSError, ValueError) as e:
+                    print(f"Lexicon reload failed, keeping version {self.version}: {e}")
+        return self._matcher
+
+DEFAULT_SOURCE = LexiconSource()
+
+def default_matcher() -> LexiconMatcher:
+    return DEFAULT_SOURCE.get()
+
+def main():
+    ap = argparse.ArgumentParser(description="Compile a lexicon directory and report it, optionally matching text")
+    ap.add_argument("--dir", type=str, default=LEXICON_DIR)
+    ap.add_argument("text", nargs="*", help="lines to match against the compiled lexicon")
+    args = ap.parse_args()
+    m = LexiconMatcher.from_dir(args.dir)
+    print(f"{len(m.entries)} entries, {len(m.vocab)} tokens, {len(m.goto)} states, longest entry {m.max_entry_len} tokens")
+    for c, cat in enumerate(m.categories):
+        print(f"  {cat}: {int(m.member[:, c].sum())}")
+    for line in args.text:
+        found = sorted(m.entries_in(line))
+        print(f"{line!r}: " + ", ".join(f"{m.entries[e]} ({'/'.join(m.categories[c] for c in np.flatnonzero(m.member[e]))})" for e in found))
+
+if __name__ == "__main__":
+    main()
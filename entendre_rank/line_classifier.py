@@ -0,0 +1,93 @@
+import glob
+import json
+import os
+import time
+from typing import Optional
+import joblib
+import numpy as np
+import sklearn
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from .config import MODELS_DIR, RANDOM_SEED
+from .utils import FEATURE_COLUMNS, FEATURE_VERSION
+
+CLASSIFIER_DIR = os.path.join(MODELS_DIR, "line_classifier")
+# engineered columns appended to the line embedding, in this order
+FEATURE_NAMES = FEATURE_COLUMNS[1:]
+
+def new_pipeline() -> Pipeline:
+    return Pipeline([("scaler", StandardScaler(with_mean=False)),
+                     ("lr", LogisticRegression(max_iter=1000, class_weight="balanced", random_state=RANDOM_SEED))])
+
+class LineClassifier:
+    """A fitted scaler+logistic-regression pipeline folded into one weight vector for batch scoring."""
+
+    def __init__(self, pipeline: Pipeline, meta: dict):
+        self.pipeline = pipeline
+        self.meta = meta
+        scaler, lr = pipeline.named_steps["scaler"], pipeline.named_steps["lr"]
+        # (x / scale) @ coef + b == x @ (coef / scale) + b
+        scale = scaler.scale_ if scaler.scale_ is not None else 1.0
+        self.weights = (lr.coef_[0] / scale).astype(np.float32)
+        self.bias = float(lr.intercept_[0])
+
+    @property
+    def version(self) -> str:
+        return self.meta["version"]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        # P(double entendre) for every row: one matrix-vector product per batch
+        z = np.asarray(X, dtype=np.float32) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-z.astype(np.float64)))
+
+def _next_version(out_dir: str) -> str:
+    taken = [int(os.path.basename(p)[1:-5]) for p in glob.glob(os.path.join(out_dir, "v*.json"))]
+    return f"v{max(taken, default=0) + 1:04d}"
+
+def save_classifier(pipeline: Pipeline, embedding_model: str, lexicon_fingerprint: str, n_train: int,
+                    out_dir: Optional[str] = None) -> str:
+    out_dir = out_dir or CLASSIFIER_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    version = _next_version(out_dir)
+    meta = {
+        "version": version,
+        "embedding_model": embedding_model,
+        "n_features": int(pipeline.named_steps["lr"].coef_.shape[1]),
+        "feature_names": FEATURE_NAMES,
+        "feature_version": FEATURE_VERSION,
+        "lexicon": lexicon_fingerprint,
+        "n_train": n_train,
+        "sklearn": sklearn.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    path = os.path.join(out_dir, f"{version}.joblib")
+    joblib.dump(pipeline, path)
+    with open(os.path.join(out_dir, f"{version}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    # LATEST only moves once both files of the version are on disk, and atomically: readers see the
+    # old version or the new one, never an empty or half-written file
+    latest = os.path.join(out_dir, "LATEST")
+    with open(latest + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(latest + ".tmp", latest)
+    return path
+
+def load_classifier(ref: str = "latest", embedding_model: Optional[str] = None,
+                    out_dir: Optional[str] = None) -> LineClassifier:
+    # ref: "latest", a version name like "v0003", or a path to a .joblib artifact
+    out_dir = out_dir or CLASSIFIER_DIR
+    if ref.endswith(".joblib"):
+        path = ref
+    else:
+        if ref == "latest":
+            with open(os.path.join(out_dir, "LATEST"), "r", encoding="utf-8") as f:
+                ref = f.read().strip()
+        path = os.path.join(out_dir, f"{ref}.joblib")
+    with open(path[:-len(".joblib")] + ".json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if embedding_model is not None and meta["embedding_model"] != embedding_model:
+        raise ValueError(f"classifier {meta['version']} was trained on {meta['embedding_model']} embeddings, not {embedding_model}")
+    if meta["feature_version"] != FEATURE_VERSION or meta["feature_names"] != FEATURE_NAMES:
+        raise ValueError(f"classifier {meta['version']} was trained on other engineered features; retrain with --train")
+    return LineClassifier(joblib.load(path), meta)
@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+from typing import Iterator, Optional, Tuple
+import numpy as np
+
+DTYPES = ("float16", "float32")
+
+def is_line_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "meta.json")) and os.path.isfile(os.path.join(path, "index.sqlite"))
+
+def data_file(generation: int) -> str:
+    # compact() writes each new generation of the matrix to a new file
+    return "embeddings.bin" if generation == 0 else f"embeddings.{generation}.bin"
+
+class LineEmbeddingStore:
+    """Append-only matrix of line embeddings on disk, memory-mapped for reads.
+
+    Each song's lines are contiguous rows; a SQLite index maps spotify_id -> (first row, line count),
+    so (spotify_id, line_idx) is row start + line_idx. Re-adding a song points the index at new rows
+    and leaves the old ones as garbage until compact(). The index also records which data file is
+    current, so offsets and file always change together.
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None, dtype: str = "float16", model_name: Optional[str] = None,
+                 commit_every: int = 1000):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if dim is not None and dim != self.meta["dim"]:
+                raise ValueError(f"{path} holds {self.meta['dim']}-d embeddings, not {dim}-d")
+            if model_name is not None and model_name != self.meta["model"]:
+                raise ValueError(f"{path} holds {self.meta['model']} embeddings, not {model_name}")
+        else:
+            if dim is None:
+                raise ValueError(f"{path} is not a line embedding store; pass dim to create one")
+            if dtype not in DTYPES:
+                raise ValueError(f"dtype must be one of {DTYPES}")
+            self.meta = {"dim": dim, "dtype": dtype, "model": model_name}
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(self.meta, f)
+        self.dim = self.meta["dim"]
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self.commit_every = commit_every
+        self.conn = sqlite3.connect(os.path.join(path, "index.sqlite"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS songs (spotify_id TEXT PRIMARY KEY, start INTEGER NOT NULL, "
+                          "n_lines INTEGER NOT NULL, key TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS store (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.execute("INSERT OR IGNORE INTO store (key, value) VALUES ('generation', 0)")
+        self.conn.commit()
+        self.generation = self.conn.execute("SELECT value FROM store WHERE key='generation'").fetchone()[0]
+        self.data_path = os.path.join(path, data_file(self.generation))
+        # data files of other generations are left over from a compact() that didn't finish
+        for fn in os.listdir(path):
+            if fn.startswith("embeddings.") and fn.endswith(".bin") and fn != data_file(self.generation):
+                os.remove(os.path.join(path, fn))
+        # rows past the last committed song come from an interrupted append: drop them
+        end = self.conn.execute("SELECT COALESCE(MAX(start + n_lines), 0) FROM songs").fetchone()[0]
+        with open(self.data_path, "ab") as f:
+            f.truncate(end * self.row_bytes)
+        self.n_rows = end
+        self._fh = open(self.data_path, "ab")
+        self._pending = 0
+        self._mmap = None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def __contains__(self, spotify_id: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM songs WHERE spotify_id=?", (spotify_id,)).fetchone() is not None
+
+    def key(self, spotify_id: str) -> Optional[str]:
+        row = self.conn.execute("SELECT key FROM songs WHERE spotify_id=?", (spotify_id,)).fetchone()
+        return row[0] if row else None
+
+    def keys(self) -> dict:
+        return dict(self.conn.execute("SELECT spotify_id, key FROM songs"))
+
+    def append(self, spotify_id: str, embs: np.ndarray, key: Optional[str] = None):
+        embs = np.ascontiguousarray(embs, dtype=self.dtype)
+        if embs.ndim != 2 or embs.shape[1] != self.dim:
+            raise ValueError(f"expected (n, {self.dim}) embeddings, got {embs.shape}")
+        self._fh.write(embs.tobytes())
+        self.conn.execute("INSERT OR REPLACE INTO songs (spotify_id, start, n_lines, key) VALUES (?, ?, ?, ?)",
+                          (spotify_id, self.n_rows, len(embs), key))
+        self.n_rows += len(embs)
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        # data before index: a committed index entry never points past the file
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self.conn.commit()
+        self._pending = 0
+
+    def matrix(self) -> np.ndarray:
+        # every row, zero-copy; remapped when the file has grown
+        if self._pending:
+            self.flush()
+        if self._mmap is None or len(self._mmap) != self.n_rows:
+            if self.n_rows == 0:
+                return np.zeros((0, self.dim), dtype=self.dtype)
+            self._mmap = np.memmap(self.data_path, dtype=self.dtype, mode="r", shape=(self.n_rows, self.dim))
+        return self._mmap
+
+    def span(self, spotify_id: str) -> Optional[Tuple[int, int]]:
+        return self.conn.execute("SELECT start, n_lines FROM songs WHERE spotify_id=?", (spotify_id,)).fetchone()
+
+    def get(self, spotify_id: str) -> Optional[np.ndarray]:
+        # (n_lines, dim) view into the memory map
+        span = self.span(spotify_id)
+        if span is None:
+            return None
+        start, n = span
+        return self.matrix()[start:start + n]
+
+    def get_line(self, spotify_id: str, line_idx: int) -> np.ndarray:
+        start, n = self.span(spotify_id)
+        if not 0 <= line_idx < n:
+            raise IndexError(f"{spotify_id} has {n} lines")
+        return self.matrix()[start + line_idx]
+
+    def iter_songs(self) -> Iterator[Tuple[str, np.ndarray]]:
+        mat = self.matrix()
+        for sid, start, n in self.conn.execute("SELECT spotify_id, start, n_lines FROM songs ORDER BY start"):
+            yield sid, mat[start:start + n]
+
+    def locate(self, rows: np.ndarray) -> list:
+        # global row numbers -> (spotify_id, line_idx)
+        spans = self.conn.execute("SELECT start, n_lines, spotify_id FROM songs ORDER BY start").fetchall()
+        starts = np.array([s for s, _, _ in spans], dtype=np.int64)
+        out = []
+        for r in np.asarray(rows).tolist():
+            i = int(np.searchsorted(starts, r, side="right")) - 1
+            if i >= 0 and r < spans[i][0] + spans[i][1]:
+                out.append((spans[i][2], r - spans[i][0]))
+            else:
+                out.append((None, None))  # garbage row of a replaced song
+        return out
+
+    def nearest(self, query: np.ndarray, k: int = 10, chunk_rows: int = 65536) -> list:
+        # brute-force cosine top-k over the memory map, paged in chunk by chunk
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        live = np.zeros(self.n_rows, dtype=bool)
+        for start, n in self.conn.execute("SELECT start, n_lines FROM songs"):
+            live[start:start + n] = True
+        best_rows, best_sims = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        mat = self.matrix()
+        for i in range(0, self.n_rows, chunk_rows):
+            block = np.asarray(mat[i:i + chunk_rows], dtype=np.float32)
+            sims = block @ q / np.maximum(np.linalg.norm(block, axis=1), 1e-12)
+            sims[~live[i:i + chunk_rows]] = -np.inf
+            rows = np.r_[best_rows, np.arange(i, i + len(block))]
+            sims = np.r_[best_sims, sims]
+            top = np.argsort(-sims, kind="stable")[:k]
+            best_rows, best_sims = rows[top], sims[top]
+        keep = np.isfinite(best_sims)
+        return [(sid, line, float(s)) for (sid, line), s in zip(self.locate(best_rows[keep]), best_sims[keep])]
+
+    def compact(self):
+        # rewrite only the rows the index still points at into the next generation's file; the new offsets
+        # and the switch to that file commit in one transaction, and only then is the old file removed
+        self.flush()
+        mat = self.matrix()
+        generation = self.generation + 1
+        new_path = os.path.join(self.path, data_file(generation))
+        new_start = 0
+        updates = []
+        with open(new_path, "wb") as f:
+            for sid, start, n in self.conn.execute("SELECT spotify_id, start, n_lines FROM songs ORDER BY start").fetchall():
+                f.write(np.ascontiguousarray(mat[start:start + n]).tobytes())
+                updates.append((new_start, sid))
+                new_start += n
+            f.flush()
+            os.fsync(f.fileno())
+        self.conn.executemany("UPDATE songs SET start=? WHERE spotify_id=?", updates)
+        self.conn.execute("UPDATE store SET value=? WHERE key='generation'", (generation,))
+        self.conn.commit()
+        self._mmap = None
+        del mat
+        self._fh.close()
+        os.remove(self.data_path)
+        self.generation, self.data_path, self.n_rows = generation, new_path, new_start
+        self._fh = open(self.data_path, "ab")
+
+    def close(self):
+        self.flush()
+        self._fh.close()
+        self._mmap = None
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,179 @@
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple
+import pandas as pd
+
+STORE_SUFFIX = ".sqlite"
+LEGACY_LYRICS_DIR = "data/raw_lyrics"
+# Spotify track ids are 22 base62 characters
+TRACK_ID_RE = re.compile(r"[0-9A-Za-z]{22}")
+
+try:
+    import zstandard
+except ImportError:  # optional: fall back to zlib, the reader handles both
+    zstandard = None
+
+def _compress(text: str) -> Tuple[str, bytes]:
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=9).compress(raw)
+    return "zlib", zlib.compress(raw, 9)
+
+def _decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("lyrics store was written with zstd; pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+def is_lyrics_store(path: str) -> bool:
+    return str(path).endswith(STORE_SUFFIX)
+
+class LyricsStore:
+    """All lyrics in one compressed SQLite file: random access by spotify_id and sequential streaming."""
+
+    def __init__(self, path: str, commit_every: int = 200):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS lyrics (spotify_id TEXT PRIMARY KEY, codec TEXT NOT NULL, data BLOB NOT NULL)")
+        self.conn.commit()
+
+    def __contains__(self, spotify_id: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM lyrics WHERE spotify_id=?", (spotify_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM lyrics").fetchone()[0]
+
+    def get(self, spotify_id: str) -> Optional[str]:
+        row = self.conn.execute("SELECT codec, data FROM lyrics WHERE spotify_id=?", (spotify_id,)).fetchone()
+        return _decompress(*row) if row else None
+
+    def location(self, spotify_id: str) -> str:
+        # what songs.csv stores as lyrics_path
+        return self.path
+
+    def put(self, spotify_id: str, text: str) -> str:
+        # committed every commit_every songs and on close, not per song
+        self.conn.execute("INSERT OR REPLACE INTO lyrics (spotify_id, codec, data) VALUES (?, ?, ?)",
+                          (spotify_id, *_compress(text)))
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.flush()
+        return self.path
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        self.conn.executemany("INSERT OR REPLACE INTO lyrics (spotify_id, codec, data) VALUES (?, ?, ?)",
+                              ((sid, *_compress(text)) for sid, text in items))
+        self.flush()
+
+    def flush(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def iter_items(self) -> Iterator[Tuple[str, str]]:
+        # insertion order; the cursor streams rows so memory stays flat
+        for sid, codec, data in self.conn.execute("SELECT spotify_id, codec, data FROM lyrics ORDER BY rowid"):
+            yield sid, _decompress(codec, data)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+class LyricsDirectory:
+    """The original one-.txt-per-track layout behind the same interface."""
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def location(self, spotify_id: str) -> str:
+        return os.path.join(self.path, f"{spotify_id}.txt")
+
+    def __contains__(self, spotify_id: str) -> bool:
+        return os.path.exists(self.location(spotify_id))
+
+    def get(self, spotify_id: str) -> Optional[str]:
+        if spotify_id not in self:
+            return None
+        with open(self.location(spotify_id), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def put(self, spotify_id: str, text: str) -> str:
+        fn = self.location(spotify_id)
+        with open(fn, "w", encoding="utf-8") as f:
+            f.write(text)
+        return fn
+
+    def iter_items(self) -> Iterator[Tuple[str, str]]:
+        for fn in sorted(glob.glob(os.path.join(self.path, "*.txt"))):
+            with open(fn, "r", encoding="utf-8") as f:
+                yield os.path.splitext(os.path.basename(fn))[0], f.read()
+
+    def close(self):
+        pass
+
+def open_lyrics(path: str):
+    return LyricsStore(path) if is_lyrics_store(path) else LyricsDirectory(path)
+
+def migrate_directory(src_dir: str, store_path: str, songs_csv: Optional[str] = None, batch: int = 1000,
+                      ids: Optional[Iterable[str]] = None) -> int:
+    # every .txt file in src_dir, or only those of the given spotify ids
+    store = LyricsStore(store_path)
+    migrated = set()
+    src = LyricsDirectory(src_dir)
+    items = src.iter_items() if ids is None else ((sid, src.get(sid)) for sid in sorted(ids))
+    while True:
+        chunk = [kv for _, kv in zip(range(batch), items)]
+        if not chunk:
+            break
+        store.put_many(chunk)
+        migrated.update(sid for sid, _ in chunk)
+    store.close()
+    if songs_csv:
+        songs = pd.read_csv(songs_csv)
+        songs.loc[songs["spotify_id"].isin(migrated), "lyrics_path"] = store_path
+        songs.to_csv(songs_csv, index=False)
+    return len(migrated)
+
+def adopt_legacy_directory(store_path: str, legacy_dir: str = LEGACY_LYRICS_DIR) -> int:
+    # first run with a packed store next to an old .txt directory: pack it rather than refetch every song
+    if not is_lyrics_store(store_path) or os.path.exists(store_path):
+        return 0
+    # only files named after a track: the directory also holds placeholders like artist.txt
+    stems = sorted(os.path.basename(fn)[:-len(".txt")] for fn in glob.glob(os.path.join(legacy_dir, "*.txt")))
+    ids = [s for s in stems if TRACK_ID_RE.fullmatch(s)]
+    skipped = [f"{s}.txt" for s in stems if not TRACK_ID_RE.fullmatch(s)]
+    if skipped:
+        print(f"Not adopting {len(skipped)} files in {legacy_dir} without a track-id name: {', '.join(skipped)}")
+    if not ids:
+        return 0
+    return migrate_directory(legacy_dir, store_path, ids=ids)
+
+def main():
+    ap = argparse.ArgumentParser(description="Pack data/raw_lyrics/*.txt into a single lyrics store")
+    ap.add_argument("--src", type=str, default=LEGACY_LYRICS_DIR)
+    ap.add_argument("--store", type=str, default="data/processed/lyrics.sqlite")
+    ap.add_argument("--songs", type=str, default=None, help="songs.csv whose lyrics_path should point at the store")
+    ap.add_argument("--remove-files", action="store_true", help="delete the .txt files after a verified migration")
+    args = ap.parse_args()
+    n = migrate_directory(args.src, args.store, args.songs)
+    print(f"Packed {n} lyric files into {args.store}")
+    if args.remove_files:
+        store = LyricsStore(args.store)
+        for sid, text in LyricsDirectory(args.src).iter_items():
+            if store.get(sid) == text:
+                os.remove(os.path.join(args.src, f"{sid}.txt"))
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import json
+import os
+import time
+from typing import Dict, Optional
+
+FETCHED, MISSING, FAILED = "fetched", "missing", "failed"
+
+class CollectionManifest:
+    """Append-only JSONL log of lyric fetch outcomes; the latest line per spotify_id wins."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.latest: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash
+                    self.latest[rec["spotify_id"]] = rec
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.fh = open(path, "a", encoding="utf-8")
+
+    def record(self, spotify_id: str, status: str, **fields) -> dict:
+        rec = {"spotify_id": spotify_id, "status": status, "ts": time.time(), **fields}
+        self.fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.fh.flush()
+        self.latest[spotify_id] = rec
+        return rec
+
+    def status(self, spotify_id: str) -> Optional[str]:
+        rec = self.latest.get(spotify_id)
+        return rec["status"] if rec else None
+
+    def should_skip(self, spotify_id: str, missing_ttl: float) -> bool:
+        rec = self.latest.get(spotify_id)
+        if rec is None:
+            return False
+        if rec["status"] == FETCHED:
+            return True
+        # negative cache: Genius had no lyrics last time, don't ask again until the TTL runs out
+        return rec["status"] == MISSING and time.time() - rec["ts"] < missing_ttl
+
+    def close(self):
+        self.fh.close()
@@ -0,0 +1,76 @@
+import os
+import re
+import types
+from typing import Optional
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoTokenizer, AutoModel
+from .config import MODELS_DIR
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_CACHE_DIR = os.path.join(MODELS_DIR, "onnx")
+
+def onnx_paths(model_name: str, cache_dir: Optional[str] = None):
+    d = os.path.join(cache_dir or ONNX_CACHE_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+    return os.path.join(d, "model.onnx"), os.path.join(d, "model.int8.onnx")
+
+class _PositionalEncoder(torch.nn.Module):
+    # the TorchScript exporter traces positional inputs; map them back to HF keyword arguments
+    def __init__(self, model, names):
+        super().__init__()
+        self.model = model
+        self.names = names
+
+    def forward(self, *inputs):
+        return self.model(**dict(zip(self.names, inputs))).last_hidden_state
+
+def export_onnx(model_name: str, quantize: bool = False, cache_dir: Optional[str] = None) -> str:
+    # export once, then every later run loads straight from disk
+    fp32_path, int8_path = onnx_paths(model_name, cache_dir)
+    if not os.path.exists(fp32_path):
+        os.makedirs(os.path.dirname(fp32_path), exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample", "a second, longer export sample line"], padding=True, return_tensors="pt")
+        names = list(sample.keys())
+        axes = {n: {0: "batch", 1: "seq"} for n in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+        tmp = fp32_path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(_PositionalEncoder(model, names), tuple(sample[n] for n in names), tmp, input_names=names, output_names=["last_hidden_state"],
+                              dynamic_axes=axes, opset_version=17, dynamo=False)
+        os.replace(tmp, fp32_path)
+    if not quantize:
+        return fp32_path
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        tmp = int8_path + ".tmp.onnx"
+        quantize_dynamic(fp32_path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, int8_path)
+    return int8_path
+
+class OnnxEncoder:
+    """ONNX Runtime stand-in for the HF encoder: model(**enc).last_hidden_state."""
+
+    def __init__(self, path: str, hidden_size: int, threads: int = 0):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads or torch.get_num_threads()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.config = types.SimpleNamespace(hidden_size=hidden_size)
+
+    def __call__(self, **enc):
+        feeds = {k: v.cpu().numpy().astype(np.int64) for k, v in enc.items() if k in self.input_names}
+        (hidden,) = self.session.run(["last_hidden_state"], feeds)
+        return types.SimpleNamespace(last_hidden_state=torch.from_numpy(hidden))
+
+    def eval(self):
+        return self
+
+def load_onnx_encoder(model_name: str, backend: str = "onnx", cache_dir: Optional[str] = None) -> OnnxEncoder:
+    if backend not in BACKENDS[1:]:
+        raise ValueError(f"Unknown ONNX backend: {backend}")
+    path = export_onnx(model_name, quantize=backend == "onnx-int8", cache_dir=cache_dir)
+    return OnnxEncoder(path, AutoConfig.from_pretrained(model_name).hidden_size)
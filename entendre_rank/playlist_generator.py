@@ -1,8 +1,10 @@
 import argparse
+from typing import Dict, List, Optional
 import pandas as pd
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 from .config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
+from .ranking import add_filter_args, filter_kwargs, ranked_songs
 
 def sp_client():
     scope = "playlist-modify-public playlist-modify-private"
@@ -13,27 +15,172 @@ def sp_client():
         scope=scope
     ))
 
-def create_playlist_from_ranked(ranked_csv: str, name: str, top_n: int=50, public: bool=True):
-    sp = sp_client()
+BATCH = 100  # Spotify's limit on tracks per add/remove/replace call
+
+def create_playlist_from_ranked(ranked_csv: str, name: str, top_n: int=50, public: bool=True, **sync):
+    # the CSV is already in rank order: read only the rows the playlist needs
+    ranked = pd.read_csv(ranked_csv, nrows=top_n, usecols=["spotify_id"], dtype=str)
+    publish(ranked["spotify_id"].tolist(), name, public, **sync)
+
+def create_playlist_from_detections(detections_path: str, name: str, top_n: int=50, public: bool=True,
+                                    normalize_per_100: bool=False, sync: bool=False, playlist_id: Optional[str]=None,
+                                    **filters):
+    # top-N straight from the detections, without writing or sorting the full ranking
+    top = ranked_songs(detections_path, normalize_per_100, top=top_n, **filters)
+    publish(top["spotify_id"].tolist(), name, public, sync=sync, playlist_id=playlist_id)
+
+def publish(track_ids: List[str], name: str, public: bool=True, sync: bool=False, playlist_id: Optional[str]=None):
+    if sync or playlist_id:
+        sync_playlist(sp_client(), track_ids, name, playlist_id, public)
+    else:
+        create_playlist(track_ids, name, public)
+
+def create_playlist(track_ids: List[str], name: str, public: bool=True, sp=None):
+    sp = sp or sp_client()
     me = sp.me()
     user_id = me["id"]
-    ranked = pd.read_csv(ranked_csv).head(top_n)
-    track_ids = ranked["spotify_id"].tolist()
-
     pl = sp.user_playlist_create(user=user_id, name=name, public=public, description="Generated by EntendreRank")
     # chunk adds
     for i in range(0, len(track_ids), 100):
         sp.playlist_add_items(pl["id"], track_ids[i:i+100])
     print(f"Created playlist: {pl['external_urls']['spotify']}")
 
+def find_playlist(sp, name: str, user_id: str) -> Optional[str]:
+    # the user's own playlist with this name, if any
+    page = sp.current_user_playlists(limit=50)
+    while page:
+        for pl in page["items"]:
+            if pl and pl["name"] == name and pl["owner"]["id"] == user_id:
+                return pl["id"]
+        page = sp.next(page) if page.get("next") else None
+    return None
+
+def playlist_track_ids(sp, playlist_id: str) -> List[str]:
+    page = sp.playlist_items(playlist_id, fields="items(track(id)),next", limit=BATCH, additional_types=("track",))
+    ids = []
+    while page:
+        ids.extend((it.get("track") or {}).get("id") for it in page["items"])
+        page = sp.next(page) if page.get("next") else None
+    return ids
+
+def _longest_increasing(seq: List[int]) -> set:
+    # indices into seq of one longest strictly increasing subsequence (patience sorting)
+    tails, tail_idx, prev = [], [], [-1] * len(seq)
+    for i, v in enumerate(seq):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < v:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(tails):
+            tails.append(v)
+            tail_idx.append(i)
+        else:
+            tails[lo], tail_idx[lo] = v, i
+        prev[i] = tail_idx[lo - 1] if lo else -1
+    keep, i = set(), tail_idx[-1] if tail_idx else -1
+    while i >= 0:
+        keep.add(i)
+        i = prev[i]
+    return keep
+
+def plan_sync(current: List[Optional[str]], target: List[str]) -> Dict:
+    """Smallest edit taking the playlist from `current` to `target` track order.
+
+    remove: (track id, positions in current) pairs; add: ids appended at the end after removals;
+    moves: (range_start, insert_before) reorders applied in sequence after adds.
+    """
+    target = list(dict.fromkeys(target))
+    wanted = set(target)
+    seen, remove, kept = set(), {}, []
+    for pos, tid in enumerate(current):
+        # dropped tracks, duplicates and unavailable tracks (None) go
+        if tid is None or tid not in wanted or tid in seen:
+            remove.setdefault(tid, []).append(pos)
+        else:
+            seen.add(tid)
+            kept.append(tid)
+    add = [tid for tid in target if tid not in seen]
+    order = kept + add
+    # tracks on a longest already-ordered run stay put; every other track moves once,
+    # right behind its predecessor in the target
+    rank = {tid: i for i, tid in enumerate(target)}
+    stay = {order[i] for i in _longest_increasing([rank[t] for t in order])}
+    moves = []
+    for i, tid in enumerate(target):
+        if tid in stay:
+            continue
+        src = order.index(tid)
+        dst = order.index(target[i - 1]) + 1 if i else 0
+        if dst not in (src, src + 1):
+            moves.append((src, dst))
+            order.insert(dst if dst < src else dst - 1, order.pop(src))
+        stay.add(tid)
+    return {"remove": [(tid, pos) for tid, pos in remove.items()], "add": add, "moves": moves}
+
+def sync_playlist(sp, track_ids: List[str], name: str, playlist_id: Optional[str]=None, public: bool=True) -> Dict:
+    # make the playlist (by id, else by name, else a new one) hold exactly track_ids, in order,
+    # with as few write calls as possible
+    user_id = sp.me()["id"]
+    playlist_id = playlist_id or find_playlist(sp, name, user_id)
+    if playlist_id is None:
+        create_playlist(track_ids, name, public, sp=sp)
+        return {"created": True, "calls": 1 + -(-len(track_ids) // BATCH)}
+    current = playlist_track_ids(sp, playlist_id)
+    plan = plan_sync(current, track_ids)
+    target = list(dict.fromkeys(track_ids))
+    removals = sorted(((pos, tid) for tid, positions in plan["remove"] for pos in positions), reverse=True)
+    diff_calls = -(-len(removals) // BATCH) + -(-len(plan["add"]) // BATCH) + len(plan["moves"])
+    replace_calls = max(1, -(-len(target) // BATCH))
+    if diff_calls > replace_calls or None in current:
+        # the playlist changed too much for a diff to pay off (or holds tracks gone from Spotify,
+        # which can't be removed by uri): rewrite it
+        sp.playlist_replace_items(playlist_id, [_uri(t) for t in target[:BATCH]])
+        for i in range(BATCH, len(target), BATCH):
+            sp.playlist_add_items(playlist_id, [_uri(t) for t in target[i:i+BATCH]])
+        print(f"Synced playlist {playlist_id}: replaced all {len(target)} tracks ({replace_calls} calls)")
+        return {"created": False, "replaced": True, "calls": replace_calls}
+    # highest positions first, so earlier batches never shift the positions of later ones
+    for i in range(0, len(removals), BATCH):
+        items = {}
+        for pos, tid in removals[i:i+BATCH]:
+            items.setdefault(tid, []).append(pos)
+        sp.playlist_remove_specific_occurrences_of_items(
+            playlist_id, [{"uri": _uri(tid), "positions": pos} for tid, pos in items.items()])
+    for i in range(0, len(plan["add"]), BATCH):
+        sp.playlist_add_items(playlist_id, [_uri(t) for t in plan["add"][i:i+BATCH]])
+    for src, dst in plan["moves"]:
+        sp.playlist_reorder_items(playlist_id, range_start=src, insert_before=dst)
+    print(f"Synced playlist {playlist_id}: -{len(removals)} +{len(plan['add'])} tracks, "
+          f"{len(plan['moves'])} moves ({diff_calls} calls)")
+    return {"created": False, "replaced": False, "calls": diff_calls, **plan}
+
+def _uri(track_id: str) -> str:
+    return f"spotify:track:{track_id}"
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--ranked", type=str, required=True)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--ranked", type=str, help="ranked CSV written by ranking")
+    src.add_argument("--detections", type=str, help="pick the top songs straight from a detections file")
     ap.add_argument("--name", type=str, default="EntendreRank: Top Wordplay")
-    ap.add_argument("--top", type=int, default=50)
     ap.add_argument("--private", action="store_true")
+    ap.add_argument("--sync", action="store_true", help="update the playlist with this name in place instead of creating a new one")
+    ap.add_argument("--playlist-id", type=str, default=None, help="sync into this playlist (implies --sync)")
+    ap.add_argument("--normalize-per-100-lines", action="store_true", help="with --detections: rank per 100 lines")
+    add_filter_args(ap)
+    ap.set_defaults(top=50)
     args = ap.parse_args()
-    create_playlist_from_ranked(args.ranked, args.name, args.top, public=not args.private)
+    if args.ranked:
+        create_playlist_from_ranked(args.ranked, args.name, args.top, public=not args.private,
+                                    sync=args.sync, playlist_id=args.playlist_id)
+    else:
+        filters = {k: v for k, v in filter_kwargs(args).items() if k != "top"}
+        create_playlist_from_detections(args.detections, args.name, args.top, public=not args.private,
+                                        normalize_per_100=args.normalize_per_100_lines, sync=args.sync,
+                                        playlist_id=args.playlist_id, **filters)
 
 if __name__ == "__main__":
     main()
@@ -1,40 +1,110 @@
 import argparse
+import re
+from typing import Iterable, Optional
+import numpy as np
 import pandas as pd
+from .detections_io import iter_detection_chunks
 
-def rank(detections_csv: str, out_csv: str, normalize_per_100: bool=False):
-    df = pd.read_csv(detections_csv)
-    # define double vs triple: double if double_prob >= 0.6; triple ~ aggregate triple_signal > threshold
-    line_double = df["double_prob"] >= 0.6
-    # Approximate triple using aggregate signal per song (stored per line identically); we'll sum later
-    grouped = df.groupby("spotify_id").agg({
-        "double_prob": lambda s: (s >= 0.6).sum(),
-        "triple_signal": "max",
-        "title": "first",
-        "artists": "first"
-    }).reset_index()
+RANK_COLUMNS = ["spotify_id", "double_prob", "triple_signal", "title", "artists"]
+DOUBLE_THRESHOLD = 0.6   # a line is a double entendre at double_prob >= this
+TRIPLE_THRESHOLD = 1.0   # a song has a triple entendre when its triple_signal reaches this
+# per-song aggregates; the same ones merge partials of a song split across chunks
+AGGREGATES = {"title": "first", "artists": "first", "line_count": "sum", "double_count": "sum", "triple_signal": "max"}
 
-    grouped["double_count"] = grouped["double_prob"].astype(int)
-    grouped["triple_count"] = (grouped["triple_signal"] >= 1.0).astype(int)
+def _partial(chunk: pd.DataFrame) -> pd.DataFrame:
+    chunk = chunk.assign(line_count=np.int64(1),
+                         double_count=(chunk["double_prob"].to_numpy() >= DOUBLE_THRESHOLD).astype(np.int64))
+    return chunk.groupby("spotify_id", sort=False, observed=True).agg(AGGREGATES)
 
-    score = grouped["double_count"] + 2 * grouped["triple_count"]
+def _merge(partials: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(partials).groupby(level=0, sort=False).agg(AGGREGATES)
 
+def artist_mask(artists: pd.Series, artist: str) -> np.ndarray:
+    # rows whose comma-separated artists include `artist` (case-insensitive)
+    pattern = re.compile(rf"(?:^|,)\s*{re.escape(artist.strip())}\s*(?:,|$)", re.IGNORECASE)
+    if isinstance(artists.dtype, pd.CategoricalDtype):
+        # parquet dictionary columns: test each distinct value once
+        hit = np.array([bool(pattern.search(str(c))) for c in artists.cat.categories] + [False])
+        return hit[artists.cat.codes.to_numpy()]
+    return artists.astype(str).str.contains(pattern).to_numpy()
+
+def aggregate_detections(detections_path: str, chunk_rows: int = 100_000, merge_rows: int = 1_000_000,
+                         artist: Optional[str] = None) -> pd.DataFrame:
+    # one row per song: line, double and triple counts. Partials are folded together whenever they
+    # pile up past merge_rows, so memory follows the number of songs, not of detection lines.
+    partials, pending = [], 0
+    for chunk in iter_detection_chunks(detections_path, RANK_COLUMNS, chunk_rows):
+        if artist:
+            chunk = chunk[artist_mask(chunk["artists"], artist)]  # dropped before any aggregation
+        partials.append(_partial(chunk))
+        pending += len(partials[-1])
+        if pending >= merge_rows and len(partials) > 1:
+            partials = [_merge(partials)]
+            pending = len(partials[0])
+    if not partials:
+        songs = pd.DataFrame(columns=["spotify_id", *AGGREGATES]).astype(
+            {"line_count": np.int64, "double_count": np.int64, "triple_signal": float})
+    else:
+        songs = _merge(partials).rename_axis("spotify_id").reset_index()
+    songs["spotify_id"] = songs["spotify_id"].astype(str)
+    songs["triple_count"] = (songs["triple_signal"] >= TRIPLE_THRESHOLD).astype(np.int64)
+    return songs
+
+def score_songs(songs: pd.DataFrame, normalize_per_100: bool = False) -> pd.Series:
+    score = (songs["double_count"] + 2 * songs["triple_count"]).astype(float)
     if normalize_per_100:
-        # Need number of lines per song; approximate via double_prob count scale; better to pass lines count in future
-        norm = grouped["double_count"].clip(lower=1)
-        score = score / norm * 100.0
+        score = score / songs["line_count"].clip(lower=1) * 100.0
+    return score
+
+def _order(songs: pd.DataFrame) -> pd.DataFrame:
+    return songs.sort_values(["score", "spotify_id"], ascending=[False, True], kind="stable")
+
+def select_top(songs: pd.DataFrame, k: int) -> pd.DataFrame:
+    # the first k rows of the full ranking, without sorting every song: partition around the
+    # k-th best score, then order only the songs at or above it
+    if k <= 0:
+        return songs.iloc[:0]
+    if len(songs) <= k:
+        return _order(songs)
+    scores = songs["score"].to_numpy()
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    return _order(songs[scores >= kth]).head(k)
 
-    grouped["score"] = score
-    ranked = grouped.sort_values("score", ascending=False)
+def ranked_songs(detections_path: str, normalize_per_100: bool = False, chunk_rows: int = 100_000,
+                 top: Optional[int] = None, artist: Optional[str] = None, min_lines: int = 0,
+                 min_score: Optional[float] = None) -> pd.DataFrame:
+    songs = aggregate_detections(detections_path, chunk_rows, artist=artist)
+    songs["score"] = score_songs(songs, normalize_per_100)
+    # line counts and scores are only final once every chunk is merged
+    keep = songs["line_count"].to_numpy() >= min_lines
+    if min_score is not None:
+        keep &= songs["score"].to_numpy() >= min_score
+    songs = songs[keep]
+    return select_top(songs, top) if top is not None else _order(songs)
+
+def rank(detections_path: str, out_csv: str, normalize_per_100: bool=False, chunk_rows: int=100_000, **filters):
+    ranked = ranked_songs(detections_path, normalize_per_100, chunk_rows, **filters)
     ranked.to_csv(out_csv, index=False)
     print(f"Wrote ranked list to {out_csv}")
 
+def add_filter_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--top", type=int, default=None, help="keep only the best N songs (partial selection, no full sort)")
+    ap.add_argument("--artist", type=str, default=None, help="only songs credited to this artist")
+    ap.add_argument("--min-lines", type=int, default=0, help="skip songs with fewer lyric lines")
+    ap.add_argument("--min-score", type=float, default=None, help="skip songs scoring below this")
+
+def filter_kwargs(args: argparse.Namespace) -> dict:
+    return {"top": args.top, "artist": args.artist, "min_lines": args.min_lines, "min_score": args.min_score}
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--detections", type=str, required=True)
     ap.add_argument("--output", type=str, default="data/processed/ranked.csv")
-    ap.add_argument("--normalize-per-100-lines", action="store_true")
+    ap.add_argument("--normalize-per-100-lines", action="store_true", help="score per 100 lyric lines instead of per song")
+    ap.add_argument("--chunk-rows", type=int, default=100_000, help="detection lines read per chunk")
+    add_filter_args(ap)
     args = ap.parse_args()
-    rank(args.detections, args.output, args.normalize_per_100_lines)
+    rank(args.detections, args.output, args.normalize_per_100_lines, args.chunk_rows, **filter_kwargs(args))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,41 @@
+import threading
+import time
+from typing import Callable, Optional
+
+class RateLimiter:
+    """Thread-safe token bucket: `rate` calls/sec sustained, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        # takes a token and returns 0, or returns how long to wait before trying again
+        with self.lock:
+            now = self.clock()
+            if now > self.updated:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return max((1 - self.tokens) / self.rate, self.updated - now)
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            self.sleep(wait)
+
+    def pause(self, seconds: float):
+        # server said slow down: drain the bucket and start refilling only after `seconds`
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = max(self.updated, self.clock() + seconds)
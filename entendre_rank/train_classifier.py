@@ -0,0 +1,168 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import time
+from typing import Iterator, Optional, Tuple
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from .config import RANDOM_SEED
+from .line_classifier import new_pipeline, save_classifier
+from .utils import FEATURE_VERSION
+
+TRAIN_SHARD_DIR = "data/cache/train_shards"
+
+def peak_rss_mb() -> float:
+    # high-water mark of this process; ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class ShardWriter:
+    """Spills (embedding + features, weak label) rows to .npy shards so training never holds the corpus.
+
+    Every writer gets its own run directory under `shard_root` (run-0001, run-0002, ...); LATEST names the
+    last closed one. Earlier runs are left alone.
+    """
+
+    def __init__(self, shard_root: str, meta: dict, shard_rows: int = 50_000):
+        os.makedirs(shard_root, exist_ok=True)
+        self.shard_root = shard_root
+        self.shard_dir = _new_run_dir(shard_root)
+        self.meta = dict(meta)
+        self.shard_rows = shard_rows
+        self.rows = 0
+        self.shards = 0
+        self._X, self._y, self._buffered = [], [], 0
+
+    def add(self, X: np.ndarray, y: np.ndarray):
+        self._X.append(np.asarray(X, dtype=np.float32))
+        self._y.append(np.asarray(y, dtype=np.int8))
+        self._buffered += len(y)
+        if self._buffered >= self.shard_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        stem = os.path.join(self.shard_dir, f"shard-{self.shards:05d}")
+        np.save(f"{stem}.X.npy", np.vstack(self._X))
+        np.save(f"{stem}.y.npy", np.concatenate(self._y))
+        self.rows += self._buffered
+        self.shards += 1
+        self._X, self._y, self._buffered = [], [], 0
+
+    def close(self):
+        self.flush()
+        with open(os.path.join(self.shard_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({**self.meta, "rows": self.rows, "shards": self.shards}, f, indent=2)
+        # LATEST only moves to a run whose shards and meta.json are all on disk
+        latest = os.path.join(self.shard_root, "LATEST")
+        with open(latest + ".tmp", "w", encoding="utf-8") as f:
+            f.write(os.path.basename(self.shard_dir))
+        os.replace(latest + ".tmp", latest)
+
+def _new_run_dir(shard_root: str) -> str:
+    # makedirs without exist_ok claims the number even if another run starts at the same time
+    while True:
+        taken = [int(os.path.basename(p)[4:]) for p in glob.glob(os.path.join(shard_root, "run-[0-9]*"))]
+        path = os.path.join(shard_root, f"run-{max(taken, default=0) + 1:04d}")
+        try:
+            os.makedirs(path)
+            return path
+        except FileExistsError:
+            continue
+
+def resolve_shard_dir(path: str) -> str:
+    # a run directory, or a shard root whose LATEST names one
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+    latest = os.path.join(path, "LATEST")
+    if not os.path.exists(latest):
+        raise FileNotFoundError(f"no training shards in {path}: run detect --train first")
+    with open(latest, "r", encoding="utf-8") as f:
+        return os.path.join(path, f.read().strip())
+
+def read_shard_meta(shard_dir: str) -> dict:
+    with open(os.path.join(shard_dir, "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def iter_shards(shard_dir: str, rng: Optional[np.random.Generator] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    # memory-mapped, so only the rows a caller touches are paged in
+    stems = sorted(fn[:-len(".X.npy")] for fn in glob.glob(os.path.join(shard_dir, "shard-*.X.npy")))
+    if rng is not None:
+        stems = [stems[i] for i in rng.permutation(len(stems))]
+    for stem in stems:
+        yield np.load(f"{stem}.X.npy", mmap_mode="r"), np.load(f"{stem}.y.npy", mmap_mode="r")
+
+def fit_sgd(shard_dir: str, epochs: int = 3, batch_rows: int = 8192, alpha: float = 1e-4,
+            seed: int = RANDOM_SEED) -> Tuple[Pipeline, dict]:
+    # pass 1: online feature scaling and class counts; then SGD epochs over shuffled shards
+    t0 = time.perf_counter()
+    scaler = StandardScaler(with_mean=False)
+    counts = np.zeros(2, dtype=np.int64)
+    for X, y in iter_shards(shard_dir):
+        for i in range(0, len(y), batch_rows):
+            scaler.partial_fit(X[i:i+batch_rows])
+        counts += np.bincount(y, minlength=2)[:2]
+    n = int(counts.sum())
+    if counts.min() == 0:
+        raise ValueError("weak labels are all one class; nothing to train")
+    # the same reweighting as LogisticRegression(class_weight="balanced")
+    class_weight = n / (2.0 * counts)
+    # averaged SGD: the iterate average converges to the full-batch optimum far faster than the last iterate
+    sgd = SGDClassifier(loss="log_loss", alpha=alpha, average=True, random_state=seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        for X, y in iter_shards(shard_dir, rng):
+            order = rng.permutation(len(y))
+            for i in range(0, len(order), batch_rows):
+                idx = np.sort(order[i:i+batch_rows])  # sorted gathers read the mmap sequentially
+                yb = np.asarray(y[idx])
+                sgd.partial_fit(scaler.transform(X[idx]), yb, classes=[0, 1], sample_weight=class_weight[yb])
+    dt = time.perf_counter() - t0
+    # lines_per_sec is training lines per wall-clock second for every trainer; passes over the data separately
+    stats = {"lines": n, "passes": epochs + 1, "seconds": dt, "lines_per_sec": n / dt, "peak_rss_mb": peak_rss_mb()}
+    return Pipeline([("scaler", scaler), ("lr", sgd)]), stats
+
+def fit_in_memory(shard_dir: str) -> Tuple[Pipeline, dict]:
+    # the original full-batch LogisticRegression; needs the whole training matrix in RAM
+    t0 = time.perf_counter()
+    shards = list(iter_shards(shard_dir))
+    X = np.vstack([X for X, _ in shards])
+    y = np.concatenate([y for _, y in shards])
+    if len(np.unique(y)) < 2:
+        raise ValueError("weak labels are all one class; nothing to train")
+    pipeline = new_pipeline().fit(X, y)
+    dt = time.perf_counter() - t0
+    # one pass to fit the scaler, then one per L-BFGS iteration
+    passes = 1 + int(pipeline.named_steps["lr"].n_iter_.max())
+    return pipeline, {"lines": len(y), "passes": passes, "seconds": dt, "lines_per_sec": len(y) / dt,
+                      "peak_rss_mb": peak_rss_mb()}
+
+TRAINERS = {"sgd": fit_sgd, "lbfgs": fit_in_memory}
+
+def train_from_shards(shard_dir: str, trainer: str = "sgd", out_dir: Optional[str] = None, **kw) -> str:
+    shard_dir = resolve_shard_dir(shard_dir)
+    meta = read_shard_meta(shard_dir)
+    if meta["feature_version"] != FEATURE_VERSION:
+        raise ValueError(f"shards in {shard_dir} hold features v{meta['feature_version']}, code is v{FEATURE_VERSION}")
+    pipeline, stats = TRAINERS[trainer](shard_dir, **kw)
+    print(f"Trained ({trainer}) on {stats['lines']:,} lines ({stats['passes']} passes) in {stats['seconds']:.1f}s "
+          f"({stats['lines_per_sec']:,.0f} lines/s), peak RSS {stats['peak_rss_mb']:,.0f} MB")
+    return save_classifier(pipeline, meta["embedding_model"], meta["lexicon"], stats["lines"], out_dir=out_dir)
+
+def main():
+    ap = argparse.ArgumentParser(description="Fit the line classifier from shards written by detect --train")
+    ap.add_argument("--shards", type=str, default=TRAIN_SHARD_DIR, help="a run directory, or a shard root (uses its LATEST run)")
+    ap.add_argument("--trainer", choices=sorted(TRAINERS), default="sgd")
+    ap.add_argument("--epochs", type=int, default=3)
+    ap.add_argument("--batch-rows", type=int, default=8192)
+    args = ap.parse_args()
+    kw = {"epochs": args.epochs, "batch_rows": args.batch_rows} if args.trainer == "sgd" else {}
+    path = train_from_shards(args.shards, args.trainer, **kw)
+    print(f"Saved line classifier to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,195 @@
 import re
+from itertools import compress
 import numpy as np
 import pandas as pd
-from typing import List, Tuple
-
-AMBIGUOUS_TERMS = {
-    # polysemous or slang-heavy: extend over time
-    "rock", "keys", "base", "blow", "pump", "pipe", "bags", "lines", "shots",
-    "dope", "fire", "ice", "grams", "plug", "lick", "roll", "hammer", "batter",
-    "pound", "stick", "tool", "piece", "heat", "smoke", "gas", "cap", "trip",
-    "ride", "plug", "plugged", "serve", "deck", "head", "back", "cake", "bust",
-    "box", "pussy", "beat", "hit", "banger", "plug", "score"
-}
-
-SEXUAL_HINTS = {
-    "dick","ass","pussy","head","blow","ride","pipe","stroke","wet","hard","soft","come","nut","cream","backshots"
-}
-
-DRUG_HINTS = {"dope","rock","base","crack","meth","lean","xan","percs","grams","kilo","plug","serve","trap","brick"}
+from typing import List, Optional, Tuple
+from .lexicon import FEATURE_CATEGORIES, TOKEN_RE, LexiconMatcher, default_matcher, pack_tokens
 
 def split_lyrics_into_lines(text: str) -> List[str]:
     text = re.sub(r"\[.*?\]", "", text)  # strip bracketed stage notes
     lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
     return lines
 
-def keyword_hits(line: str) -> Tuple[int, int, int]:
-    toks = set(re.findall(r"[a-zA-Z']+", line.lower()))
-    amb = len(AMBIGUOUS_TERMS & toks)
-    sex = len(SEXUAL_HINTS & toks)
-    drug = len(DRUG_HINTS & toks)
-    return amb, sex, drug
+def keyword_hits(line: str, matcher: Optional[LexiconMatcher] = None) -> Tuple[int, int, int]:
+    # distinct ambiguous/sexual/drug lexicon entries (words or phrases) in the line
+    return (matcher or default_matcher()).hits(line)
+
+# bump whenever a change here alters features or triple signals for the same lyrics and lexicon;
+# incremental detection re-runs every song when it changes
+FEATURE_VERSION = 1
+
+FEATURE_COLUMNS = ["idx", "len_chars", "len_words", "ambiguous_hits", "sexual_hits", "drug_hits",
+                   "punct_q", "punct_bang", "quotes"]
+
+# A batch of lines is one string with a "\n" between lines, so each pass below runs once per batch;
+# the "\n"s mark line boundaries in its output. ASCII lines are tokenized on their bytes with numpy;
+# the rare others go through TOKEN_RE, since lower() can turn a non-ASCII character into a letter.
+_TOKEN_OR_NEWLINE = re.compile(r"\n|" + TOKEN_RE.pattern)
+_MARK_OR_NEWLINE = re.compile(r"[\n?!\"']")
+
+def _join_lines(lines: List[str]) -> str:
+    text = "\n".join(lines)
+    if text.count("\n") != max(len(lines) - 1, 0):
+        # a newline inside a line separates tokens (and words) just like a space does
+        text = "\n".join(ln.replace("\n", " ") for ln in lines)
+    return text
+
+def _vocab_ids(tokens: np.ndarray, vocab_sorted: np.ndarray, matcher: LexiconMatcher) -> np.ndarray:
+    # vocab id of every token, -1 for tokens outside the vocabulary
+    if not len(vocab_sorted) or not len(tokens):
+        return np.full(len(tokens), -1, dtype=np.int64)
+    at = np.searchsorted(vocab_sorted, tokens).clip(max=len(vocab_sorted) - 1)
+    return np.where(vocab_sorted[at] == tokens, matcher.vocab_order[at], -1)
+
+def _lexicon_tokens(text: str, matcher: LexiconMatcher) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (line, token position, vocab id) of every token in the lexicon vocabulary, tokenized like keyword_hits
+    tokens = np.array(_TOKEN_OR_NEWLINE.findall(text.lower()), dtype=str)
+    newline = tokens == "\n"
+    line = np.cumsum(newline)[~newline]
+    pos = np.flatnonzero(~newline)
+    ids = _vocab_ids(tokens[~newline], matcher.vocab_sorted, matcher)
+    keep = ids >= 0
+    return line[keep], pos[keep], ids[keep]
+
+def _ascii_tokens(buf: np.ndarray, starts: np.ndarray, lengths: np.ndarray, newlines: np.ndarray,
+                  matcher: LexiconMatcher) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # _lexicon_tokens over the [a-zA-Z']+ runs at starts: most are ruled out by (length, first byte,
+    # last byte), the rest are gathered into fixed-width keys for the vocabulary lookup
+    width = matcher.vocab_bytes.dtype.itemsize
+    if not len(matcher.vocab) or not len(starts):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    lowered = buf | np.uint8(32)  # exact for letters and "'", the only bytes a token is made of
+    last = lowered[starts + lengths - 1]
+    lengths = np.minimum(lengths, width + 1)
+    slot = (lengths << 16) | (lowered[starts].astype(lengths.dtype) << 8) | last
+    pos = np.flatnonzero(matcher.token_prefilter[slot])
+    offsets = np.arange(width)
+    keys = lowered[np.minimum(starts[pos, None] + offsets, len(buf) - 1)]
+    keys[offsets >= lengths[pos, None]] = 0
+    if matcher.vocab_packed is not None:
+        ids = _vocab_ids(pack_tokens(keys), matcher.vocab_packed, matcher)
+    else:
+        ids = _vocab_ids(keys.view(f"S{width}").ravel(), matcher.vocab_bytes, matcher)
+    keep = ids >= 0
+    pos = pos[keep]
+    return np.searchsorted(newlines, starts[pos]) - 1, pos, ids[keep]
+
+def _count_hits(line: np.ndarray, pos: np.ndarray, ids: np.ndarray, n: int, matcher: LexiconMatcher) -> np.ndarray:
+    # (n, 3) distinct ambiguous/sexual/drug entries per line from the in-vocabulary tokens
+    out = np.zeros((n, len(FEATURE_CATEGORIES)), dtype=np.int64)
+    hit_line, entry = line, matcher.single[ids]
+    if matcher.max_entry_len > 1 and len(ids):
+        # phrases need adjacent in-vocabulary tokens on one line: run the automaton over those runs only
+        run_starts = np.flatnonzero(np.r_[True, (np.diff(pos) != 1) | (np.diff(line) != 0)])
+        run_ends = np.r_[run_starts[1:], len(ids)]
+        phrase_line, phrase_entry = [], []
+        for a, b in zip(run_starts.tolist(), run_ends.tolist()):
+            if b - a > 1:
+                for _, e in matcher.match_ids(ids[a:b].tolist()):
+                    if matcher.entry_lengths[e] > 1:
+                        phrase_line.append(line[a])
+                        phrase_entry.append(e)
+        hit_line = np.r_[hit_line, np.array(phrase_line, dtype=np.int64)]
+        entry = np.r_[entry, np.array(phrase_entry, dtype=np.int64)]
+    keep = entry >= 0
+    if keep.any():
+        # each (line, entry) pair counts once, then one bincount per category
+        n_entries, features = len(matcher.entries), len(FEATURE_CATEGORIES)
+        pairs = np.sort(hit_line[keep] * n_entries + entry[keep])
+        pair_line, pair_entry = np.divmod(pairs[np.r_[True, pairs[1:] != pairs[:-1]]], n_entries)
+        row, c = np.nonzero(matcher.member[pair_entry, :features])
+        out = np.bincount(pair_line[row] * features + c, minlength=n * features).reshape(n, features)
+    return out
+
+def _ascii_features(text: str, n: int, matcher: LexiconMatcher) -> np.ndarray:
+    # (n, 8) FEATURE_COLUMNS[1:] of n ASCII lines joined by _join_lines. The buffer starts and ends with
+    # "\n" too, so line i is the bytes between newlines i and i + 1. Everything is found from the
+    # positions of the bytes outside [a-zA-Z'], a fraction of the buffer: newlines, whitespace and marks
+    # are among them, and tokens are the gaps between them.
+    buf = np.frombuffer(("\n" + text + "\n").encode("ascii"), dtype=np.uint8)
+    apostrophe = buf == ord("'")
+    other = np.flatnonzero(((buf | np.uint8(32)) - np.uint8(97) >= 26) & ~apostrophe).astype(np.int32)
+    byte = buf[other]
+    newlines = other[byte == ord("\n")]
+    out = np.zeros((n, 8), dtype=np.int64)
+    out[:, 0] = np.diff(newlines) - 1
+    # what str.split() splits on, restricted to ASCII: " ", \t\n\x0b\x0c\r and \x1c-\x1f;
+    # every space not followed by another one comes right before a word
+    spaces = other[(byte == ord(" ")) | (byte - np.uint8(9) < 5) | (byte - np.uint8(28) < 4)]
+    word_starts = spaces[:-1][np.diff(spaces) != 1]
+    out[:, 1] = np.diff(np.searchsorted(word_starts, newlines))
+    step = np.diff(other)
+    gaps = np.flatnonzero(step > 1)
+    out[:, 2:5] = _count_hits(*_ascii_tokens(buf, other[gaps] + 1, step[gaps] - 1, newlines, matcher), n, matcher)
+    marks = (byte == ord("?")) | (byte == ord("!")) | (byte == ord('"'))
+    line, mark = np.searchsorted(newlines, other[marks]) - 1, byte[marks]
+    out[:, 5] = np.bincount(line[mark == ord("?")], minlength=n)
+    out[:, 6] = np.bincount(line[mark == ord("!")], minlength=n)
+    # "'" is a token byte, so it is counted separately
+    out[:, 7] = np.bincount(line[mark == ord('"')], minlength=n)
+    out[:, 7] += np.bincount(np.searchsorted(newlines, np.flatnonzero(apostrophe)) - 1, minlength=n)
+    return out
 
-def engineered_features(lines: List[str]) -> pd.DataFrame:
+def _text_features(lines: List[str], matcher: LexiconMatcher) -> np.ndarray:
+    # same columns as _ascii_features for lines of any text
+    n = len(lines)
+    text = _join_lines(lines)
+    out = np.zeros((n, 8), dtype=np.int64)
+    out[:, 0] = np.fromiter(map(len, lines), dtype=np.int64, count=n)
+    out[:, 1] = np.fromiter(map(len, map(str.split, lines)), dtype=np.int64, count=n)
+    out[:, 2:5] = _count_hits(*_lexicon_tokens(text, matcher), n, matcher)
+    out[:, 5:8] = _mark_counts(text, n)
+    return out
+
+def _line_features(lines: List[str], matcher: LexiconMatcher) -> np.ndarray:
+    # FEATURE_COLUMNS[1:] per line
+    text = _join_lines(lines)
+    if text.isascii():
+        return _ascii_features(text, len(lines), matcher)
+    ascii = np.fromiter(map(str.isascii, lines), dtype=bool, count=len(lines))
+    out = np.zeros((len(lines), 8), dtype=np.int64)
+    rest = np.flatnonzero(~ascii)
+    if len(rest) < len(lines):
+        fast = list(compress(lines, ascii))
+        out[ascii] = _ascii_features(_join_lines(fast), len(fast), matcher)
+    out[rest] = _text_features([lines[i] for i in rest.tolist()], matcher)
+    return out
+
+def keyword_hits_batch(lines: List[str], matcher: Optional[LexiconMatcher] = None) -> np.ndarray:
+    # (n, 3) distinct ambiguous/sexual/drug entries per line, same counts as keyword_hits
+    return _line_features(lines, matcher or default_matcher())[:, 2:5]
+
+def _mark_counts(text: str, n: int) -> np.ndarray:
+    # (n, 3) counts of "?", "!" and quotes (' and " both count) per line
+    marks = np.frombuffer("".join(_MARK_OR_NEWLINE.findall(text)).encode(), dtype=np.uint8)
+    newline = marks == ord("\n")
+    line, marks = np.cumsum(newline)[~newline], marks[~newline]
+    out = np.zeros((n, 3), dtype=np.int64)
+    for c, chars in enumerate(("?", "!", "\"'")):
+        out[:, c] = np.bincount(line[np.isin(marks, list(chars.encode()))], minlength=n)
+    return out
+
+def engineered_feature_matrix(lines: List[str], chunk: int = 10_000, matcher: Optional[LexiconMatcher] = None) -> np.ndarray:
+    # int64 matrix with FEATURE_COLUMNS, the same per-line definitions as engineered_features_reference
+    # computed a chunk of lines at a time; chunks of ~10k lines keep their arrays in the CPU cache
+    matcher = matcher or default_matcher()
+    out = np.zeros((len(lines), len(FEATURE_COLUMNS)), dtype=np.int64)
+    out[:, 0] = np.arange(len(lines))
+    for i in range(0, len(lines), chunk):
+        part = lines[i:i+chunk]
+        out[i:i + len(part), 1:] = _line_features(part, matcher)
+    return out
+
+def engineered_features(lines: List[str], matcher: Optional[LexiconMatcher] = None) -> pd.DataFrame:
+    return pd.DataFrame(engineered_feature_matrix(lines, matcher=matcher), columns=FEATURE_COLUMNS)
+
+def engineered_features_reference(lines: List[str], matcher: Optional[LexiconMatcher] = None) -> pd.DataFrame:
+    # original line-by-line implementation, kept as the oracle for tests and benchmarks
+    matcher = matcher or default_matcher()
     feats = []
     for i, ln in enumerate(lines):
-        amb, sex, drug = keyword_hits(ln)
+        amb, sex, drug = keyword_hits(ln, matcher)
         feats.append({
             "idx": i,
             "len_chars": len(ln),
@@ -47,12 +203,39 @@ def engineered_features(lines: List[str]) -> pd.DataFrame:
         })
     return pd.DataFrame(feats)
 
+def _is_triple(amb: int, sex: int, drug: int) -> bool:
+    return amb >= 1 and ((sex >= 1 and drug >= 1) or amb >= 3)
+
+def window_triple_signals(lines: List[str], window: int=2, matcher: Optional[LexiconMatcher] = None) -> Tuple[float, np.ndarray]:
+    # per-line flag for the window lines[i:i+window+1] plus the song score (their sum); each line is
+    # matched once and distinct-entry counts per category roll with the window
+    if window < 0:
+        raise ValueError(f"triple window must be >= 0, got {window}")
+    matcher = matcher or default_matcher()
+    entries = [matcher.entries_in(ln) for ln in lines]
+    features = len(FEATURE_CATEGORIES)
+    in_window = {}
+    counts = [0] * features
+
+    def add(es, delta):
+        for e in es:
+            before = in_window.get(e, 0)
+            in_window[e] = before + delta
+            if (before == 0) != (before + delta == 0):
+                for c in matcher.entry_categories[e]:
+                    if c < features:
+                        counts[c] += delta
+
+    flags = np.zeros(len(lines), dtype=np.float64)
+    for es in entries[:window + 1]:
+        add(es, 1)
+    for i in range(len(lines)):
+        flags[i] = _is_triple(*counts)
+        add(entries[i], -1)
+        if i + window + 1 < len(lines):
+            add(entries[i + window + 1], 1)
+    return float(flags.sum()), flags
+
 def window_triple_signal(lines: List[str], window:int=2) -> float:
     # crude: multiple distinct ambiguity types within short window suggests layered meaning
-    score = 0.0
-    for i in range(len(lines)):
-        span = " ".join(lines[i:i+window+1]).lower()
-        amb, sex, drug = keyword_hits(span)
-        if amb >= 1 and ((sex >= 1 and drug >= 1) or amb >= 3):
-            score += 1.0
-    return score
+    return window_triple_signals(lines, window)[0]
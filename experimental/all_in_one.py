@@ -9,12 +9,15 @@ import sys
 import os
 from typing import Optional, List, Dict
 import json
-import re
+
+# spotify_resolver uses the shared rate limiter in entendre_rank/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
 # Import your existing classes
 from DataCleaning import DataCleaner
 from MusicRecommender import MusicRecommender
 from PlaylistCreator import PlaylistCreator
+from spotify_resolver import TrackResolver
 
 # Import Spotipy directly - NO broken spotify_integration.py
 import spotipy
@@ -45,6 +48,7 @@ class SimpleSpotifyIntegration:
         )
         
         self.sp = None
+        self.resolver = None
         self.authenticated = False
     
     def authenticate(self) -> bool:
@@ -107,6 +111,9 @@ class SimpleSpotifyIntegration:
                 print(f"✅ Success! Authenticated as: {user['display_name']} (@{user['id']})")
                 print(f"🎵 Ready to create playlists in your Spotify account!")
                 
+                # Cached, concurrent (name, artist) -> URI lookups
+                self.resolver = TrackResolver(self.sp)
+                
                 self.authenticated = True
                 return True
                 
@@ -152,22 +159,19 @@ class SimpleSpotifyIntegration:
             
             print(f"\n🔍 Finding {len(songs)} songs on Spotify...")
             
-            for i, song in enumerate(songs, 1):
-                song_name = song.get('name', '')
-                artist_name = song.get('artist', song.get('artists', ''))
-                
-                print(f"  {i:2d}. {song_name} - {artist_name}", end="")
-                
-                # Search for the track
-                track_uri = self._search_track(song_name, artist_name)
-                
+            pairs = [(song.get('name', ''), song.get('artist', song.get('artists', ''))) for song in songs]
+            calls_before = self.resolver.api_calls
+            uris = self.resolver.resolve_many(pairs)
+            
+            for i, ((song_name, artist_name), track_uri) in enumerate(zip(pairs, uris), 1):
                 if track_uri:
                     track_uris.append(track_uri)
                     found_count += 1
-                    print(" ✅")
+                    print(f"  {i:2d}. {song_name} - {artist_name} ✅")
                 else:
                     not_found.append(f"{song_name} - {artist_name}")
-                    print(" ❌")
+                    print(f"  {i:2d}. {song_name} - {artist_name} ❌")
+            print(f"🔎 {self.resolver.api_calls - calls_before} Spotify searches, {self.resolver.hits} cache hits so far")
             
             # Add tracks to playlist in batches
             if track_uris:
@@ -201,30 +205,8 @@ class SimpleSpotifyIntegration:
     def _search_track(self, song_name: str, artist_name: str) -> Optional[str]:
         """Search for a track and return its URI."""
         try:
-            # Clean artist name
-            if isinstance(artist_name, str):
-                artist_clean = re.sub(r"[\[\]']", "", artist_name)
-                artist_clean = artist_clean.split(',')[0].strip()
-            else:
-                artist_clean = str(artist_name)
-            
-            # Try different search strategies
-            search_queries = [
-                f'track:"{song_name}" artist:"{artist_clean}"',
-                f'"{song_name}" "{artist_clean}"',
-                f'{song_name} {artist_clean}',
-                song_name
-            ]
-            
-            for query in search_queries:
-                results = self.sp.search(q=query, type='track', limit=1)
-                
-                if results['tracks']['items']:
-                    return results['tracks']['items'][0]['uri']
-            
-            return None
-            
-        except:
+            return self.resolver.resolve(song_name, artist_name)
+        except Exception:
             return None
 
 
@@ -0,0 +1,109 @@
+"""
+Resolve (song name, artist) pairs to Spotify track URIs: persistent SQLite cache (hits and misses),
+concurrent lookups on a bounded thread pool, and a shared rate limit on search calls.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from entendre_rank.rate_limit import RateLimiter
+
+def clean_artist(artist_name) -> str:
+    # "['Jay-Z', 'Kanye West']" / "Jay-Z, Kanye West" -> "Jay-Z"
+    if isinstance(artist_name, str):
+        return re.sub(r"[\[\]']", "", artist_name).split(',')[0].strip()
+    return str(artist_name)
+
+def search_queries(song_name: str, artist: str) -> List[str]:
+    # most to least specific; the first query with a hit wins
+    return [
+        f'track:"{song_name}" artist:"{artist}"',
+        f'"{song_name}" "{artist}"',
+        f'{song_name} {artist}',
+        song_name,
+    ]
+
+def cache_key(song_name: str, artist_name) -> Tuple[str, str]:
+    norm = lambda s: " ".join(str(s).lower().split())
+    return norm(song_name), norm(clean_artist(artist_name))
+
+class TrackResolver:
+    """
+    (name, artist) -> track URI. Found URIs are cached for good; misses are cached for
+    `miss_ttl` seconds so a song that is not on Spotify doesn't cost four searches every run.
+    """
+
+    def __init__(self, sp, cache_path: Optional[str] = os.path.join("data", "cache", "spotify_tracks.sqlite"), workers: int = 8,
+                 rate: float = 10.0, miss_ttl: float = 7 * 24 * 3600):
+        self.sp = sp
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.miss_ttl = miss_ttl
+        self.api_calls = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(cache_path or ":memory:", check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS tracks (name TEXT NOT NULL, artist TEXT NOT NULL, uri TEXT, "
+                          "checked_at REAL NOT NULL, PRIMARY KEY (name, artist))")
+        self.conn.commit()
+
+    def _cached(self, keys: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[str]]:
+        found = {}
+        now = time.time()
+        for i in range(0, len(keys), 400):
+            part = keys[i:i + 400]
+            where = " OR ".join(["(name=? AND artist=?)"] * len(part))
+            rows = self.conn.execute(f"SELECT name, artist, uri, checked_at FROM tracks WHERE {where}",
+                                     [v for k in part for v in k]).fetchall()
+            for name, artist, uri, checked_at in rows:
+                if uri is not None or now - checked_at < self.miss_ttl:
+                    found[(name, artist)] = uri
+        return found
+
+    def _search(self, song_name: str, artist: str) -> Optional[str]:
+        for query in search_queries(song_name, artist):
+            self.limiter.acquire()
+            with self._lock:
+                self.api_calls += 1
+            results = self.sp.search(q=query, type='track', limit=1)
+            items = results['tracks']['items']
+            if items:
+                return items[0]['uri']
+        return None
+
+    def resolve_many(self, songs: Sequence[Tuple[str, str]]) -> List[Optional[str]]:
+        # one URI (or None) per (song name, artist) pair, in input order
+        keys = [cache_key(name, artist) for name, artist in songs]
+        known = self._cached(list(dict.fromkeys(keys)))
+        self.hits += sum(k in known for k in keys)
+        todo = {}  # each distinct uncached song is searched once
+        for (name, artist), key in zip(songs, keys):
+            if key not in known and key not in todo:
+                todo[key] = (name, clean_artist(artist))
+        if todo:
+            def lookup(item):
+                key, (name, artist) = item
+                try:
+                    return key, self._search(name, artist), True
+                except Exception:
+                    return key, None, False  # transient failure: don't cache it as a miss
+            with ThreadPoolExecutor(max_workers=self.workers) as ex:
+                results = list(ex.map(lookup, todo.items()))
+            now = time.time()
+            self.conn.executemany("INSERT OR REPLACE INTO tracks (name, artist, uri, checked_at) VALUES (?, ?, ?, ?)",
+                                  [(k[0], k[1], uri, now) for k, uri, ok in results if ok])
+            self.conn.commit()
+            known.update((k, uri) for k, uri, _ in results)
+        return [known[k] for k in keys]
+
+    def resolve(self, song_name: str, artist_name) -> Optional[str]:
+        return self.resolve_many([(song_name, artist_name)])[0]
+
+    def close(self):
+        self.conn.close()
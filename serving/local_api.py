@@ -1,36 +1,42 @@
-import os, pickle, faiss, pandas as pd, numpy as np
+import os, pickle
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from src.build_index import set_search_params
+from src.recommend import MicroBatcher, load_catalog
 
 app = FastAPI()
 
-# Load artifacts
+# Load artifacts: memory-mapped when the serving copies exist (ART_MMAP=0 reads them into RAM),
+# so uvicorn workers share one copy through the page cache
 ART_DIR = os.getenv("ART_DIR", "artifacts")
-df = pd.read_parquet(os.path.join(ART_DIR, "track_meta.parquet"))
-vec = np.load(os.path.join(ART_DIR, "vectors.npy"))
-index = faiss.read_index(os.path.join(ART_DIR, "faiss.index"))
+catalog = load_catalog(ART_DIR, mmap=os.getenv("ART_MMAP", "1") != "0")
+index = catalog.index
+# ANN speed/recall knobs; unset keeps the values the index was built with
+set_search_params(index, nprobe=int(os.environ["FAISS_NPROBE"]) if os.getenv("FAISS_NPROBE") else None,
+                  ef_search=int(os.environ["FAISS_EF_SEARCH"]) if os.getenv("FAISS_EF_SEARCH") else None)
+# concurrent /recommend calls arriving within MICRO_BATCH_MS of each other share one index.search
+batcher = MicroBatcher(catalog.recommend_many, max_wait_ms=float(os.getenv("MICRO_BATCH_MS", "2")),
+                       max_batch=int(os.getenv("MICRO_BATCH_MAX", "256")))
+
+# largest k a request may ask for; anything outside 1..MAX_K is a 422 before it reaches a batch
+MAX_K = int(os.getenv("MAX_K", "1000"))
 
 class RecRequest(BaseModel):
     seed_ids: list[str]
-    k: int = 30
+    k: int = Field(30, gt=0, le=MAX_K)
+
+class BatchRecRequest(BaseModel):
+    queries: list[RecRequest]
 
 @app.post("/recommend")
 def recommend(req: RecRequest):
-    id2row = {tid:i for i,tid in enumerate(df["track_id"])}
-    rows = [id2row[s] for s in req.seed_ids if s in id2row]
-    if not rows:
+    results = batcher.submit((req.seed_ids, req.k))
+    if results is None:
         raise HTTPException(status_code=400, detail="No valid seed IDs provided.")
-    q = vec[rows].mean(axis=0, keepdims=True)
-    q /= (np.linalg.norm(q)+1e-9)
-    D, I = index.search(q.astype('float32'), req.k*5)
-    out, seen = [], set(req.seed_ids)
-    for idx in I[0]:
-        tid = df.iloc[idx]["track_id"]
-        if tid not in seen:
-            out.append({
-                "track_name": df.iloc[idx]["track_name"],
-                "artist_name": df.iloc[idx]["artist_name"],
-                "track_id": tid
-            })
-        if len(out) >= req.k: break
-    return {"results": out}
+    return {"results": results}
+
+@app.post("/recommend/batch")
+def recommend_batch(req: BatchRecRequest):
+    # one result entry per query, in order; queries without a known seed get an error instead
+    answers = catalog.recommend_many([(q.seed_ids, q.k) for q in req.queries])
+    return {"results": [{"results": a} if a is not None else {"error": "No valid seed IDs provided."} for a in answers]}
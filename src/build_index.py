@@ -17,7 +17,50 @@ def build_vectors(df, lyrics_emb=None, alpha: float = 0.6):
     vec = vec / (np.linalg.norm(vec, axis=1, keepdims=True)+1e-9)
     return vec, scaler
 
-def build_faiss_index(vec: np.ndarray):
-    index = faiss.IndexFlatIP(vec.shape[1])
-    index.add(vec.astype('float32'))
+INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+
+def default_nlist(n: int) -> int:
+    # ~4*sqrt(n) inverted lists, with the 39 training points per centroid k-means wants
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+def default_pq_m(d: int) -> int:
+    # sub-quantizers must divide d; aim for 2-4 dims per code byte
+    return max(m for m in range(1, min(d, 64) + 1) if d % m == 0 and (m <= d // 2 or d == 1))
+
+def build_faiss_index(vec: np.ndarray, index_type: str = "flat", nlist: int = None, pq_m: int = None,
+                      pq_bits: int = 8, hnsw_m: int = 32, ef_construction: int = 200, train_sample: int = 100_000,
+                      nprobe: int = 16, ef_search: int = 64, seed: int = 0):
+    # flat: exact scan. ivf-flat / ivf-pq: k-means inverted lists (pq also compresses vectors), trained
+    # on a sample; hnsw: graph. All inner product, so on unit vectors scores are cosine.
+    vec = np.ascontiguousarray(vec, dtype='float32')
+    n, d = vec.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif index_type in ("ivf-flat", "ivf-pq"):
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatIP(d)
+        if index_type == "ivf-flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m or default_pq_m(d), pq_bits, faiss.METRIC_INNER_PRODUCT)
+        sample = vec
+        if n > train_sample:
+            sample = vec[np.sort(np.random.default_rng(seed).choice(n, train_sample, replace=False))]
+        index.train(sample)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        raise ValueError(f"index_type must be one of {INDEX_TYPES}")
+    index.add(vec)
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)  # stored with the index
+    return index
+
+def set_search_params(index, nprobe: int = None, ef_search: int = None):
+    # speed/recall knobs; each applies only to the index types that have it
+    inner = faiss.downcast_index(index)
+    if nprobe is not None and hasattr(inner, "nprobe"):
+        inner.nprobe = nprobe
+    if ef_search is not None and hasattr(inner, "hnsw"):
+        inner.hnsw.efSearch = ef_search
     return index
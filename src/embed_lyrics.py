@@ -1,21 +1,45 @@
-from typing import List
+import os
+import multiprocessing as mp
+from typing import List, Optional
 import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModel
+from entendre_rank.onnx_backend import BACKENDS, load_onnx_encoder
 
 class SBertEmbedder:
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", max_length: int = 256):
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", max_length: int = 256, backend: str = "torch"):
+        self.model_name = model_name
+        self.backend = backend
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
+        if backend == "torch":
+            self.model = AutoModel.from_pretrained(model_name)
+        else:
+            self.model = load_onnx_encoder(model_name, backend)
         self.max_length = max_length
 
-    def encode(self, texts: List[str], batch: int = 64) -> np.ndarray:
-        embs = []
-        for i in range(0, len(texts), batch):
-            chunk = texts[i:i+batch]
-            enc = self.tokenizer(chunk, padding=True, truncation=True, return_tensors="pt", max_length=self.max_length)
-            with torch.no_grad():
-                out = self.model(**enc).last_hidden_state.mean(dim=1)
-            x = torch.nn.functional.normalize(out, p=2, dim=1).cpu().numpy()
-            embs.append(x)
+    def _encode_chunk(self, chunk: List[str]) -> np.ndarray:
+        enc = self.tokenizer(chunk, padding=True, truncation=True, return_tensors="pt", max_length=self.max_length)
+        with torch.no_grad():
+            out = self.model(**enc).last_hidden_state.mean(dim=1)
+        return torch.nn.functional.normalize(out, p=2, dim=1).cpu().numpy()
+
+    def encode(self, texts: List[str], batch: int = 64, workers: int = 1, threads_per_worker: Optional[int] = None) -> np.ndarray:
+        chunks = [texts[i:i+batch] for i in range(0, len(texts), batch)]
+        if workers > 1 and len(chunks) > 1:
+            threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+            ctx = mp.get_context("spawn")
+            with ctx.Pool(workers, initializer=_init_worker, initargs=(self.model_name, self.max_length, threads, self.backend)) as pool:
+                embs = list(pool.imap(_encode_in_worker, chunks))
+        else:
+            embs = [self._encode_chunk(c) for c in chunks]
         return np.vstack(embs) if embs else np.zeros((0, 384))
+
+_worker_embedder = None
+
+def _init_worker(model_name: str, max_length: int, threads: int, backend: str):
+    global _worker_embedder
+    torch.set_num_threads(threads)
+    _worker_embedder = SBertEmbedder(model_name, max_length, backend)
+
+def _encode_in_worker(chunk: List[str]) -> np.ndarray:
+    return _worker_embedder._encode_chunk(chunk)
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+from typing import Dict, List, Optional
+import pandas as pd
+
+AUDIO_FEATURES = ["danceability","energy","valence","tempo","loudness","acousticness",
+                  "instrumentalness","liveness","speechiness","key","mode","time_signature"]
+
+class AudioFeatureStore:
+    """SQLite cache of Spotify audio features keyed by track_id, each row stamped with its fetch time.
+
+    Tracks Spotify has no features for are stored with NULL features so they are not asked for again
+    until the row expires; those rows expire after the much shorter `miss_ttl`.
+    """
+
+    def __init__(self, path: str, ttl: float = 30 * 24 * 3600, miss_ttl: float = 24 * 3600):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        cols = ", ".join(f"{c} REAL" for c in AUDIO_FEATURES)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS audio_features (track_id TEXT PRIMARY KEY, {cols}, "
+                          "found INTEGER NOT NULL, fetched_at REAL NOT NULL)")
+        self.conn.commit()
+
+    def get_many(self, track_ids: List[str]) -> Dict[str, Optional[dict]]:
+        # fresh rows only: track_id -> features, or None when Spotify had none
+        out = {}
+        now = time.time()
+        cutoffs = [now - self.ttl, now - self.miss_ttl]
+        ids = list(dict.fromkeys(track_ids))
+        for i in range(0, len(ids), 500):
+            part = ids[i:i+500]
+            rows = self.conn.execute(
+                f"SELECT track_id, {', '.join(AUDIO_FEATURES)}, found FROM audio_features "
+                f"WHERE fetched_at >= CASE WHEN found THEN ? ELSE ? END AND track_id IN ({','.join('?' * len(part))})",
+                [*cutoffs, *part]).fetchall()
+            for r in rows:
+                out[r[0]] = dict(zip(AUDIO_FEATURES, r[1:-1])) if r[-1] else None
+        return out
+
+    def put_many(self, features: Dict[str, Optional[dict]]):
+        now = time.time()
+        rows = [(tid, *[(f or {}).get(c) for c in AUDIO_FEATURES], int(f is not None), now) for tid, f in features.items()]
+        self.conn.executemany(f"INSERT OR REPLACE INTO audio_features VALUES ({','.join('?' * (len(AUDIO_FEATURES) + 3))})", rows)
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM audio_features").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+def features_frame(track_ids: List[str], features: Dict[str, Optional[dict]]) -> pd.DataFrame:
+    rows = [{"track_id": tid, **features[tid]} for tid in dict.fromkeys(track_ids) if features.get(tid)]
+    # floats throughout, so cached and freshly fetched rows compare equal
+    return pd.DataFrame(rows, columns=["track_id", *AUDIO_FEATURES]).astype({c: float for c in AUDIO_FEATURES})
@@ -1,11 +1,22 @@
 import lyricsgenius
 import pandas as pd
+from entendre_rank.genius_async import fetch_lyrics_many
 
-def fetch_lyrics_frame(df_tracks: pd.DataFrame, genius_token: str) -> pd.DataFrame:
+def fetch_lyrics_frame(df_tracks: pd.DataFrame, genius_token: str, concurrency: int = 8, rate: float = 5.0,
+                       timeout: float = 10.0) -> pd.DataFrame:
     if not genius_token:
         df_tracks = df_tracks.copy()
         df_tracks["lyrics"] = None
         return df_tracks
+    if concurrency <= 1:
+        return fetch_lyrics_frame_sequential(df_tracks, genius_token)
+    queries = [(r["track_name"], (r["artist_name"].split(",") or [""])[0])
+               for r in df_tracks[["track_name", "artist_name"]].to_dict("records")]
+    out = df_tracks.copy()
+    out["lyrics"] = fetch_lyrics_many(genius_token, queries, rate=rate, concurrency=concurrency, timeout=timeout)
+    return out
+
+def fetch_lyrics_frame_sequential(df_tracks: pd.DataFrame, genius_token: str) -> pd.DataFrame:
     genius = lyricsgenius.Genius(genius_token, skip_non_songs=True, remove_section_headers=True, timeout=10)
     texts = []
     for _, r in df_tracks.iterrows():
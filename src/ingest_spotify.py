@@ -1,8 +1,14 @@
-import time
 import pandas as pd
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from entendre_rank.rate_limit import RateLimiter
+from src.feature_store import AUDIO_FEATURES, AudioFeatureStore, features_frame
+
+PAGE_SIZE = 100
+# only what fetch_playlist_tracks keeps, plus the paging keys
+PLAYLIST_FIELDS = "items(track(id,name,artists(id,name),album(name))),total,next"
 
 def playlist_id_from_url(url: str) -> str:
     return url.split('/')[-1].split('?')[0]
@@ -13,16 +19,21 @@ def get_spotify_client(client_id, client_secret, redirect_uri, scope="playlist-r
         redirect_uri=redirect_uri, scope=scope
     ))
 
-def fetch_playlist_tracks(sp: spotipy.Spotify, playlist_url: str) -> pd.DataFrame:
+def fetch_playlist_tracks(sp: spotipy.Spotify, playlist_url: str, concurrency: int = 8, rate: float = 10.0,
+                          max_tracks: Optional[int] = None) -> pd.DataFrame:
+    # the first page gives the total; every other offset is known up front and fetched concurrently
     pid = playlist_id_from_url(playlist_url)
-    items, limit, offset = [], 100, 0
-    while True:
-        page = sp.playlist_items(pid, additional_types=("track",), limit=limit, offset=offset)
-        if not page or not page.get("items"): break
-        items.extend([it for it in page["items"] if it.get("track")])
-        if page.get("next") is None: break
-        offset += limit
-        time.sleep(0.2)
+    limiter = RateLimiter(rate)
+    def page_at(offset):
+        limiter.acquire()
+        return sp.playlist_items(pid, fields=PLAYLIST_FIELDS, additional_types=("track",), limit=PAGE_SIZE, offset=offset)
+    first = page_at(0)
+    pages = [first] if first else []
+    if first and first.get("items") and first.get("next") is not None:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+            end = first["total"] if max_tracks is None else min(first["total"], max_tracks)
+            pages.extend(ex.map(page_at, range(PAGE_SIZE, end, PAGE_SIZE)))
+    items = [it for page in pages if page for it in page.get("items") or [] if it.get("track")]
     tracks = [{
         "track_id": it["track"]["id"],
         "track_name": it["track"]["name"],
@@ -32,15 +43,25 @@ def fetch_playlist_tracks(sp: spotipy.Spotify, playlist_url: str) -> pd.DataFram
     } for it in items if it.get("track") and it["track"].get("id")]
     return pd.DataFrame(tracks)
 
-def fetch_audio_features(sp: spotipy.Spotify, track_ids: List[str]) -> pd.DataFrame:
-    rows = []
-    for i in range(0, len(track_ids), 100):
-        feats = sp.audio_features(track_ids[i:i+100])
-        for f in feats:
-            if f:
-                rows.append({k: f.get(k) for k in [
-                    "id","danceability","energy","valence","tempo","loudness","acousticness",
-                    "instrumentalness","liveness","speechiness","key","mode","time_signature"]})
-        time.sleep(0.3)
-    df = pd.DataFrame(rows).rename(columns={"id":"track_id"})
-    return df
+def fetch_audio_features(sp: spotipy.Spotify, track_ids: List[str], store: Optional[AudioFeatureStore] = None,
+                         concurrency: int = 4, rate: float = 10.0) -> pd.DataFrame:
+    # features come from the store when fresh; only the missing ids go to Spotify, 100 per call, in parallel
+    features = store.get_many(track_ids) if store is not None else {}
+    missing = [tid for tid in dict.fromkeys(track_ids) if tid not in features]
+    limiter = RateLimiter(rate)
+    def batch(ids):
+        limiter.acquire()
+        return ids, sp.audio_features(ids) or []
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        for ids, feats in ex.map(batch, [missing[i:i+100] for i in range(0, len(missing), 100)]):
+            # a None entry is a track Spotify has no features for; an empty or short response says
+            # nothing about the ids it left out, so those are neither cached nor reported
+            for tid, f in zip(ids, feats):
+                fetched[tid] = {k: f.get(k) for k in AUDIO_FEATURES} if f else None
+    if store is not None and fetched:
+        store.put_many(fetched)
+    features.update(fetched)
+    print(f"Audio features: {len(track_ids) - len(missing)} from store, {len(missing)} fetched "
+          f"in {-(-len(missing) // 100)} calls")
+    return features_frame(track_ids, features)
@@ -1,17 +1,222 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple
+import faiss
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 
-def recommend(df: pd.DataFrame, vec, index, seed_ids, k=30):
-    id2row = {tid:i for i,tid in enumerate(df["track_id"])}
-    rows = [id2row[s] for s in seed_ids if s in id2row]
-    if not rows: return pd.DataFrame(columns=["track_name","artist_name","track_id"])
-    q = vec[rows].mean(axis=0, keepdims=True)
-    q /= (np.linalg.norm(q)+1e-9)
-    D, I = index.search(q.astype('float32'), k*5)
-    r, seen = [], set(seed_ids)
-    for idx in I[0]:
-        tid = df.iloc[idx]["track_id"]
-        if tid not in seen:
-            r.append(df.iloc[idx][["track_name","artist_name","track_id"]])
-        if len(r) >= k: break
-    return pd.DataFrame(r)
+RESULT_COLUMNS = ["track_name","artist_name","track_id"]
+# serving-side copies of the artifacts, laid out so every worker can memory-map them
+META_ARROW = "track_meta.arrow"          # uncompressed Arrow IPC: track_id, track_name, artist_name
+IDS_SORTED = "track_ids.sorted.npy"      # fixed-width bytes, sorted
+IDS_ORDER = "track_ids.order.npy"        # row of each sorted id
+META_PARQUET = "track_meta.parquet"
+
+class Catalog:
+    """Per-artifact lookup structures, built once: track_id -> row and columnar metadata for results."""
+
+    def __init__(self, df: pd.DataFrame, vec, index):
+        self.vec = vec
+        self.index = index
+        # missing names come back as None, as they do from the Arrow copies (NaN isn't valid JSON)
+        col = lambda c: df[c].astype(object).where(df[c].notna(), None).to_numpy(dtype=object)
+        self.ids = col("track_id")
+        self.names = col("track_name")
+        self.artists = col("artist_name")
+        self.id2row = {tid:i for i,tid in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, seed_ids: List[str]) -> np.ndarray:
+        return np.fromiter((self.id2row[s] for s in seed_ids if s in self.id2row), dtype=np.int64)
+
+    def query(self, rows: np.ndarray) -> np.ndarray:
+        q = np.asarray(self.vec[rows], dtype=np.float32).mean(axis=0, keepdims=True)
+        return q / (np.linalg.norm(q)+1e-9)
+
+    def take_ids(self, rows: np.ndarray) -> np.ndarray:
+        return self.ids[rows]
+
+    def take_columns(self, rows: np.ndarray) -> Tuple[list, list, list]:
+        return self.names[rows].tolist(), self.artists[rows].tolist(), self.ids[rows].tolist()
+
+    def pick(self, hits: np.ndarray, seed_ids: List[str], k: int) -> np.ndarray:
+        # first k hit rows that are real (faiss pads with -1) and not a seed
+        hits = hits[hits >= 0]
+        keep = ~np.isin(self.take_ids(hits), np.asarray(seed_ids, dtype=object))
+        return hits[keep][:k]
+
+    def records(self, rows: np.ndarray) -> List[dict]:
+        return [{"track_name": n, "artist_name": a, "track_id": t} for n, a, t in zip(*self.take_columns(rows))]
+
+    def recommend(self, seed_ids: List[str], k: int = 30) -> Optional[List[dict]]:
+        # None when no seed is in the catalog
+        return self.recommend_many([(seed_ids, k)])[0]
+
+    def recommend_many(self, queries: Sequence[Tuple[List[str], int]]) -> List[Optional[List[dict]]]:
+        # every (seed_ids, k) query answered from a single index.search over the stacked query vectors
+        rows = [self.rows(seeds) for seeds, _ in queries]
+        valid = [i for i, r in enumerate(rows) if len(r)]
+        out = [None] * len(queries)
+        if not valid: return out
+        flat = np.concatenate([rows[i] for i in valid])
+        counts = np.array([len(rows[i]) for i in valid])
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        Q = np.add.reduceat(np.asarray(self.vec[flat], dtype=np.float32), starts, axis=0) / counts[:, None]
+        Q /= (np.linalg.norm(Q, axis=1, keepdims=True)+1e-9)
+        # k past the catalog size can't add results, only a huge search; clamping keeps one such query
+        # from failing (or stalling) every query batched with it
+        ks = [max(0, min(int(queries[i][1]), len(self))) for i in valid]
+        kmax = max(ks)
+        if kmax:
+            D, I = self.index.search(Q.astype(np.float32), kmax*5)
+        for j, (i, k) in enumerate(zip(valid, ks)):
+            out[i] = self.records(self.pick(I[j][:k*5], queries[i][0], k)) if k else []
+        return out
+
+class MappedCatalog(Catalog):
+    """Catalog over memory-mapped artifacts: nothing is copied at startup, and worker processes
+    share the pages through the OS cache. Ids are found by binary search over a sorted id array."""
+
+    def __init__(self, table: pa.Table, vec, index, sorted_ids: np.ndarray, order: np.ndarray):
+        self.vec = vec
+        self.index = index
+        self.table = table
+        self.sorted_ids = sorted_ids
+        self.order = order
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def rows(self, seed_ids: List[str]) -> np.ndarray:
+        width = self.sorted_ids.dtype.itemsize
+        keys = [s.encode() for s in seed_ids]
+        keys = np.array([k for k in keys if len(k) <= width], dtype=self.sorted_ids.dtype)
+        if not len(keys) or not len(self.sorted_ids): return np.zeros(0, dtype=np.int64)
+        # rightmost match, like the dict's last-one-wins for duplicate ids
+        pos = np.searchsorted(self.sorted_ids, keys, side="right") - 1
+        hit = (pos >= 0) & (self.sorted_ids[pos.clip(min=0)] == keys)
+        return np.asarray(self.order[pos[hit]], dtype=np.int64)
+
+    def take_ids(self, rows: np.ndarray) -> np.ndarray:
+        return np.array(self.table.column("track_id").take(rows).to_pylist(), dtype=object)
+
+    def take_columns(self, rows: np.ndarray) -> Tuple[list, list, list]:
+        t = self.table.take(rows)
+        return t.column("track_name").to_pylist(), t.column("artist_name").to_pylist(), t.column("track_id").to_pylist()
+
+def _file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def save_serving_artifacts(df: pd.DataFrame, out_dir: str):
+    # metadata and id lookup in formats that load with mmap (parquet must be decoded into each process);
+    # the row count and a digest of track_meta.parquet go into the Arrow schema so stale copies are noticed
+    table = pa.Table.from_pandas(df[["track_id","track_name","artist_name"]], preserve_index=False)
+    parquet = os.path.join(out_dir, META_PARQUET)
+    stamp = {"rows": str(len(df)), "source": _file_digest(parquet) if os.path.exists(parquet) else ""}
+    table = table.replace_schema_metadata(stamp)
+    with pa.OSFile(os.path.join(out_dir, META_ARROW), "wb") as sink, pa.ipc.new_file(sink, table.schema) as w:
+        w.write_table(table)
+    ids = np.array([t.encode() for t in df["track_id"].astype(str)] or [b""])[:len(df)]
+    order = np.argsort(ids, kind="stable")
+    np.save(os.path.join(out_dir, IDS_SORTED), ids[order])
+    np.save(os.path.join(out_dir, IDS_ORDER), order.astype(np.int64))
+
+def _serving_copies_current(art_dir: str, table: pa.Table, vec, index, sorted_ids, order) -> bool:
+    # written for these artifacts: same row count everywhere and, when known, the same parquet
+    meta = table.schema.metadata or {}
+    n = int(meta.get(b"rows", b"-1"))
+    if not n == table.num_rows == len(vec) == index.ntotal == len(sorted_ids) == len(order):
+        return False
+    source = meta.get(b"source", b"").decode()
+    parquet = os.path.join(art_dir, META_PARQUET)
+    return not source or not os.path.exists(parquet) or source == _file_digest(parquet)
+
+def load_catalog(art_dir: str, mmap: bool = True) -> Catalog:
+    # mmap needs current files from save_serving_artifacts; without them everything is read into memory
+    mapped = mmap and all(os.path.exists(os.path.join(art_dir, f)) for f in (META_ARROW, IDS_SORTED, IDS_ORDER))
+    if mapped:
+        vec = np.load(os.path.join(art_dir, "vectors.npy"), mmap_mode="r")
+        # IVF inverted lists and flat/HNSW vector storage stay on disk (older faiss maps only IVF lists)
+        index = faiss.read_index(os.path.join(art_dir, "faiss.index"), getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP))
+        table = pa.ipc.open_file(pa.memory_map(os.path.join(art_dir, META_ARROW))).read_all()
+        sorted_ids = np.load(os.path.join(art_dir, IDS_SORTED), mmap_mode="r")
+        order = np.load(os.path.join(art_dir, IDS_ORDER), mmap_mode="r")
+        if _serving_copies_current(art_dir, table, vec, index, sorted_ids, order):
+            return MappedCatalog(table, vec, index, sorted_ids, order)
+        print(f"Serving copies in {art_dir} do not match {META_PARQUET}; loading it into memory instead")
+    df = pd.read_parquet(os.path.join(art_dir, META_PARQUET))
+    vec = np.load(os.path.join(art_dir, "vectors.npy"))
+    return Catalog(df, vec, faiss.read_index(os.path.join(art_dir, "faiss.index")))
+
+class MicroBatcher:
+    """Coalesces concurrent calls into batches for `fn(items) -> results`, run on one background thread.
+
+    A batch closes after max_wait_ms from its first item or at max_batch items; with max_wait_ms=0
+    it takes whatever queued up while the previous batch ran, adding no latency when idle.
+    """
+
+    def __init__(self, fn: Callable[[list], list], max_wait_ms: float = 2.0, max_batch: int = 256):
+        self.fn = fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut.result()
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                left = deadline - time.monotonic()
+                nxt = self._queue.get(timeout=left) if left > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is None:
+                self._queue.put(None)  # finish this batch, then stop
+                break
+            batch.append(nxt)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.fn([item for item, _ in batch])
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+def recommend(df: pd.DataFrame, vec, index, seed_ids, k=30, catalog: Optional[Catalog]=None):
+    # pass a prebuilt catalog when calling repeatedly against the same artifacts
+    results = (catalog if catalog is not None else Catalog(df, vec, index)).recommend(seed_ids, k)
+    return pd.DataFrame(results or [], columns=RESULT_COLUMNS)
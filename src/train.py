@@ -2,9 +2,10 @@ import os, argparse, numpy as np, pandas as pd
 from dotenv import load_dotenv
 from src.config import SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI, GENIUS_ACCESS_TOKEN
 from src.ingest_spotify import get_spotify_client, fetch_playlist_tracks, fetch_audio_features
+from src.feature_store import AudioFeatureStore
 from src.ingest_genius import fetch_lyrics_frame
-from src.embed_lyrics import SBertEmbedder
-from src.build_index import build_vectors, build_faiss_index
+from src.embed_lyrics import SBertEmbedder, BACKENDS
+from src.build_index import build_vectors, build_faiss_index, INDEX_TYPES
 
 def main():
     load_dotenv()
@@ -15,27 +16,55 @@ def main():
     ap.add_argument("--max_tracks", type=int, default=5000)
     ap.add_argument("--out_dir", default="artifacts")
     ap.add_argument("--out_gcs", default=None)
+    ap.add_argument("--workers", type=int, default=1, help="CPU processes for lyric embedding")
+    ap.add_argument("--backend", choices=BACKENDS, default="torch", help="lyric embedding runtime")
+    ap.add_argument("--spotify_concurrency", type=int, default=8, help="playlist pages fetched in parallel")
+    ap.add_argument("--spotify_rate", type=float, default=10.0, help="max Spotify API calls per second")
+    ap.add_argument("--index_type", choices=INDEX_TYPES, default="flat",
+                    help="flat: exact; ivf-flat / ivf-pq / hnsw: approximate, for large catalogs")
+    ap.add_argument("--nlist", type=int, default=None, help="IVF lists (default ~4*sqrt(n))")
+    ap.add_argument("--pq_m", type=int, default=None, help="IVF-PQ sub-quantizers; must divide the vector size")
+    ap.add_argument("--hnsw_m", type=int, default=32, help="HNSW graph degree")
+    ap.add_argument("--nprobe", type=int, default=16, help="IVF lists scanned per query")
+    ap.add_argument("--ef_search", type=int, default=64, help="HNSW candidate list size per query")
+    ap.add_argument("--feature_store", default="artifacts/cache/audio_features.sqlite",
+                    help="SQLite cache of audio features; 'none' to always refetch")
+    ap.add_argument("--feature_ttl_days", type=float, default=30.0, help="refetch cached audio features older than this")
+    ap.add_argument("--feature_miss_ttl_hours", type=float, default=24.0,
+                    help="ask again for tracks Spotify had no features for after this long")
     args = ap.parse_args()
 
     sp = get_spotify_client(SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI)
-    df_tracks = fetch_playlist_tracks(sp, args.playlist).head(args.max_tracks)
-    df_feats  = fetch_audio_features(sp, df_tracks["track_id"].tolist())
+    df_tracks = fetch_playlist_tracks(sp, args.playlist, concurrency=args.spotify_concurrency,
+                                      rate=args.spotify_rate, max_tracks=args.max_tracks).head(args.max_tracks)
+    store = None
+    if args.feature_store.lower() != "none":
+        os.makedirs(os.path.dirname(args.feature_store) or ".", exist_ok=True)
+        store = AudioFeatureStore(args.feature_store, ttl=args.feature_ttl_days * 86400,
+                                  miss_ttl=args.feature_miss_ttl_hours * 3600)
+    df_feats  = fetch_audio_features(sp, df_tracks["track_id"].tolist(), store=store,
+                                     concurrency=args.spotify_concurrency, rate=args.spotify_rate)
+    if store is not None:
+        store.close()
     df = df_tracks.merge(df_feats, on="track_id", how="left")
 
     lyrics_emb = None
     if args.lyrics.lower() == "true" and GENIUS_ACCESS_TOKEN:
         df = fetch_lyrics_frame(df, GENIUS_ACCESS_TOKEN)
         texts = [t if isinstance(t,str) and t else "" for t in df["lyrics"].tolist()]
-        embedder = SBertEmbedder()
-        lyrics_emb = embedder.encode(texts)
+        embedder = SBertEmbedder(backend=args.backend)
+        lyrics_emb = embedder.encode(texts, workers=args.workers)
 
     vec, scaler = build_vectors(df, lyrics_emb=lyrics_emb, alpha=args.alpha)
-    index = build_faiss_index(vec)
+    index = build_faiss_index(vec, args.index_type, nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m,
+                              nprobe=args.nprobe, ef_search=args.ef_search)
 
     os.makedirs(args.out_dir, exist_ok=True)
     df.to_parquet(os.path.join(args.out_dir, "track_meta.parquet"), index=False)
     np.save(os.path.join(args.out_dir, "vectors.npy"), vec)
     import joblib, faiss
+    from src.recommend import save_serving_artifacts, META_ARROW, IDS_SORTED, IDS_ORDER
+    save_serving_artifacts(df, args.out_dir)
     joblib.dump(scaler, os.path.join(args.out_dir, "scaler.pkl"))
     faiss.write_index(index, os.path.join(args.out_dir, "faiss.index"))
     print("Saved artifacts to", args.out_dir)
@@ -46,7 +75,7 @@ def main():
         bucket_name = args.out_gcs.split('/')[2]
         prefix = '/'.join(args.out_gcs.split('/')[3:]).rstrip('/') + '/'
         bucket = client.bucket(bucket_name)
-        for fname in ["track_meta.parquet","vectors.npy","scaler.pkl","faiss.index"]:
+        for fname in ["track_meta.parquet","vectors.npy","scaler.pkl","faiss.index",META_ARROW,IDS_SORTED,IDS_ORDER]:
             blob = bucket.blob(prefix + fname)
             blob.upload_from_filename(os.path.join(args.out_dir, fname))
         print("Uploaded artifacts to", args.out_gcs)
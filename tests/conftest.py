@@ -0,0 +1,39 @@
+import zlib
+import types
+import pytest
+import torch
+
+class FakeTokenizer:
+    # whitespace tokenizer with stable ids; enough surface for detection_model
+    def __call__(self, texts, padding=False, truncation=False, max_length=None, return_tensors=None, **kw):
+        ids = [[zlib.crc32(w.encode()) % 97 + 1 for w in t.lower().split()] or [1] for t in texts]
+        if truncation and max_length:
+            ids = [x[:max_length] for x in ids]
+        if return_tensors != "pt":
+            return {"input_ids": ids}
+        width = max(len(x) for x in ids)
+        input_ids = torch.tensor([x + [0] * (width - len(x)) for x in ids])
+        mask = torch.tensor([[1] * len(x) + [0] * (width - len(x)) for x in ids])
+        return {"input_ids": input_ids, "attention_mask": mask}
+
+class FakeModel(torch.nn.Module):
+    def __init__(self, hidden=8):
+        super().__init__()
+        torch.manual_seed(0)
+        self.emb = torch.nn.Embedding(98, hidden)
+        self.config = types.SimpleNamespace(hidden_size=hidden)
+        self.calls = 0
+        self.rows = 0
+
+    def forward(self, input_ids, attention_mask):
+        self.calls += 1
+        self.rows += input_ids.shape[0]
+        return types.SimpleNamespace(last_hidden_state=self.emb(input_ids))
+
+@pytest.fixture
+def fake_embedder():
+    return FakeTokenizer(), FakeModel(), "cpu"
+
+def fake_loader(model_name, device=None, backend="torch"):
+    # top-level so spawned embedding workers can unpickle it
+    return FakeTokenizer(), FakeModel(), "cpu"
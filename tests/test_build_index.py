@@ -0,0 +1,43 @@
+import faiss
+import numpy as np
+import pytest
+from src.build_index import INDEX_TYPES, build_faiss_index, default_pq_m, set_search_params
+from src.eval import recall_at_k
+
+def clustered(n=20000, d=16, centers=64, seed=0):
+    rng = np.random.default_rng(seed)
+    c = rng.normal(size=(centers, d))
+    v = (c[rng.integers(0, centers, n)] + 0.3 * rng.normal(size=(n, d))).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+@pytest.mark.parametrize("index_type,min_recall", [("flat", 1.0), ("ivf-flat", 0.9), ("ivf-pq", 0.5), ("hnsw", 0.9)])
+def test_index_types_recall_against_exact(index_type, min_recall):
+    vec = clustered()
+    queries = vec[:50]
+    _, truth = build_faiss_index(vec).search(queries, 10)
+    index = build_faiss_index(vec, index_type, nprobe=8)
+    _, got = index.search(queries, 10)
+    recall = np.mean([recall_at_k(t, list(g), 10) for t, g in zip(truth, got)])
+    assert recall >= min_recall
+
+def test_search_params_trade_recall_and_persist(tmp_path):
+    vec = clustered()
+    queries = vec[::200]
+    _, truth = build_faiss_index(vec).search(queries, 10)
+    index = build_faiss_index(vec, "ivf-flat", nlist=256, nprobe=1)
+    recalls = []
+    for nprobe in (1, 256):
+        _, got = set_search_params(index, nprobe=nprobe).search(queries, 10)
+        recalls.append(np.mean([recall_at_k(t, list(g), 10) for t, g in zip(truth, got)]))
+    assert recalls[0] < recalls[1] == 1.0
+    faiss.write_index(index, str(tmp_path / "i.index"))
+    assert faiss.downcast_index(faiss.read_index(str(tmp_path / "i.index"))).nprobe == 256
+    hnsw = build_faiss_index(vec[:2000], "hnsw", ef_search=128)
+    assert faiss.downcast_index(hnsw).hnsw.efSearch == 128
+    assert set_search_params(build_faiss_index(vec[:100]), nprobe=4, ef_search=4).ntotal == 100  # flat: no-op
+
+def test_defaults():
+    assert default_pq_m(384) == 64 and default_pq_m(12) == 6 and default_pq_m(7) == 1
+    with pytest.raises(ValueError):
+        build_faiss_index(clustered(100), "lsh")
+    assert set(INDEX_TYPES) == {"flat", "ivf-flat", "ivf-pq", "hnsw"}
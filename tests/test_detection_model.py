@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import pytest
+from entendre_rank import detection_model
+from entendre_rank.detection_model import token_budget_batches, detect
+
+LYRICS = [
+    "[Verse]\nI got the keys to the city\nServing base all night\nBake the cake\nBlow the pipe, ride the rock",
+    "Short\nA much much longer line about the dope plug and the grams\nShort",
+    "",
+]
+
+@pytest.fixture
+def songs_csv(tmp_path):
+    rows = []
+    for i, text in enumerate(LYRICS):
+        p = tmp_path / f"s{i}.txt"
+        p.write_text(text, encoding="utf-8")
+        rows.append({"spotify_id": f"id{i}", "title": f"T{i}", "artists": "A", "lyrics_path": str(p)})
+    rows.append({"spotify_id": "gone", "title": "G", "artists": "A", "lyrics_path": str(tmp_path / "missing.txt")})
+    path = tmp_path / "songs.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+@pytest.fixture
+def patched_embedder(monkeypatch, fake_embedder):
+    monkeypatch.setattr(detection_model, "load_embedder", lambda *a, **k: fake_embedder)
+    return fake_embedder
+
+def test_token_budget_batches():
+    lengths = [5, 1, 9, 2, 2, 8]
+    batches = token_budget_batches(lengths, max_tokens=10)
+    assert sorted(i for b in batches for i in b) == list(range(6))
+    for b in batches:
+        assert len(b) == 1 or len(b) * max(lengths[i] for i in b) <= 10
+    assert batches[0] == [1, 3, 4]
+
+def test_bucketed_detect_matches_per_song(tmp_path, songs_csv, patched_embedder):
+    detect(songs_csv, str(tmp_path / "a.csv"), cache_path=None)
+    detect(songs_csv, str(tmp_path / "b.csv"), cache_path=None, bucketed=True, max_batch_tokens=16, bucket_songs=2)
+    a, b = pd.read_csv(tmp_path / "a.csv"), pd.read_csv(tmp_path / "b.csv")
+    assert len(a) == 7
+    pd.testing.assert_frame_equal(a, b)
+
+def test_embed_lines_token_budget_matches_fixed_batches(fake_embedder):
+    tok, model, device = fake_embedder
+    lines = [ln for text in LYRICS for ln in text.splitlines() if ln] * 3 + ["one two three four five six"]
+    fixed = detection_model.embed_lines(tok, model, device, lines)
+    bucketed = detection_model.embed_lines(tok, model, device, lines, max_tokens=12)
+    assert np.allclose(fixed, bucketed, atol=1e-6)
+
+def test_embedder_pool_matches_in_process(fake_embedder):
+    from conftest import fake_loader
+    from entendre_rank.embed_pool import EmbedderPool
+    tok, model, device = fake_embedder
+    lines = [f"line number {i} with the keys" for i in range(70)]
+    local = detection_model.embed_lines(tok, model, device, lines)
+    with EmbedderPool("fake", workers=2, threads_per_worker=1, loader=fake_loader) as pool:
+        pooled = detection_model.embed_lines(tok, model, device, lines, pool=pool)
+    assert model.rows == 70
+    assert np.allclose(local, pooled, atol=1e-6)
+
+def test_detect_with_workers_loads_model_only_in_workers(tmp_path, songs_csv, patched_embedder, monkeypatch):
+    import functools
+    from conftest import FakeTokenizer, fake_loader
+    from entendre_rank.embed_pool import EmbedderPool
+    detect(songs_csv, str(tmp_path / "a.csv"), cache_path=None)
+    def no_parent_model(*a, **k):
+        raise AssertionError("parent loaded the model")
+    monkeypatch.setattr(detection_model, "load_embedder", no_parent_model)
+    monkeypatch.setattr(detection_model, "load_tokenizer", lambda *a, **k: FakeTokenizer())
+    monkeypatch.setattr(detection_model, "EmbedderPool", functools.partial(EmbedderPool, loader=fake_loader))
+    detect(songs_csv, str(tmp_path / "b.csv"), cache_path=None, workers=2, threads_per_worker=1)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "a.csv"), pd.read_csv(tmp_path / "b.csv"))
+
+def test_detect_streams_parquet(tmp_path, songs_csv, patched_embedder):
+    from entendre_rank.detections_io import read_detections
+    detect(songs_csv, str(tmp_path / "a.csv"), cache_path=None)
+    detect(songs_csv, str(tmp_path / "a.parquet"), cache_path=None, chunk_rows=2)
+    pd.testing.assert_frame_equal(read_detections(str(tmp_path / "a.parquet")), pd.read_csv(tmp_path / "a.csv"),
+                                  check_dtype=False)
+
+def test_incremental_detect_reruns_only_changed_songs(tmp_path, songs_csv, patched_embedder, monkeypatch):
+    from entendre_rank.detections_io import read_detections
+    out = str(tmp_path / "d.parquet")
+    detect(songs_csv, out, cache_path=None)
+    full = read_detections(out)
+    _, model, _ = patched_embedder
+
+    rows_before = model.rows
+    detect(songs_csv, out, cache_path=None, incremental=True)
+    assert model.rows == rows_before  # nothing changed: no embedding at all
+    pd.testing.assert_frame_equal(read_detections(out), full)
+
+    songs = pd.read_csv(songs_csv)
+    songs.loc[songs["spotify_id"] == "id0", ["title", "artists"]] = ["T0 (Remastered)", "A, B"]
+    (tmp_path / "s1.txt").write_text("A brand new line with the rock\nAnd another", encoding="utf-8")
+    extra = tmp_path / "s9.txt"
+    extra.write_text("Fresh song\nwith the keys", encoding="utf-8")
+    songs = pd.concat([songs[songs["spotify_id"] != "id2"],
+                       pd.DataFrame([{"spotify_id": "id9", "title": "T9", "artists": "A", "lyrics_path": str(extra)}])])
+    songs.to_csv(songs_csv, index=False)
+    rows_before = model.rows
+    detect(songs_csv, out, cache_path=None, incremental=True)
+    assert model.rows - rows_before == 4  # only the edited and the new song's lines
+    fresh = str(tmp_path / "fresh.parquet")
+    detect(songs_csv, fresh, cache_path=None)
+    key = ["spotify_id", "line_idx"]
+    got = read_detections(out).sort_values(key).reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, read_detections(fresh).sort_values(key).reset_index(drop=True))
+
+    # a feature code (or lexicon, model, window) change invalidates every song
+    monkeypatch.setattr(detection_model, "FEATURE_VERSION", detection_model.FEATURE_VERSION + 1)
+    rows_before = model.rows
+    detect(songs_csv, out, cache_path=None, incremental=True)
+    assert model.rows - rows_before == len(read_detections(fresh))
+
+def test_triple_window_must_not_be_negative(monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["detection_model", "--input", "songs.csv", "--triple-window", "-1"])
+    with pytest.raises(SystemExit):
+        detection_model.main()
+    assert "--triple-window: must be >= 0" in capsys.readouterr().err
+
+def test_incremental_train_is_rejected(tmp_path, songs_csv, patched_embedder):
+    with pytest.raises(ValueError, match="without --incremental"):
+        detect(songs_csv, str(tmp_path / "d.parquet"), cache_path=None, incremental=True, train=True)
+    assert not (tmp_path / "d.parquet").exists()
+
+def test_train_saves_classifier_and_detect_applies_it(tmp_path, patched_embedder, monkeypatch):
+    from entendre_rank import line_classifier
+    from entendre_rank.detections_io import read_detections
+    monkeypatch.setattr(line_classifier, "CLASSIFIER_DIR", str(tmp_path / "clf"))
+    rows = []
+    for i in range(4):
+        text = "\n".join(["ride the rock she gave head", "plain words here", "dope plug keys on the base",
+                          "nothing to see", f"line {i}"] * 3)
+        (tmp_path / f"l{i}.txt").write_text(text, encoding="utf-8")
+        rows.append({"spotify_id": f"l{i}", "title": "T", "artists": "A", "lyrics_path": str(tmp_path / f"l{i}.txt")})
+    songs_csv = str(tmp_path / "songs.csv")
+    pd.DataFrame(rows).to_csv(songs_csv, index=False)
+
+    detect(songs_csv, str(tmp_path / "heur.parquet"), cache_path=None, train=True, score_batch_lines=7,
+           train_shards=str(tmp_path / "shards"), trainer="lbfgs")
+    assert (tmp_path / "clf" / "v0001.joblib").exists()
+    detect(songs_csv, str(tmp_path / "clf.parquet"), cache_path=None, classifier="latest")
+    heur, scored = read_detections(str(tmp_path / "heur.parquet")), read_detections(str(tmp_path / "clf.parquet"))
+    assert len(heur) == len(scored) == 60
+    assert not np.allclose(heur["double_prob"], scored["double_prob"])
+    # the classifier agrees with the weak labels it was fit on
+    assert scored.loc[heur["double_prob"] >= 0.7, "double_prob"].min() > scored.loc[heur["double_prob"] == 0, "double_prob"].max()
+
+def test_detect_reuses_line_store(tmp_path, songs_csv, patched_embedder):
+    from entendre_rank.line_store import LineEmbeddingStore
+    store_path = str(tmp_path / "lines")
+    _, model, _ = patched_embedder
+    detect(songs_csv, str(tmp_path / "a.csv"), cache_path=None, embedding_store=store_path, store_dtype="float32")
+    rows_before = model.rows
+    detect(songs_csv, str(tmp_path / "b.csv"), cache_path=None, embedding_store=store_path)
+    assert model.rows == rows_before  # every song paged in from the store
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "a.csv"), pd.read_csv(tmp_path / "b.csv"))
+
+    (tmp_path / "s1.txt").write_text("A brand new line with the rock\nAnd another", encoding="utf-8")
+    detect(songs_csv, str(tmp_path / "c.csv"), cache_path=None, embedding_store=store_path)
+    assert model.rows - rows_before == 2
+    with LineEmbeddingStore(store_path) as store:
+        assert len(store) == 2 and len(store.get("id1")) == 2
+
+    # only the first song re-embedded: output order still follows the input, not the store
+    (tmp_path / "s0.txt").write_text("Keys to a new city\nbake it", encoding="utf-8")
+    detect(songs_csv, str(tmp_path / "d.csv"), cache_path=None, embedding_store=store_path)
+    detect(songs_csv, str(tmp_path / "e.csv"), cache_path=None)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "d.csv"), pd.read_csv(tmp_path / "e.csv"))
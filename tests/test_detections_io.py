@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from entendre_rank.detections_io import DetectionWriter, iter_detection_chunks, read_detections
+from entendre_rank.ranking import rank
+
+def write_songs(path, n_songs=40, chunk_rows=7, seed=0):
+    rng = np.random.default_rng(seed)
+    with DetectionWriter(path, chunk_rows) as w:
+        for i in range(n_songs):
+            n = int(rng.integers(0, 12))
+            lines = [f"song {i} line {j}" for j in range(n)]
+            w.add_song({"spotify_id": f"id{i % 31}", "title": f"T{i}", "artists": "A, B"}, lines,
+                       rng.random(n), float(rng.integers(0, 3)), rng.integers(0, 2, n).astype(float))
+    return w.rows
+
+def rank_in_memory(df, out, normalize_per_100=False):
+    # straightforward whole-table version of the ranking
+    df = df.assign(is_double=df["double_prob"] >= 0.6)
+    g = df.groupby("spotify_id")
+    songs = pd.DataFrame({"title": g["title"].first(), "artists": g["artists"].first(), "line_count": g.size(),
+                          "double_count": g["is_double"].sum(), "triple_signal": g["triple_signal"].max()}).reset_index()
+    songs["triple_count"] = (songs["triple_signal"] >= 1.0).astype(int)
+    songs["score"] = (songs["double_count"] + 2 * songs["triple_count"]).astype(float)
+    if normalize_per_100:
+        songs["score"] = songs["score"] / songs["line_count"] * 100
+    songs.sort_values(["score", "spotify_id"], ascending=[False, True]).to_csv(out, index=False)
+
+def test_parquet_and_csv_roundtrip(tmp_path):
+    rows = write_songs(str(tmp_path / "d.parquet"))
+    assert write_songs(str(tmp_path / "d.csv")) == rows
+    a, b = read_detections(str(tmp_path / "d.parquet")), read_detections(str(tmp_path / "d.csv"))
+    assert len(a) == rows and list(a.columns) == list(b.columns)
+    pd.testing.assert_frame_equal(a, b, check_dtype=False)
+    assert max(len(c) for c in iter_detection_chunks(str(tmp_path / "d.parquet"), chunk_rows=5)) == 5
+
+def test_chunked_rank_matches_in_memory(tmp_path):
+    det = str(tmp_path / "d.parquet")
+    write_songs(det)
+    rank_in_memory(read_detections(det), tmp_path / "expected.csv")
+    rank(det, str(tmp_path / "ranked.csv"), chunk_rows=6)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "ranked.csv"), pd.read_csv(tmp_path / "expected.csv"))
+
+def test_per_100_lines_normalization_and_partial_merges(tmp_path):
+    from entendre_rank.ranking import aggregate_detections
+    det = str(tmp_path / "d.parquet")
+    write_songs(det)
+    rank_in_memory(read_detections(det), tmp_path / "expected.csv", normalize_per_100=True)
+    rank(det, str(tmp_path / "ranked.csv"), normalize_per_100=True, chunk_rows=5)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "ranked.csv"), pd.read_csv(tmp_path / "expected.csv"))
+    # folding partials early gives the same per-song aggregates
+    a = aggregate_detections(det, chunk_rows=5).sort_values("spotify_id").reset_index(drop=True)
+    b = aggregate_detections(det, chunk_rows=5, merge_rows=1).sort_values("spotify_id").reset_index(drop=True)
+    pd.testing.assert_frame_equal(a, b)
+    assert a["line_count"].sum() == len(read_detections(det))
+
+def test_empty_detections(tmp_path):
+    for name in ("e.parquet", "e.csv"):
+        DetectionWriter(str(tmp_path / name)).close()
+        assert len(read_detections(str(tmp_path / name))) == 0
+
+def test_top_k_and_filters_match_full_ranking(tmp_path):
+    from entendre_rank.ranking import ranked_songs
+    det = str(tmp_path / "d.parquet")
+    with DetectionWriter(det, 7) as w:
+        for i in range(30):
+            n = 3 + i % 5
+            w.add_song({"spotify_id": f"id{i:02d}", "title": f"T{i}", "artists": ["Nas, Jay-Z", "Jay-Z", "JAY"][i % 3]},
+                       [f"l{j}" for j in range(n)], np.full(n, 0.7 if i % 4 else 0.1), float(i % 2), np.zeros(n))
+    full = ranked_songs(det, chunk_rows=5)
+    for k in (1, 5, 12, 50):
+        pd.testing.assert_frame_equal(ranked_songs(det, chunk_rows=5, top=k), full.head(k))
+    jay = ranked_songs(det, artist="jay-z", min_lines=4, min_score=3, top=5)
+    expected = full[full["artists"].isin(["Nas, Jay-Z", "Jay-Z"]) & (full["line_count"] >= 4) & (full["score"] >= 3)]
+    assert len(expected) > 5
+    assert jay["spotify_id"].tolist() == expected["spotify_id"].head(5).tolist()
+    assert ranked_songs(str(tmp_path / "d.parquet"), artist="Ja").empty
@@ -0,0 +1,44 @@
+import numpy as np
+from entendre_rank.embed_cache import EmbeddingCache, normalize_line
+from entendre_rank.detection_model import embed_lines
+
+def test_cache_roundtrip_and_model_isolation(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    c = EmbeddingCache(path, "m1")
+    c.put_many({"hello world": np.arange(4, dtype=np.float32)})
+    c.close()
+    c = EmbeddingCache(path, "m1")
+    got = c.get_many(["hello world", "other"])
+    assert list(got) == ["hello world"]
+    assert np.allclose(got["hello world"], np.arange(4))
+    assert EmbeddingCache(path, "m2").get_many(["hello world"]) == {}
+
+def test_cache_lru_eviction(tmp_path):
+    c = EmbeddingCache(str(tmp_path / "emb.sqlite"), "m", max_entries=2)
+    v = np.zeros(3, dtype=np.float32)
+    c.put_many({"a": v})
+    c.put_many({"b": v})
+    c.get_many(["a"])  # a is now more recent than b
+    c.put_many({"c": v})
+    assert len(c) == c.entries == 2
+    assert set(c.get_many(["a", "b", "c"])) == {"a", "c"}
+    # re-putting cached lines rewrites them without counting them twice
+    c.put_many({"a": v + 1, "c": v})
+    assert len(c) == c.entries == 2 and np.allclose(c.get_many(["a"])["a"], 1)
+    c.close()
+    assert EmbeddingCache(str(tmp_path / "emb.sqlite"), "m", max_entries=2).entries == 2
+
+def test_embed_lines_dedups_and_uses_cache(tmp_path, fake_embedder):
+    tok, model, device = fake_embedder
+    lines = ["I got the keys", "I  got the keys ", "serving base", "I got the keys"]
+    plain = embed_lines(tok, model, device, lines)
+    assert model.rows == 2
+    assert np.allclose(plain[0], plain[1]) and np.allclose(plain[0], plain[3])
+
+    c = EmbeddingCache(str(tmp_path / "emb.sqlite"), "fake")
+    embed_lines(tok, model, device, lines, cache=c)
+    model.rows = 0
+    again = embed_lines(tok, model, device, lines + ["new line"], cache=c)
+    assert model.rows == 1
+    assert np.allclose(again[:4], plain)
+    assert normalize_line(" a \t b ") == "a b"
@@ -0,0 +1,108 @@
+import asyncio
+import time
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from entendre_rank.genius_async import AsyncGeniusFetcher, TokenBucket, parse_lyrics_html, retry_after_seconds
+
+class StubGenius:
+    """Local stand-in for api.genius.com + genius.com song pages."""
+
+    def __init__(self, latency=0.02, throttle_first=2, retry_after="0.05"):
+        self.latency = latency
+        self.throttle_first = throttle_first
+        self.retry_after = retry_after
+        self.requests = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self.base = ""
+
+    async def _track(self, handler, request):
+        self.requests += 1
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            await asyncio.sleep(self.latency)
+            return await handler(request)
+        finally:
+            self.inflight -= 1
+
+    async def search(self, request):
+        if self.throttle_first > 0:
+            self.throttle_first -= 1
+            return web.Response(status=429, headers={"Retry-After": self.retry_after})
+        q = request.query["q"]
+        if "nolyrics" in q:
+            return web.json_response({"response": {"hits": []}})
+        slug = q.split()[0]
+        hits = [{"type": "song", "result": {"url": f"{self.base}/songs/{slug}", "primary_artist": {"name": "Stub"}}}]
+        return web.json_response({"response": {"hits": hits}})
+
+    async def song(self, request):
+        slug = request.match_info["slug"]
+        if slug == "slow":
+            await asyncio.sleep(1.0)
+        return web.Response(text=f'<div data-lyrics-container="true">{slug} line one<br/>{slug} line two</div>',
+                            content_type="text/html")
+
+async def run_with_stub(stub, queries, **kw):
+    app = web.Application()
+    app.router.add_get("/search", lambda r: stub._track(stub.search, r))
+    app.router.add_get("/songs/{slug}", lambda r: stub._track(stub.song, r))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    stub.base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    try:
+        fetcher = AsyncGeniusFetcher("token", api_base=stub.base, backoff=0.01, **kw)
+        return fetcher, await fetcher.fetch_many(queries)
+    finally:
+        await runner.cleanup()
+
+def test_fetch_many_concurrent_with_retries():
+    stub = StubGenius()
+    queries = [(f"song{i}", "Stub") for i in range(20)] + [("nolyrics", "Stub")]
+    fetcher, out = asyncio.run(run_with_stub(stub, queries, rate=500, concurrency=6))
+    assert out[:20] == [f"song{i} line one\nsong{i} line two" for i in range(20)]
+    assert out[20] is None
+    assert fetcher.retries == 2
+    assert 1 < stub.max_inflight <= 6
+
+def test_http_date_retry_after_still_retries():
+    stub = StubGenius(throttle_first=1, retry_after="Wed, 21 Oct 2015 07:28:00 GMT")
+    fetcher, out = asyncio.run(run_with_stub(stub, [("song", "Stub")], rate=500))
+    assert out == ["song line one\nsong line two"]
+    assert fetcher.retries == 1
+
+def test_retry_after_seconds():
+    from email.utils import format_datetime
+    from datetime import datetime, timedelta, timezone
+    assert retry_after_seconds("2.5") == 2.5
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < retry_after_seconds(later) <= 30
+    assert retry_after_seconds("soon") is None
+
+def test_timeout_gives_up_after_retries():
+    stub = StubGenius(throttle_first=0)
+    fetcher, out = asyncio.run(run_with_stub(stub, [("slow", "Stub"), ("fast", "Stub")], timeout=0.2, max_retries=1))
+    assert out == [None, "fast line one\nfast line two"]
+    assert fetcher.retries == 1
+
+def test_token_bucket_rate():
+    async def go():
+        bucket = TokenBucket(rate=50, capacity=1)
+        t0 = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        return time.monotonic() - t0
+    assert asyncio.run(go()) >= 0.19
+
+def test_parse_lyrics_html():
+    html = '<div class="LyricsHeader__x">Header</div><div data-lyrics-container="true">a<br>b</div>'
+    assert parse_lyrics_html(html) == "a\nb"
+    assert parse_lyrics_html("<p>nothing</p>") is None
+    html = '<div data-lyrics-container="true">[Verse 1]<br/>line one<br/><br/>[Chorus: Stub]<br/>line two</div>'
+    assert parse_lyrics_html(html) == "line one\n\nline two"  # stanza break kept, as lyricsgenius does
@@ -0,0 +1,108 @@
+import functools
+import threading
+import time
+import pytest
+from entendre_rank.rate_limit import RateLimiter
+from src.ingest_spotify import PLAYLIST_FIELDS, fetch_playlist_tracks
+
+class FakeClock:
+    # time only moves when a caller sleeps
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class StubSpotify:
+    # serves a playlist of n tracks in Spotify's paging shape, with per-call latency
+    def __init__(self, n, latency=0.02, clock=None):
+        self.tracks = [{"track": {"id": f"t{i}", "name": f"Song {i}", "artists": [{"id": "a1", "name": "Nas"}],
+                                  "album": {"name": "Illmatic"}}} for i in range(n)]
+        self.tracks[5] = {"track": None}  # removed from Spotify
+        self.latency = latency
+        self.clock = clock
+        self.call_times = []
+        self.calls, self.in_flight, self.max_in_flight = [], 0, 0
+        self.lock = threading.Lock()
+
+    def playlist_items(self, pid, fields=None, limit=100, offset=0, additional_types=None):
+        with self.lock:
+            self.calls.append((offset, fields))
+            if self.clock:
+                self.call_times.append(self.clock())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        nxt = "more" if offset + limit < len(self.tracks) else None
+        return {"items": self.tracks[offset:offset+limit], "total": len(self.tracks), "next": nxt}
+
+def test_pages_fetched_concurrently_in_order():
+    sp = StubSpotify(2050)
+    df = fetch_playlist_tracks(sp, "https://open.spotify.com/playlist/abc?si=x", concurrency=8, rate=1000)
+    assert len(df) == 2049 and df["track_id"].iloc[:6].tolist() == ["t0", "t1", "t2", "t3", "t4", "t6"]
+    assert df["track_id"].iloc[-1] == "t2049" and df["artist_name"].iloc[0] == "Nas"
+    assert sorted(o for o, _ in sp.calls) == list(range(0, 2050, 100))
+    assert all(f == PLAYLIST_FIELDS for _, f in sp.calls)
+    assert sp.max_in_flight > 1
+
+def test_max_tracks_and_rate_limit(monkeypatch):
+    sp = StubSpotify(1000, latency=0)
+    assert len(fetch_playlist_tracks(sp, "abc", max_tracks=250, rate=1000)) == 299
+    assert len(sp.calls) == 3
+    clock = FakeClock()
+    monkeypatch.setattr("src.ingest_spotify.RateLimiter", functools.partial(RateLimiter, clock=clock, sleep=clock.sleep))
+    sp = StubSpotify(1000, latency=0, clock=clock)
+    fetch_playlist_tracks(sp, "abc", concurrency=1, rate=5)  # 10 calls: a burst of 5, then 5 per second
+    assert sp.call_times == pytest.approx([0.0] * 5 + [0.2, 0.4, 0.6, 0.8, 1.0])
+
+class StubFeatures:
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def audio_features(self, ids):
+        with self.lock:
+            self.requested.append(list(ids))
+        return [None if tid in self.unknown else {"id": tid, "danceability": 0.5, "tempo": float(len(tid)), "key": 1}
+                for tid in ids]
+
+def test_audio_features_come_from_store_when_fresh(tmp_path):
+    from src.feature_store import AudioFeatureStore
+    from src.ingest_spotify import fetch_audio_features
+    ids = [f"t{i}" for i in range(5000)]
+    store = AudioFeatureStore(str(tmp_path / "feats.sqlite"))
+    sp = StubFeatures(unknown={"t7"})
+    df = fetch_audio_features(sp, ids, store=store, rate=1000)
+    assert len(sp.requested) == 50 and len(df) == 4999 and "t7" not in set(df["track_id"])
+    assert df.loc[df["track_id"] == "t10", "tempo"].item() == 3.0
+
+    sp.requested.clear()
+    again = fetch_audio_features(sp, ids + ["new1"], store=store, rate=1000)
+    assert sp.requested == [["new1"]]  # t7 is a remembered miss
+    assert again.iloc[:4999].equals(df) and len(store) == 5001
+
+    expired = AudioFeatureStore(str(tmp_path / "feats.sqlite"), ttl=0, miss_ttl=0)
+    sp.requested.clear()
+    fetch_audio_features(sp, ids[:150], store=expired, rate=1000)
+    assert sum(map(len, sp.requested)) == 150
+
+def test_empty_response_is_not_cached_and_misses_expire_sooner(tmp_path):
+    from src.feature_store import AudioFeatureStore
+    from src.ingest_spotify import fetch_audio_features
+    store = AudioFeatureStore(str(tmp_path / "feats.sqlite"))
+    down = StubFeatures()
+    down.audio_features = lambda ids: None  # throttled or failed call
+    assert fetch_audio_features(down, ["t1", "t2"], store=store, rate=1000).empty
+    assert len(store) == 0
+
+    sp = StubFeatures(unknown={"t2"})
+    fetch_audio_features(sp, ["t1", "t2"], store=store, rate=1000)
+    assert store.get_many(["t1", "t2"]) == {"t1": store.get_many(["t1"])["t1"], "t2": None}
+    short = AudioFeatureStore(str(tmp_path / "feats.sqlite"), miss_ttl=0)
+    assert list(short.get_many(["t1", "t2"])) == ["t1"]  # the miss is stale, the hit is not
@@ -0,0 +1,63 @@
+import random
+from entendre_rank.lexicon import LexiconMatcher, LexiconSource, load_lexicon_dir, tokenize
+from entendre_rank.utils import keyword_hits, keyword_hits_batch, engineered_features, engineered_features_reference
+
+LEXICON = {
+    "ambiguous": [("bird", 1.0), ("kitchen", 1.0), ("white girl", 1.0)],
+    "sexual": [("white girl", 0.5), ("head", 1.0)],
+    "drug": [("bird in the kitchen", 3.0), ("in the kitchen", 1.0), ("white", 1.0)],
+    "violence": [("the stick", 1.0)],
+}
+
+def brute_force(lexicon, line):
+    toks = tokenize(line)
+    found = set()
+    for entries in lexicon.values():
+        for phrase, _ in entries:
+            p = tokenize(phrase)
+            if any(toks[i:i+len(p)] == p for i in range(len(toks) - len(p) + 1)):
+                found.add(" ".join(p))
+    return found
+
+def test_phrases_and_overlaps():
+    m = LexiconMatcher(LEXICON)
+    line = "Got a BIRD in the kitchen, white girl on the stick"
+    assert {m.entries[e] for e in m.entries_in(line)} == brute_force(LEXICON, line)
+    assert m.hits(line) == (3, 1, 3)
+    assert m.hits(line, ["violence"]) == (1,)
+    assert m.scores(line) == (3.0, 0.5, 5.0)
+    assert m.hits("birds in the kitchenette") == (0, 0, 0)
+
+def test_automaton_matches_brute_force():
+    rnd = random.Random(7)
+    vocab = ["a", "b", "c", "d"]
+    lexicon = {"ambiguous": [(" ".join(rnd.choice(vocab) for _ in range(rnd.randint(1, 4))), 1.0) for _ in range(25)]}
+    m = LexiconMatcher(lexicon)
+    for _ in range(300):
+        line = " ".join(rnd.choice(vocab + ["x"]) for _ in range(rnd.randint(0, 12)))
+        assert {m.entries[e] for e in m.entries_in(line)} == brute_force(lexicon, line)
+
+def test_batched_hits_with_phrases():
+    m = LexiconMatcher(LEXICON)
+    lines = ["bird in the kitchen", "bird, in the KITCHEN!", "bird in the\x1ekitchen", "in the kitchen bird",
+             "white girl white", "bird in", "the kitchen", "", "headhead head's head"]
+    assert keyword_hits_batch(lines, m).tolist() == [list(keyword_hits(ln, m)) for ln in lines]
+    assert engineered_features(lines, m).equals(engineered_features_reference(lines, m))
+
+def test_files_and_hot_reload(tmp_path):
+    (tmp_path / "drug.tsv").write_text("# comment\nbird in the kitchen\t2.5\nwhite\n")
+    (tmp_path / "sexual.tsv").write_text("head\n")
+    assert load_lexicon_dir(str(tmp_path))["drug"] == [("bird in the kitchen", 2.5), ("white", 1.0)]
+    source = LexiconSource(str(tmp_path), check_interval=0)
+    assert source.get().hits("bird in the kitchen") == (0, 0, 1)
+    (tmp_path / "ambiguous.tsv").write_text("kitchen\n")
+    assert source.get().hits("bird in the kitchen") == (1, 0, 1)
+    assert source.version == 2
+    # a broken edit keeps serving the previous automaton
+    (tmp_path / "sexual.tsv").write_text("head\tnot-a-number\n")
+    assert source.get().hits("head") == (0, 1, 0)
+    assert source.version == 2
+
+def test_default_lexicon_files():
+    m = LexiconSource().get()
+    assert m.hits("Rock the keys, she gave head then dope") == (4, 1, 2)
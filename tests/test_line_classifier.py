@@ -0,0 +1,33 @@
+import json
+import numpy as np
+import pytest
+from entendre_rank.line_classifier import FEATURE_NAMES, load_classifier, new_pipeline, save_classifier
+
+def fitted(seed=0, n=400, dim=16):
+    rng = np.random.default_rng(seed)
+    X = np.hstack([rng.normal(size=(n, dim)), rng.integers(0, 20, size=(n, len(FEATURE_NAMES)))])
+    y = (X[:, 0] + X[:, dim] / 10 + rng.normal(scale=0.5, size=n) > 1).astype(int)
+    return new_pipeline().fit(X, y), X
+
+def test_folded_scores_match_pipeline(tmp_path):
+    pipeline, X = fitted()
+    save_classifier(pipeline, "emb", "lex", len(X), out_dir=str(tmp_path))
+    clf = load_classifier("latest", "emb", out_dir=str(tmp_path))
+    assert np.allclose(clf.predict_proba(X), pipeline.predict_proba(X)[:, 1], atol=1e-5)
+
+def test_versions_and_compatibility(tmp_path):
+    out = str(tmp_path)
+    first = save_classifier(fitted(0)[0], "emb", "lex", 1, out_dir=out)
+    save_classifier(fitted(1)[0], "emb", "lex", 1, out_dir=out)
+    assert load_classifier("latest", out_dir=out).version == "v0002"
+    assert sorted(p.name for p in tmp_path.glob("LATEST*")) == ["LATEST"]  # no temp file left behind
+    assert load_classifier("v0001", out_dir=out).version == "v0001"
+    assert load_classifier(first).version == "v0001"
+    with pytest.raises(ValueError, match="embeddings"):
+        load_classifier("latest", "other-model", out_dir=out)
+    meta_path = tmp_path / "v0002.json"
+    meta = json.loads(meta_path.read_text())
+    meta["feature_version"] = -1
+    meta_path.write_text(json.dumps(meta))
+    with pytest.raises(ValueError, match="retrain"):
+        load_classifier("latest", out_dir=out)
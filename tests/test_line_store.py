@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from entendre_rank.line_store import LineEmbeddingStore, is_line_store
+
+def test_append_reopen_and_lookup(tmp_path):
+    path = str(tmp_path / "lines")
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=(3, 8)), rng.normal(size=(2, 8))
+    with LineEmbeddingStore(path, dim=8, dtype="float32", model_name="m") as store:
+        store.append("a", a, "ka")
+        store.append("b", b, "kb")
+        assert np.allclose(store.get("a"), a) and store.get("zzz") is None
+    assert is_line_store(path)
+    with pytest.raises(ValueError):
+        LineEmbeddingStore(path, model_name="other")
+    store = LineEmbeddingStore(path)
+    assert len(store) == 2 and store.n_rows == 5 and store.keys() == {"a": "ka", "b": "kb"}
+    assert isinstance(store.matrix(), np.memmap)
+    assert np.allclose(store.get_line("b", 1), b[1])
+    store.append("a", a[:1] * 2, "ka2")  # replaced: old rows become garbage
+    assert store.n_rows == 6 and np.allclose(store.get("a"), a[:1] * 2)
+    assert store.nearest(b[0], k=10)[0][:2] == ("b", 0)
+    assert len(store.nearest(b[0], k=10)) == 3
+    store.compact()
+    assert store.n_rows == 3 and np.allclose(store.get("b"), b)
+    assert store.nearest(a[0] * 2, k=1)[0][:2] == ("a", 0)
+    store.close()
+
+def test_float16_and_interrupted_append(tmp_path):
+    path = str(tmp_path / "lines")
+    store = LineEmbeddingStore(path, dim=4)
+    store.append("a", np.ones((2, 4)))
+    store.close()
+    with open(f"{path}/embeddings.bin", "ab") as f:
+        f.write(b"\0" * 10)  # rows written but never indexed
+    store = LineEmbeddingStore(path)
+    assert store.matrix().dtype == np.float16 and store.n_rows == 2
+    store.append("b", np.zeros((1, 4)))
+    assert np.allclose(store.get("b"), 0) and np.allclose(store.get("a"), 1)
+    store.close()
+
+def test_compact_switches_file_and_offsets_together(tmp_path):
+    import os
+    path = str(tmp_path / "lines")
+    a, b = np.ones((3, 4)), np.full((2, 4), 2.0)
+    with LineEmbeddingStore(path, dim=4, dtype="float32") as store:
+        store.append("a", a)
+        store.append("b", b)
+        store.append("a", a[:1] * 3)
+        store.compact()
+        assert os.listdir(path).count("embeddings.bin") == 0 and store.n_rows == 3
+    # a compact() that crashed before its commit leaves the next generation's file behind
+    (tmp_path / "lines" / "embeddings.2.bin").write_bytes(b"\0" * 64)
+    store = LineEmbeddingStore(path)
+    assert sorted(fn for fn in os.listdir(path) if fn.endswith(".bin")) == ["embeddings.1.bin"]
+    assert np.allclose(store.get("a"), 3) and np.allclose(store.get("b"), b)
+    store.compact()
+    store.close()
+    store = LineEmbeddingStore(path)
+    assert store.generation == 2 and np.allclose(store.get("b"), b)
+    store.close()
@@ -0,0 +1,43 @@
+import pandas as pd
+from entendre_rank.lyrics_store import LyricsStore, LyricsDirectory, migrate_directory, open_lyrics
+from entendre_rank.detection_model import iter_song_lines
+
+def test_store_random_access_and_streaming(tmp_path):
+    store = open_lyrics(str(tmp_path / "lyrics.sqlite"))
+    assert isinstance(store, LyricsStore)
+    store.put("b", "second song\nline")
+    store.put_many([("a", "first ✓"), ("c", "")])
+    assert store.get("a") == "first ✓" and store.get("missing") is None
+    assert "b" in store and "zzz" not in store
+    assert [sid for sid, _ in store.iter_items()] == ["b", "a", "c"]
+    store.close()
+
+def test_migrate_directory_and_detect_reads_store(tmp_path):
+    raw = LyricsDirectory(str(tmp_path / "raw"))
+    raw.put("id1", "[Verse]\nI got the keys\nbake the cake")
+    raw.put("id2", "serving base all night")
+    songs_csv = tmp_path / "songs.csv"
+    pd.DataFrame({"spotify_id": ["id1", "id2", "id3"], "title": ["A", "B", "C"], "artists": ["X"] * 3,
+                  "lyrics_path": [raw.location("id1"), raw.location("id2"), raw.location("id3")]}).to_csv(songs_csv, index=False)
+
+    store_path = str(tmp_path / "lyrics.sqlite")
+    assert migrate_directory(str(tmp_path / "raw"), store_path, str(songs_csv)) == 2
+    songs = pd.read_csv(songs_csv)
+    assert songs["lyrics_path"].tolist() == [store_path, store_path, raw.location("id3")]
+    got = [(row["spotify_id"], lines) for row, lines in iter_song_lines(songs)]
+    assert got == [("id1", ["I got the keys", "bake the cake"]), ("id2", ["serving base all night"])]
+
+def test_legacy_directory_is_packed_on_first_run(tmp_path, capsys):
+    from entendre_rank.lyrics_store import adopt_legacy_directory
+    raw = LyricsDirectory(str(tmp_path / "raw"))
+    store_path = str(tmp_path / "lyrics.sqlite")
+    assert adopt_legacy_directory(store_path, str(tmp_path / "empty")) == 0
+    raw.put("artist", "placeholder")
+    assert adopt_legacy_directory(store_path, str(tmp_path / "raw")) == 0  # nothing named after a track
+    assert "artist.txt" in capsys.readouterr().out and not (tmp_path / "lyrics.sqlite").exists()
+    raw.put("4uLU6hMCjMI75M1A2tKUQC", "old lyrics")
+    assert adopt_legacy_directory(store_path, str(tmp_path / "raw")) == 1
+    assert adopt_legacy_directory(store_path, str(tmp_path / "raw")) == 0  # the store exists now
+    store = LyricsStore(store_path)
+    assert store.get("4uLU6hMCjMI75M1A2tKUQC") == "old lyrics" and "artist" not in store
+    store.close()
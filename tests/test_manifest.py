@@ -0,0 +1,68 @@
+import json
+import pytest
+from entendre_rank.data_collection import collect_lyrics
+from entendre_rank.lyrics_store import LyricsDirectory
+from entendre_rank.manifest import CollectionManifest, FETCHED, MISSING, FAILED
+
+TRACKS = [{"id": f"t{i}", "name": f"Song {i}", "artists": [{"name": "Artist"}]} for i in range(5)]
+
+def fake_fetcher(outcomes, calls, crash_after=None):
+    def fetch_many(queries, on_result):
+        calls.append([q[0] for q in queries])
+        for i, (title, _) in enumerate(queries):
+            if crash_after is not None and i == crash_after:
+                raise KeyboardInterrupt
+            status = outcomes.get(title, FETCHED)
+            on_result(i, status, f"lyrics of {title}" if status == FETCHED else None)
+    return fetch_many
+
+def run(tmp_path, calls, **kw):
+    m = CollectionManifest(str(tmp_path / "manifest.jsonl"))
+    try:
+        outcomes = {"Song 3": MISSING, "Song 4": FAILED}
+        return collect_lyrics(TRACKS, m, fake_fetcher(outcomes, calls, kw.pop("crash_after", None)),
+                              LyricsDirectory(str(tmp_path)), **kw)
+    finally:
+        m.close()
+
+def test_resume_after_crash_and_negative_cache(tmp_path):
+    calls = []
+    with pytest.raises(KeyboardInterrupt):
+        run(tmp_path, calls, crash_after=2)
+    rows = run(tmp_path, calls)
+    assert calls[1] == ["Song 2", "Song 3", "Song 4"]
+    assert [r["spotify_id"] for r in rows] == ["t0", "t1", "t2"]
+    assert (tmp_path / "t2.txt").read_text(encoding="utf-8") == "lyrics of Song 2"
+
+    run(tmp_path, calls)
+    assert calls[2] == ["Song 4"]  # missing is negatively cached, failed is retried
+    run(tmp_path, calls, missing_ttl=0)
+    assert calls[3] == ["Song 3", "Song 4"]
+
+    recs = [json.loads(l) for l in (tmp_path / "manifest.jsonl").read_text().splitlines()]
+    assert {r["status"] for r in recs} == {FETCHED, MISSING, FAILED}
+    assert all("ts" in r for r in recs)
+
+def test_existing_lyrics_files_are_adopted(tmp_path):
+    (tmp_path / "t0.txt").write_text("old lyrics", encoding="utf-8")
+    calls = []
+    rows = run(tmp_path, calls)
+    assert "Song 0" not in calls[0]
+    assert rows[0]["lyrics_path"] == str(tmp_path / "t0.txt")
+
+def test_songs_lost_with_uncommitted_store_rows_are_refetched(tmp_path):
+    from entendre_rank.lyrics_store import LyricsStore
+    store_path = str(tmp_path / "lyrics.sqlite")
+    m, calls = CollectionManifest(str(tmp_path / "manifest.jsonl")), []
+    store = LyricsStore(store_path, commit_every=2)
+    with pytest.raises(KeyboardInterrupt):
+        collect_lyrics(TRACKS, m, fake_fetcher({}, calls, crash_after=3), store)
+    store.conn.close()  # crash: the third song was never committed
+    m.close()
+
+    m, store = CollectionManifest(str(tmp_path / "manifest.jsonl")), LyricsStore(store_path)
+    rows = collect_lyrics(TRACKS, m, fake_fetcher({}, calls), store)
+    m.close()
+    assert calls[1] == ["Song 2", "Song 3", "Song 4"]
+    assert [store.get(r["spotify_id"]) for r in rows] == [f"lyrics of Song {i}" for i in range(5)]
+    store.close()
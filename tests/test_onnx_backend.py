@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+from transformers import BertConfig, BertModel, BertTokenizerFast
+from entendre_rank.detection_model import load_embedder, embed_lines
+
+WORDS = "i got the keys to city serving base all night bake cake blow pipe ride rock plug grams".split()
+
+@pytest.fixture(scope="module")
+def tiny_bert(tmp_path_factory):
+    # small random BERT saved locally, so parity runs offline
+    d = tmp_path_factory.mktemp("tiny_bert")
+    (d / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS), encoding="utf-8")
+    BertTokenizerFast(vocab_file=str(d / "vocab.txt")).save_pretrained(d)
+    cfg = BertConfig(vocab_size=len(WORDS) + 5, hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                     intermediate_size=128, max_position_embeddings=160)
+    BertModel(cfg).save_pretrained(d)
+    return str(d)
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+@pytest.mark.parametrize("backend,min_cos", [("onnx", 0.9999), ("onnx-int8", 0.98)])
+def test_onnx_backend_parity(tmp_path, monkeypatch, tiny_bert, backend, min_cos):
+    import entendre_rank.onnx_backend as ob
+    monkeypatch.setattr(ob, "ONNX_CACHE_DIR", str(tmp_path))
+    lines = ["i got the keys to the city", "serving base all night", "bake the cake", "blow the pipe ride the rock plug"]
+    ref = embed_lines(*load_embedder(tiny_bert, device="cpu"), lines)
+    tok, enc, device = load_embedder(tiny_bert, backend=backend)
+    got = embed_lines(tok, enc, device, lines, max_tokens=16)
+    assert got.shape == ref.shape
+    assert cosine(ref, got).min() >= min_cos
+    # second load reuses the exported file
+    assert len(list(tmp_path.rglob("*.onnx"))) == (1 if backend == "onnx" else 2)
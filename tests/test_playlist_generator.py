@@ -0,0 +1,95 @@
+import random
+from entendre_rank.playlist_generator import plan_sync, sync_playlist
+
+class FakeSpotify:
+    # one user's playlists with Spotify's add/remove/reorder/replace semantics; counts write calls
+    def __init__(self, playlists):
+        self.playlists = playlists  # id -> (name, [track ids])
+        self.writes = 0
+
+    def me(self):
+        return {"id": "me"}
+
+    def current_user_playlists(self, limit=50, offset=0):
+        items = [{"id": pid, "name": name, "owner": {"id": "me"}} for pid, (name, _) in self.playlists.items()]
+        return {"items": items[offset:offset+limit], "next": None}
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=None):
+        tracks = self.playlists[playlist_id][1]
+        page = {"items": [{"track": {"id": t}} for t in tracks[offset:offset+limit]], "offset": offset}
+        page["next"] = (playlist_id, offset + limit) if offset + limit < len(tracks) else None
+        return page
+
+    def next(self, page):
+        pid, offset = page["next"]
+        return self.playlist_items(pid, offset=offset)
+
+    def _ids(self, items):
+        return [u.split(":")[-1] for u in items]
+
+    def user_playlist_create(self, user, name, public=True, description=""):
+        self.writes += 1
+        self.playlists["new"] = (name, [])
+        return {"id": "new", "external_urls": {"spotify": "https://open.spotify.com/playlist/new"}}
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        assert len(items) <= 100
+        self.writes += 1
+        self.playlists[playlist_id][1].extend(self._ids(items))
+
+    def playlist_replace_items(self, playlist_id, items):
+        self.writes += 1
+        self.playlists[playlist_id][1][:] = self._ids(items)
+
+    def playlist_remove_specific_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        assert sum(len(it["positions"]) for it in items) <= 100
+        self.writes += 1
+        tracks = self.playlists[playlist_id][1]
+        for pos in sorted((p for it in items for p in it["positions"]), reverse=True):
+            tracks.pop(pos)
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        self.writes += 1
+        tracks = self.playlists[playlist_id][1]
+        moved = tracks[range_start:range_start + range_length]
+        del tracks[range_start:range_start + range_length]
+        at = insert_before if insert_before < range_start else insert_before - range_length
+        tracks[at:at] = moved
+
+def test_plan_sync_is_minimal():
+    target = list("ABCDE")
+    assert plan_sync(target, target) == {"remove": [], "add": [], "moves": []}
+    assert plan_sync(list("DABCE"), target)["moves"] == [(0, 4)]  # one move, not three
+    plan = plan_sync(list("AXBCB"), list("ABCY"))
+    assert plan["remove"] == [("X", [1]), ("B", [4])] and plan["add"] == ["Y"] and plan["moves"] == []
+
+def test_sync_playlist_applies_diff_and_is_idempotent():
+    rng = random.Random(0)
+    old = [f"t{i}" for i in range(250)]
+    sp = FakeSpotify({"p1": ("Top Wordplay", list(old))})
+    # nightly refresh: a few tracks drop out, a few come in, a couple swap places
+    new = [t for t in old if t not in {"t3", "t90", "t200"}] + ["n1", "n2"]
+    new[10], new[11] = new[11], new[10]
+    stats = sync_playlist(sp, new, "Top Wordplay")
+    assert sp.playlists["p1"][1] == new and not stats["replaced"]
+    assert sp.writes == stats["calls"] <= 3
+    stats = sync_playlist(sp, new, "Top Wordplay")
+    assert stats["calls"] == 0 and sp.writes == 3
+
+    # a reshuffle costs more as a diff than as a rewrite
+    shuffled = new[:]
+    rng.shuffle(shuffled)
+    stats = sync_playlist(sp, shuffled, "Top Wordplay", playlist_id="p1")
+    assert stats["replaced"] and sp.playlists["p1"][1] == shuffled and stats["calls"] == 3
+
+    for _ in range(50):
+        cur = rng.sample(old[:30], rng.randint(0, 30)) + rng.sample(old[:30], 3)
+        tgt = rng.sample(old[:40], rng.randint(0, 40))
+        sp = FakeSpotify({"p": ("x", list(cur))})
+        sync_playlist(sp, tgt, "x")
+        assert sp.playlists["p"][1] == tgt
+
+def test_sync_creates_missing_playlist():
+    sp = FakeSpotify({"p1": ("Other", ["a"])})
+    assert sync_playlist(sp, ["a", "b"], "Top Wordplay")["created"]
+    assert sp.playlists["new"] == ("Top Wordplay", ["a", "b"])
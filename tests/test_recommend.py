@@ -0,0 +1,154 @@
+import faiss
+import numpy as np
+import pandas as pd
+from src.recommend import Catalog, recommend
+
+def legacy_recommend(df, vec, index, seed_ids, k=30):
+    # the per-request id2row / df.iloc version
+    id2row = {tid:i for i,tid in enumerate(df["track_id"])}
+    rows = [id2row[s] for s in seed_ids if s in id2row]
+    q = vec[rows].mean(axis=0, keepdims=True)
+    q /= (np.linalg.norm(q)+1e-9)
+    D, I = index.search(q.astype('float32'), k*5)
+    out = []
+    for idx in I[0]:
+        tid = df.iloc[idx]["track_id"]
+        if tid not in set(seed_ids):
+            out.append({"track_name": df.iloc[idx]["track_name"], "artist_name": df.iloc[idx]["artist_name"], "track_id": tid})
+        if len(out) >= k: break
+    return out
+
+def make_artifacts(n=2000, dim=12, seed=0):
+    rng = np.random.default_rng(seed)
+    vec = rng.normal(size=(n, dim)).astype(np.float32)
+    vec /= np.linalg.norm(vec, axis=1, keepdims=True)
+    df = pd.DataFrame({"track_id": [f"t{i}" for i in range(n)], "track_name": [f"Song {i}" for i in range(n)],
+                       "artist_name": [f"Artist {i % 50}" for i in range(n)]})
+    index = faiss.IndexFlatIP(dim)
+    index.add(vec)
+    return df, vec, index
+
+def test_catalog_matches_per_request_lookups():
+    df, vec, index = make_artifacts()
+    catalog = Catalog(df, vec, index)
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        seeds = [f"t{i}" for i in rng.integers(0, len(df), 3)] + ["unknown"]
+        assert catalog.recommend(seeds, k=10) == legacy_recommend(df, vec, index, seeds, k=10)
+    assert catalog.recommend(["unknown"]) is None
+    frame = recommend(df, vec, index, ["t1", "t2"], k=5, catalog=catalog)
+    assert list(frame.columns) == ["track_name", "artist_name", "track_id"] and len(frame) == 5
+    assert recommend(df, vec, index, ["nope"]).empty
+
+def test_small_catalog_drops_faiss_padding():
+    df, vec, index = make_artifacts(n=8)
+    got = Catalog(df, vec, index).recommend(["t0"], k=30)
+    assert sorted(r["track_id"] for r in got) == [f"t{i}" for i in range(1, 8)]
+
+def test_recommend_many_matches_single_queries():
+    df, vec, index = make_artifacts()
+    catalog = Catalog(df, vec, index)
+    rng = np.random.default_rng(2)
+    queries = [([f"t{i}" for i in rng.integers(0, len(df), rng.integers(1, 6))], int(rng.integers(1, 40)))
+               for _ in range(30)] + [(["unknown"], 5)]
+    assert catalog.recommend_many(queries) == [catalog.recommend(s, k) for s, k in queries]
+    assert catalog.recommend_many([]) == []
+
+def test_out_of_range_k_does_not_fail_the_batch():
+    df, vec, index = make_artifacts(n=50)
+    catalog = Catalog(df, vec, index)
+    good = catalog.recommend(["t1"], 5)
+    got = catalog.recommend_many([(["t1"], 5), (["t2"], 10**9), (["t3"], 0), (["t4"], -3)])
+    assert got[0] == good and len(got[1]) == 49 and got[2] == got[3] == []
+
+def test_micro_batcher_coalesces_concurrent_calls():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from src.recommend import MicroBatcher
+    sizes = []
+    lock = threading.Lock()
+    def double(items):
+        with lock:
+            sizes.append(len(items))
+        return [2 * x for x in items]
+    batcher = MicroBatcher(double, max_wait_ms=20, max_batch=16)
+    with ThreadPoolExecutor(max_workers=32) as ex:
+        assert list(ex.map(batcher.submit, range(64))) == [2 * x for x in range(64)]
+    assert max(sizes) <= 16 and len(sizes) < 64 and batcher.items == 64
+    batcher.close()
+
+    failing = MicroBatcher(lambda items: 1 / 0, max_wait_ms=0)
+    try:
+        failing.submit(1)
+        assert False
+    except ZeroDivisionError:
+        pass
+    failing.close()
+
+def test_local_api_endpoints(tmp_path, monkeypatch):
+    import importlib
+    from fastapi.testclient import TestClient
+    df, vec, index = make_artifacts(n=500)
+    df.to_parquet(tmp_path / "track_meta.parquet", index=False)
+    np.save(tmp_path / "vectors.npy", vec)
+    faiss.write_index(index, str(tmp_path / "faiss.index"))
+    monkeypatch.setenv("ART_DIR", str(tmp_path))
+    import serving.local_api as local_api
+    local_api = importlib.reload(local_api)
+    client = TestClient(local_api.app)
+    single = client.post("/recommend", json={"seed_ids": ["t1", "t2"], "k": 5}).json()["results"]
+    assert single == local_api.catalog.recommend(["t1", "t2"], 5)
+    assert client.post("/recommend", json={"seed_ids": ["nope"]}).status_code == 400
+    batch = client.post("/recommend/batch", json={"queries": [{"seed_ids": ["t1", "t2"], "k": 5},
+                                                              {"seed_ids": ["nope"]}]}).json()["results"]
+    assert batch[0]["results"] == single and "error" in batch[1]
+    for k in (0, -1, local_api.MAX_K + 1):
+        assert client.post("/recommend", json={"seed_ids": ["t1"], "k": k}).status_code == 422
+    local_api.batcher.close()
+
+def test_mapped_catalog_matches_in_memory(tmp_path):
+    from src.build_index import build_faiss_index
+    from src.recommend import MappedCatalog, load_catalog, save_serving_artifacts
+    df, vec, _ = make_artifacts(n=3000)
+    df.loc[5, "track_name"] = "Café ✓"
+    df.to_parquet(tmp_path / "track_meta.parquet", index=False)
+    np.save(tmp_path / "vectors.npy", vec)
+    rng = np.random.default_rng(3)
+    queries = [([f"t{i}" for i in rng.integers(0, len(df), 3)] + ["missing", "t5"], 20) for _ in range(20)]
+    for index_type in ("flat", "ivf-flat", "hnsw"):
+        faiss.write_index(build_faiss_index(vec, index_type), str(tmp_path / "faiss.index"))
+        eager = load_catalog(str(tmp_path))  # no serving copies yet: read into memory
+        assert type(eager) is Catalog
+        save_serving_artifacts(df, str(tmp_path))
+        mapped = load_catalog(str(tmp_path))
+        assert isinstance(mapped, MappedCatalog) and isinstance(mapped.vec, np.memmap) and len(mapped) == len(df)
+        assert type(load_catalog(str(tmp_path), mmap=False)) is Catalog
+        assert mapped.recommend_many(queries) == eager.recommend_many(queries)
+        assert mapped.recommend(["missing", "x" * 40]) is None
+        for f in ("track_meta.arrow", "track_ids.sorted.npy", "track_ids.order.npy"):
+            (tmp_path / f).unlink()
+
+def test_serving_copies_keep_nulls_and_stale_copies_are_ignored(tmp_path):
+    from src.recommend import MappedCatalog, load_catalog, save_serving_artifacts
+    df, vec, index = make_artifacts(n=300)
+    df.loc[3, "track_name"] = None
+    df.loc[4, "artist_name"] = None
+    df.to_parquet(tmp_path / "track_meta.parquet", index=False)
+    np.save(tmp_path / "vectors.npy", vec)
+    faiss.write_index(index, str(tmp_path / "faiss.index"))
+    save_serving_artifacts(df, str(tmp_path))
+    mapped = load_catalog(str(tmp_path))
+    assert isinstance(mapped, MappedCatalog)
+    assert mapped.records(np.array([3, 4])) == load_catalog(str(tmp_path), mmap=False).records(np.array([3, 4]))
+    assert mapped.records(np.array([3]))[0]["track_name"] is None
+
+    # artifacts rebuilt without refreshing the serving copies: same size, then a different size
+    df.loc[0, "track_name"] = "Renamed"
+    df.to_parquet(tmp_path / "track_meta.parquet", index=False)
+    stale = load_catalog(str(tmp_path))
+    assert type(stale) is Catalog and stale.records(np.array([0]))[0]["track_name"] == "Renamed"
+    df, vec, index = make_artifacts(n=200)
+    df.to_parquet(tmp_path / "track_meta.parquet", index=False)
+    np.save(tmp_path / "vectors.npy", vec)
+    faiss.write_index(index, str(tmp_path / "faiss.index"))
+    assert type(load_catalog(str(tmp_path))) is Catalog and len(load_catalog(str(tmp_path))) == 200
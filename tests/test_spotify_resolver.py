@@ -0,0 +1,53 @@
+import os
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "experimental"))
+from spotify_resolver import TrackResolver
+
+class FakeSpotify:
+    # answers only the track:/artist: query for songs in its catalog, after a little latency
+    def __init__(self, catalog, latency=0.02):
+        self.catalog = catalog
+        self.latency = latency
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def search(self, q, type, limit):
+        with self.lock:
+            self.queries.append(q)
+        time.sleep(self.latency)
+        for (name, artist), uri in self.catalog.items():
+            if q == f'track:"{name}" artist:"{artist}"':
+                return {"tracks": {"items": [{"uri": uri}]}}
+        return {"tracks": {"items": []}}
+
+def test_resolver_caches_hits_and_misses(tmp_path):
+    catalog = {(f"Song {i}", "Nas"): f"spotify:track:{i}" for i in range(40)}
+    songs = [(f"Song {i}", "['Nas', 'AZ']") for i in range(40)] + [("Nope", "Nobody"), ("Song 3", "nas")]
+    sp = FakeSpotify(catalog)
+    resolver = TrackResolver(sp, str(tmp_path / "tracks.sqlite"), workers=8, rate=1000)
+    t0 = time.perf_counter()
+    uris = resolver.resolve_many(songs)
+    assert time.perf_counter() - t0 < 40 * sp.latency / 2  # lookups overlap
+    assert uris[:40] == [f"spotify:track:{i}" for i in range(40)] and uris[40] is None and uris[41] == uris[3]
+    assert len(sp.queries) == 40 + 4  # one per distinct hit, all four strategies for the miss
+    resolver.close()
+
+    again = TrackResolver(sp, str(tmp_path / "tracks.sqlite"))
+    assert again.resolve_many(songs) == uris
+    assert again.api_calls == 0 and again.hits == len(songs)
+    again.close()
+
+    expired = TrackResolver(sp, str(tmp_path / "tracks.sqlite"), miss_ttl=0)
+    assert expired.resolve("Nope", "Nobody") is None and expired.api_calls == 4
+    expired.close()
+
+def test_failed_searches_are_not_cached(tmp_path):
+    class Flaky(FakeSpotify):
+        def search(self, q, type, limit):
+            raise RuntimeError("503")
+    resolver = TrackResolver(Flaky({}), str(tmp_path / "tracks.sqlite"))
+    assert resolver.resolve("Song", "Nas") is None
+    resolver.sp = FakeSpotify({("Song", "Nas"): "spotify:track:x"})
+    assert resolver.resolve("Song", "Nas") == "spotify:track:x"
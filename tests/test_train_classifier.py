@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from entendre_rank.line_classifier import load_classifier
+from entendre_rank.train_classifier import (ShardWriter, fit_in_memory, fit_sgd, iter_shards, resolve_shard_dir,
+                                            train_from_shards)
+from entendre_rank.utils import FEATURE_VERSION
+
+META = {"embedding_model": "emb", "lexicon": "lex", "feature_version": FEATURE_VERSION}
+
+def write_shards(shard_dir, n=6000, dim=24, seed=0):
+    rng = np.random.default_rng(seed)
+    w = rng.normal(size=dim)
+    writer = ShardWriter(str(shard_dir), META, shard_rows=1000)
+    for _ in range(0, n, 700):
+        X = rng.normal(size=(700, dim)) * rng.uniform(0.1, 20, size=dim)
+        y = (X / np.abs(X).mean(axis=0) @ w + rng.normal(scale=0.5, size=700) > 1.5).astype(int)
+        writer.add(X, y)
+    writer.close()
+    return writer
+
+def test_shards_roundtrip(tmp_path):
+    writer = write_shards(tmp_path)
+    shards = list(iter_shards(writer.shard_dir))
+    assert writer.shards == len(shards) == 5  # 700-row adds flushed at >= 1000 rows
+    assert sum(len(y) for _, y in shards) == writer.rows == 6300
+    assert all(isinstance(X, np.memmap) and X.dtype == np.float32 for X, _ in shards)
+    assert resolve_shard_dir(str(tmp_path)) == writer.shard_dir
+    # a new run gets its own directory and becomes LATEST; the earlier run is kept
+    empty = ShardWriter(str(tmp_path), META)
+    empty.close()
+    assert empty.shard_dir != writer.shard_dir and resolve_shard_dir(str(tmp_path)) == empty.shard_dir
+    assert list(iter_shards(empty.shard_dir)) == []
+    assert len(list(iter_shards(writer.shard_dir))) == 5
+
+def test_unclosed_run_is_not_latest(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        resolve_shard_dir(str(tmp_path))
+    done = write_shards(tmp_path)
+    ShardWriter(str(tmp_path), META).add(np.ones((5, 3)), np.zeros(5))
+    assert resolve_shard_dir(str(tmp_path)) == done.shard_dir
+
+def test_sgd_matches_full_batch_fit(tmp_path):
+    shard_dir = write_shards(tmp_path).shard_dir
+    X = np.vstack([X for X, _ in iter_shards(shard_dir)])
+    y = np.concatenate([y for _, y in iter_shards(shard_dir)])
+    sgd, stats = fit_sgd(shard_dir, epochs=3, batch_rows=512)
+    full, _ = fit_in_memory(shard_dir)
+    acc_sgd = (sgd.predict(X) == y).mean()
+    acc_full = (full.predict(X) == y).mean()
+    assert acc_sgd > acc_full - 0.02
+    assert stats["lines"] == len(y) and stats["lines_per_sec"] > 0 and stats["peak_rss_mb"] > 0
+    assert stats["passes"] == 4
+    assert np.isclose(stats["lines_per_sec"], len(y) / stats["seconds"])
+
+def test_train_from_shards_saves_loadable_classifier(tmp_path):
+    writer = write_shards(tmp_path / "shards")
+    path = train_from_shards(str(tmp_path / "shards"), "sgd", out_dir=str(tmp_path / "clf"), epochs=1)
+    clf = load_classifier(path, "emb")
+    X, _ = next(iter_shards(writer.shard_dir))
+    assert np.allclose(clf.predict_proba(X), clf.pipeline.predict_proba(X)[:, 1], atol=1e-5)
+
+def test_single_class_is_rejected(tmp_path):
+    writer = ShardWriter(str(tmp_path), META)
+    writer.add(np.ones((20, 3)), np.zeros(20))
+    writer.close()
+    with pytest.raises(ValueError, match="one class"):
+        fit_sgd(writer.shard_dir)
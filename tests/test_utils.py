@@ -1,6 +1,9 @@
 import os
 import pandas as pd
-from entendre_rank.utils import split_lyrics_into_lines, engineered_features, window_triple_signal
+import pytest
+from entendre_rank.utils import (split_lyrics_into_lines, engineered_features, window_triple_signal,
+                                 engineered_features_reference, engineered_feature_matrix,
+                                 keyword_hits, keyword_hits_batch, window_triple_signals)
 
 def test_split_lines():
     txt = "Line one\n\n[Chorus]\nLine two!"
@@ -17,3 +20,36 @@ def test_triple_signal():
     lines = ["I got the keys", "serving base all night", "bake the cake"]
     s = window_triple_signal(lines, window=2)
     assert s >= 0
+
+def test_batched_feats_match_reference():
+    lines = ["I got the KEYS to the city", "Backshots?! \"dope\" rock'n roll", "", "   ",
+             "café crème rock ICE", "İce cold, Keys", "sep\x1einside dope", "lean\ud800lean",
+             "plug plug PLUG plugged", "ice's ice 'ice' ice-cold", "x" * 40 + " backshotsx backshot"]
+    pd.testing.assert_frame_equal(engineered_features(lines), engineered_features_reference(lines))
+    assert keyword_hits_batch(lines).tolist() == [list(keyword_hits(ln)) for ln in lines]
+    # chunk boundaries must not shift line offsets
+    assert (engineered_feature_matrix(lines * 3, chunk=4) == engineered_feature_matrix(lines * 3)).all()
+
+def test_triple_signals_match_rejoined_windows():
+    import random
+    rnd = random.Random(3)
+    vocab = ["keys", "base", "rock", "head", "ride", "dope", "Crack", "plug's", "the", "night", "IcE", "wet"]
+    lines = [" ".join(rnd.choice(vocab) for _ in range(rnd.randint(0, 5))) for _ in range(60)]
+    for window in (0, 1, 2, 5, 80):
+        expected = []
+        for i in range(len(lines)):
+            amb, sex, drug = keyword_hits(" ".join(lines[i:i+window+1]).lower())
+            expected.append(float(amb >= 1 and ((sex >= 1 and drug >= 1) or amb >= 3)))
+        score, per_line = window_triple_signals(lines, window)
+        assert per_line.tolist() == expected
+        assert score == window_triple_signal(lines, window) == sum(expected)
+    with pytest.raises(ValueError, match=">= 0"):
+        window_triple_signals(lines, -1)
+
+def test_batched_feats_match_reference_random():
+    import random
+    rnd = random.Random(8)
+    pieces = ["keys", "Base", "ROCK", "dope", "plug", "ice", "the", "ain't", "'", '"', "?", "!", "\n", "\t",
+              " ", " ", "İ", "K", "é", "-", ",", "  ", "x"]
+    lines = ["".join(rnd.choice(pieces) + rnd.choice(["", " "]) for _ in range(rnd.randint(0, 12))) for _ in range(500)]
+    pd.testing.assert_frame_equal(engineered_features(lines), engineered_features_reference(lines))